@@ -1,14 +1,53 @@
+import argparse
 import geopandas as gpd
 import pandas as pd
 from shapely.geometry import Point, LineString
 import numpy as np
+import shapely
+
+from corridor_engine import (
+    BUFFER_DISTANCE, INDEX_MAX_DISTANCE, SNAP_TOLERANCE, assemble_routes, distance_profile, gap_categories,
+    gap_stretches, MILE_M, NEVI_MAX_DISTANCE, NEVI_MAX_SPACING, NEVI_MIN_PORTS, highway_capable,
+    nevi_compliance, nevi_gaps, nevi_sites, profile_stats, select_stations, spacing_stats,
+    station_corridor_index, VEHICLE_PROFILES
+)
+from network_engine import COVERAGE_RADIUS, CorridorNetwork
+from trip_engine import simulate_trips, trip_failure_rates
 
 # --- File Paths ---
 corridors_path = "GEOJSON/AltFuels_rounds1_7_2023_11_07.geojson"
 stations_csv = "Data/NY EV Charging stations_full.csv"
 state_path = "GEOJSON/State_Shoreline.geojson"
 output_corridors = "GEOJSON/Corridor_Spacing_Analysis.geojson"
-output_gaps = "GEOJSON/Corridor_Coverage_Gaps.geojson"
+output_gaps = "GEOJSON/Corridor_Coverage_Gaps.geojson"  # uncovered stretches as line substrings
+output_profile = "GEOJSON/Corridor_Charger_Profile.parquet"  # distance to a charger every 0.5 mile
+output_nevi_sites = "GEOJSON/Corridor_NEVI_Sites.geojson"  # fewest new sites for NEVI compliance
+output_segments = "GEOJSON/Corridor_Segments.parquet"  # every clipped corridor line, any length
+output_station_index = "GEOJSON/Corridor_Station_Index.parquet"  # station pairs within 5 miles
+output_network_gaps = "GEOJSON/Corridor_Network_Gaps.csv"  # uncovered stretches by network distance
+
+# --- Run Options ---
+parser = argparse.ArgumentParser(description="Measure charging station spacing along NY EV corridors")
+parser.add_argument("--corridors", default=corridors_path,
+                    help=f"AltFuels corridor file (default: {corridors_path})")
+parser.add_argument("--raw-segments", action="store_true",
+                    help="Analyze raw AltFuels segments instead of stitched routes")
+parser.add_argument("--snap-meters", type=float, default=SNAP_TOLERANCE,
+                    help=f"Endpoint snapping cell size for route assembly (default: {SNAP_TOLERANCE})")
+parser.add_argument("--coverage-radius", type=float, default=COVERAGE_RADIUS / MILE_M,
+                    help="Network miles to the nearest charger that still count as covered "
+                         f"(default: {COVERAGE_RADIUS / MILE_M:.0f})")
+parser.add_argument("--nevi-spacing", type=float, default=NEVI_MAX_SPACING / MILE_M,
+                    help=f"NEVI max miles between DC fast stations (default: {NEVI_MAX_SPACING / MILE_M:.0f})")
+parser.add_argument("--nevi-distance", type=float, default=NEVI_MAX_DISTANCE / MILE_M,
+                    help=f"NEVI max miles from the corridor (default: {NEVI_MAX_DISTANCE / MILE_M:.0f})")
+parser.add_argument("--nevi-ports", type=int, default=NEVI_MIN_PORTS,
+                    help=f"NEVI minimum DC fast ports per station (default: {NEVI_MIN_PORTS})")
+parser.add_argument("--trips", type=int, default=1_000_000,
+                    help="Monte-Carlo trips along the analyzed corridors (default: 1000000, 0 = skip)")
+parser.add_argument("--trip-seed", type=int, default=0, help="Random seed for the trip simulation (default: 0)")
+args = parser.parse_args()
+corridors_path = args.corridors
 
 print(" Loading data...")
 corridors = gpd.read_file(corridors_path)
@@ -54,11 +93,8 @@ stations_df = stations_df.dropna(subset=["Latitude", "Longitude"])
 stations_df["ev_level2_evse_num"] = pd.to_numeric(stations_df["ev_level2_evse_num"], errors="coerce").fillna(0)
 stations_df["ev_dc_fast_num"] = pd.to_numeric(stations_df["ev_dc_fast_num"], errors="coerce").fillna(0)
 
-# Filter for highway-capable stations
-highway_stations = stations_df[
-    (stations_df["ev_dc_fast_num"] > 0) | 
-    (stations_df["ev_level2_evse_num"] >= 4)  # At least 4 Level 2 ports
-].copy()
+# Filter for highway-capable stations (DC fast or at least MIN_LEVEL2_PORTS Level 2 ports)
+highway_stations = stations_df[highway_capable(stations_df)].copy()
 
 print(f"   Using {len(highway_stations)} highway-capable stations")
 print(f"   (Filtered out {len(stations_df) - len(highway_stations)} low-capacity stations)")
@@ -74,9 +110,70 @@ print(" Reprojecting to EPSG:5070...")
 ev_corridors = ev_corridors.to_crs(epsg=5070)
 stations_gdf = stations_gdf.to_crs(epsg=5070)
 
+# --- Assemble Routes ---
+# Stitch segments of the same road into continuous routes so gaps spanning
+# segment boundaries are measured whole
+if not args.raw_segments:
+    print(" Stitching segments into continuous routes...")
+    num_segments = len(ev_corridors)
+    ev_corridors = assemble_routes(ev_corridors, "PRIMARY_NA", args.snap_meters)
+    print(f"   {num_segments} segments -> {ev_corridors['Route_ID'].nunique()} routes "
+          f"({len(ev_corridors)} continuous lines)")
+
+# --- Station-to-Corridor Index ---
+# All stations within 5 miles of every clipped corridor line (any length), with
+# distance, position and port counts, so the app can re-run spacing for any
+# buffer, capacity filter or length threshold. Corridor_Idx is the row in
+# the segments file.
+print(" Indexing stations within 5 miles of every corridor line...")
+all_segments = ev_corridors[ev_corridors.geometry.is_valid & ~ev_corridors.geometry.is_empty]
+all_stations = gpd.GeoSeries(
+    gpd.points_from_xy(stations_df.Longitude, stations_df.Latitude), crs="EPSG:4326"
+).to_crs(epsg=5070)
+station_index = station_corridor_index(all_segments.geometry.to_numpy(), stations_df, all_stations.to_numpy(), INDEX_MAX_DISTANCE)
+station_index.insert(1, "Corridor_ID", all_segments.index.to_numpy()[station_index["Corridor_Idx"]])
+station_index.to_parquet(output_station_index, index=False)
+gpd.GeoDataFrame({
+    "Corridor_ID": all_segments.index.to_numpy(),
+    "Road_Name": all_segments["PRIMARY_NA"].to_numpy() if "PRIMARY_NA" in all_segments else "Unknown",
+    "Length_Miles": all_segments.geometry.length.to_numpy() / MILE_M,
+    "Length_M": all_segments.geometry.length.to_numpy(),  # exact projected length for gap math
+}, geometry=all_segments.geometry.to_numpy(), crs="EPSG:5070").to_crs(epsg=4326).to_parquet(output_segments, index=False)
+print(f"   Indexed {len(station_index)} station-corridor pairs across {len(all_segments)} lines")
+
+# --- Network Distance to Chargers ---
+# Road graph over every corridor line, joined at crossings, so a stretch next
+# to an interchange counts chargers reachable on the crossing corridor too
+print(" Solving network distance to the nearest highway-capable charger...")
+network = CorridorNetwork(all_segments.geometry.to_numpy(), all_segments["PRIMARY_NA"].to_numpy()
+                          if "PRIMARY_NA" in all_segments else None)
+network_edges = network.solve(stations_gdf.geometry.to_numpy(), BUFFER_DISTANCE)
+coverage_radius = args.coverage_radius * MILE_M
+network_summary = network.line_summary(network_edges, coverage_radius).set_index(all_segments.index)
+network_gaps = network.uncovered_stretches(network_edges, coverage_radius)
+network_gaps.insert(0, "Corridor_ID", all_segments.index.to_numpy()[network_gaps["Line_Idx"].to_numpy(dtype=int)])
+network_gaps.drop(columns="Line_Idx").to_csv(output_network_gaps, index=False)
+print(f"   {network.num_nodes} nodes; {len(network_gaps)} stretches more than "
+      f"{args.coverage_radius:.0f} network miles from a charger")
+
+# --- NEVI Compliance ---
+# Absolute federal rule from the same station index: DC fast stations with
+# enough ports within a mile of the corridor, no more than 50 miles apart
+print(" Checking NEVI compliance...")
+segment_lengths = all_segments.geometry.length.to_numpy()
+nevi_gap_table = nevi_gaps(station_index, segment_lengths, args.nevi_spacing * MILE_M,
+                           args.nevi_distance * MILE_M, args.nevi_ports)
+nevi_summary = nevi_compliance(nevi_gap_table, segment_lengths).set_index(all_segments.index)
+
+# --- Vehicle Profiles ---
+# Light-duty vs medium/heavy-duty spacing, each with its own range, access
+# radius and qualifying-station rule, in one pass over the station index
+print(" Evaluating vehicle profiles...")
+vehicle_summary = profile_stats(station_index, segment_lengths, VEHICLE_PROFILES).set_index(all_segments.index)
+
 # --- Filter for Longer Corridors ---
 print(" Filtering for substantial corridor segments...")
-ev_corridors["length_mi"] = ev_corridors.geometry.length / 1609.34
+ev_corridors["length_mi"] = ev_corridors.geometry.length / MILE_M
 MIN_LENGTH = 15  # Increased to 15 miles minimum
 ev_corridors = ev_corridors[ev_corridors["length_mi"] >= MIN_LENGTH].copy()
 print(f"   Analyzing {len(ev_corridors)} corridors >= {MIN_LENGTH} miles")
@@ -88,90 +185,70 @@ if len(ev_corridors) == 0:
 # --- Calculate Coverage with Narrow Buffer ---
 print(" Analyzing corridor coverage...")
 
-# 0.5 mile buffer - must be very close to corridor
-BUFFER_DISTANCE = 804.672  # 0.5 miles in meters
-print(f"   Using {BUFFER_DISTANCE/1609.34:.1f} mile buffer for direct corridor access")
+# 0.5 mile buffer - must be very close to corridor (BUFFER_DISTANCE)
+print(f"   Using {BUFFER_DISTANCE / MILE_M:.1f} mile buffer for direct corridor access")
 
 valid_corridors = ev_corridors[ev_corridors.geometry.is_valid & ~ev_corridors.geometry.is_empty]
 ev_corridors = valid_corridors
-ev_corridors["buffer"] = ev_corridors.geometry.buffer(BUFFER_DISTANCE)
-
-corridor_stats = []
-
-for idx, corridor in ev_corridors.iterrows():
-    try:
-        buffer_geom = corridor["buffer"]
-        if buffer_geom is None or buffer_geom.is_empty:
-            continue
-        
-        nearby_stations = stations_gdf[stations_gdf.geometry.within(buffer_geom)]
-        corridor_length_mi = corridor["length_mi"]
-        
-        num_stations = len(nearby_stations)
-        num_dc_fast = (nearby_stations["ev_dc_fast_num"] > 0).sum()
-        
-        # Calculate actual spacing along corridor
-        if num_stations == 0:
-            avg_spacing = corridor_length_mi
-            max_gap = corridor_length_mi
-            stations_per_mile = 0
-        elif num_stations == 1:
-            avg_spacing = corridor_length_mi
-            max_gap = corridor_length_mi
-            stations_per_mile = 1 / corridor_length_mi
-        else:
-            # Project stations onto corridor line
-            distances = []
-            for station_geom in nearby_stations.geometry:
-                nearest_point = corridor.geometry.interpolate(
-                    corridor.geometry.project(station_geom)
-                )
-                distances.append(corridor.geometry.project(station_geom))
-            
-            distances = sorted(distances)
-            gaps = []
-            
-            # Gap from start to first station
-            if distances[0] > 0:
-                gaps.append(distances[0] / 1609.34)  # meters to miles
-            
-            # Gaps between stations
-            for i in range(len(distances) - 1):
-                gap = (distances[i + 1] - distances[i]) / 1609.34
-                gaps.append(gap)
-            
-            # Gap from last station to end
-            corridor_length_m = corridor.geometry.length
-            if distances[-1] < corridor_length_m:
-                gaps.append((corridor_length_m - distances[-1]) / 1609.34)
-            
-            avg_spacing = np.mean(gaps) if gaps else corridor_length_mi
-            max_gap = max(gaps) if gaps else corridor_length_mi
-            stations_per_mile = num_stations / corridor_length_mi
-        
-        corridor_stats.append({
-            "Corridor_ID": idx,
-            "Road_Name": corridor.get("PRIMARY_NA", "Unknown"),
-            "Length_Miles": corridor_length_mi,
-            "Num_Stations": num_stations,
-            "DC_Fast_Count": num_dc_fast,
-            "Avg_Spacing_Miles": avg_spacing,
-            "Max_Gap_Miles": max_gap,
-            "Stations_per_Mile": stations_per_mile,
-            "geometry": corridor.geometry
-        })
-        
-    except Exception as e:
-        print(f"   Error processing corridor {idx}: {e}")
-        continue
-
-print(f"   Processed {len(corridor_stats)} corridors")
-
-if len(corridor_stats) == 0:
+
+# Spacing from the station index with the same vectorized pass the explorer
+# re-runs for other buffers and capacity filters, so the two agree
+analyzed_rows = all_segments.index.get_indexer(ev_corridors.index)  # rows in the segments file
+spacing = spacing_stats(station_index, segment_lengths, BUFFER_DISTANCE).iloc[analyzed_rows]
+
+corridor_analysis = gpd.GeoDataFrame({
+    "Corridor_ID": ev_corridors.index.to_numpy(),
+    "Road_Name": ev_corridors["PRIMARY_NA"].to_numpy() if "PRIMARY_NA" in ev_corridors else "Unknown",
+    "Length_Miles": ev_corridors["length_mi"].to_numpy(),
+    **{col: spacing[col].to_numpy() for col in spacing.columns},
+    "Max_Charger_Distance_Miles": network_summary["Max_Charger_Distance_Miles"].to_numpy()[analyzed_rows],
+    "Longest_Uncovered_Miles": network_summary["Longest_Uncovered_Miles"].to_numpy()[analyzed_rows],
+    "NEVI_Compliant": nevi_summary["NEVI_Compliant"].to_numpy(dtype=bool)[analyzed_rows],
+    "NEVI_Max_Gap_Miles": nevi_summary["NEVI_Max_Gap_Miles"].to_numpy()[analyzed_rows],
+    "NEVI_Noncompliant_Miles": nevi_summary["NEVI_Noncompliant_Miles"].to_numpy()[analyzed_rows],
+    "NEVI_Sites_Needed": nevi_summary["NEVI_Sites_Needed"].to_numpy()[analyzed_rows],
+}, geometry=ev_corridors.geometry.to_numpy(), crs="EPSG:5070")
+print(f"   Processed {len(corridor_analysis)} corridors")
+
+if len(corridor_analysis) == 0:
     print(" No corridor data!")
     exit(1)
 
-corridor_analysis = gpd.GeoDataFrame(corridor_stats, geometry='geometry', crs="EPSG:5070")
+# Station mileposts of the analyzed corridors (rows of corridor_lines) for
+# the gap stretches and distance profiles below
+corridor_lines = ev_corridors.geometry.to_numpy()
+local_row = np.full(len(all_segments), -1)
+local_row[analyzed_rows] = np.arange(len(analyzed_rows))
+corridor_stops = select_stations(station_index, BUFFER_DISTANCE)
+pairs = pd.DataFrame({
+    "Corridor_Idx": local_row[corridor_stops["Corridor_Idx"].to_numpy()],
+    "Position_M": corridor_stops["Position_M"].to_numpy(),
+})
+pairs = pairs[pairs["Corridor_Idx"] >= 0].sort_values(["Corridor_Idx", "Position_M"], kind="stable")
+
+corridor_analysis = corridor_analysis.join(vehicle_summary.iloc[analyzed_rows].reset_index(drop=True))
+for key, profile in VEHICLE_PROFILES.items():
+    print(f"   {profile['name']}: {corridor_analysis[f'{key}_Within_Range'].sum()} of {len(corridor_analysis)} "
+          f"corridors have every gap within {profile['range_mi']} miles")
+
+# --- Trip Simulation ---
+# Long-distance trips with sampled range and departure charge: completed on
+# corridor stations, completed only via stations up to 5 miles off the road,
+# or stranded
+if args.trips > 0:
+    print(f" Simulating {args.trips:,} trips...")
+    detour_stops = select_stations(station_index, INDEX_MAX_DISTANCE)
+    trips = simulate_trips(
+        segment_lengths, corridor_stops["Corridor_Idx"], corridor_stops["Position_M"], args.trips, args.trip_seed,
+        detour=(detour_stops["Corridor_Idx"], detour_stops["Position_M"]),
+        route_weights=np.where(np.isin(np.arange(len(all_segments)), analyzed_rows), segment_lengths, 0),
+        range_mi=VEHICLE_PROFILES["LDV"]["range_mi"],
+    )
+    trip_rates = trip_failure_rates(trips, len(all_segments)).iloc[analyzed_rows].reset_index(drop=True)
+    corridor_analysis = corridor_analysis.join(trip_rates)
+    outcome_share = trips["Outcome"].value_counts(normalize=True) * 100
+    print(f"   Completed {outcome_share.get('Completed', 0):.1f}% | Detour {outcome_share.get('Detour', 0):.1f}% | "
+          f"Stranded {outcome_share.get('Stranded', 0):.1f}%")
 
 # --- RELATIVE SCORING BASED ON PERCENTILES ---
 print(" Calculating relative coverage scores...")
@@ -186,41 +263,54 @@ p25, p50, p75, p90 = percentiles
 print(f"   Gap Percentiles (miles):")
 print(f"   25th: {p25:.1f} | 50th: {p50:.1f} | 75th: {p75:.1f} | 90th: {p90:.1f}")
 
-# Assign categories based on RELATIVE performance
-def assign_category(gap):
-    if gap <= p25:
-        return "Best Covered"  # Top 25%
-    elif gap <= p50:
-        return "Well Covered"  # Top 50%
-    elif gap <= p75:
-        return "Adequate"  # Top 75%
-    elif gap <= p90:
-        return "Moderate Gap"  # Bottom 25%
-    else:
-        return "Critical Gap"  # Bottom 10%
-
-def assign_score(gap):
-    # Inverse scoring: smaller gaps = higher scores
-    if gap <= p25:
-        return 90 + (p25 - gap) / p25 * 10  # 90-100
-    elif gap <= p50:
-        return 70 + (p50 - gap) / (p50 - p25) * 20  # 70-90
-    elif gap <= p75:
-        return 50 + (p75 - gap) / (p75 - p50) * 20  # 50-70
-    elif gap <= p90:
-        return 25 + (p90 - gap) / (p90 - p75) * 25  # 25-50
-    else:
-        return max(0, 25 - (gap - p90) / p90 * 25)  # 0-25
-
-corridor_analysis["Gap_Category"] = corridor_analysis["Max_Gap_Miles"].apply(assign_category)
-corridor_analysis["Coverage_Score"] = corridor_analysis["Max_Gap_Miles"].apply(assign_score)
+# Assign categories and inverse scores (smaller gaps = higher scores) on RELATIVE performance
+corridor_analysis["Gap_Category"], corridor_analysis["Coverage_Score"] = gap_categories(
+    corridor_analysis["Max_Gap_Miles"]
+)
 
 # --- Identify Critical Gaps (bottom quartile) ---
-critical_gaps = corridor_analysis[
-    corridor_analysis["Gap_Category"].isin(["Moderate Gap", "Critical Gap"])
-].copy()
-
-print(f"   Found {len(critical_gaps)} corridors with moderate/critical gaps")
+# The stretches themselves: every gap between stations (or a corridor end)
+# longer than the 75th-percentile max gap, i.e. the pieces that put
+# corridors in the Moderate / Critical categories
+critical_gaps = gap_stretches(corridor_lines, pairs["Corridor_Idx"], pairs["Position_M"], p75 * MILE_M)
+gap_rows = critical_gaps.pop("Corridor_Idx").to_numpy()
+critical_gaps.insert(0, "Corridor_ID", corridor_analysis["Corridor_ID"].to_numpy()[gap_rows])
+critical_gaps.insert(1, "Road_Name", corridor_analysis["Road_Name"].to_numpy()[gap_rows])
+critical_gaps["Gap_Category"] = corridor_analysis["Gap_Category"].to_numpy()[gap_rows]
+critical_gaps = critical_gaps.set_crs(epsg=5070)
+
+print(f"   Found {len(critical_gaps)} stretches longer than {p75:.1f} miles on "
+      f"{critical_gaps['Corridor_ID'].nunique()} corridors")
+
+# --- Distance-to-Charger Profile ---
+# Along-route and network distance to the nearest station every 0.5 mile
+print(" Sampling distance-to-charger profiles...")
+profile = distance_profile(shapely.length(corridor_lines), pairs["Corridor_Idx"], pairs["Position_M"])
+network_rows = all_segments.index.get_indexer(ev_corridors.index)[profile["Corridor_Idx"]]
+profile = pd.DataFrame({
+    "Corridor_ID": corridor_analysis["Corridor_ID"].to_numpy()[profile["Corridor_Idx"]],
+    "Road_Name": corridor_analysis["Road_Name"].to_numpy()[profile["Corridor_Idx"]],
+    "Milepost": profile["Position_M"] / MILE_M,
+    "Distance_Miles": profile["Distance_M"] / MILE_M,
+    "Network_Distance_Miles": network.distance_at(network_edges, network_rows, profile["Position_M"]) / MILE_M,
+})
+profile["Network_Distance_Miles"] = profile["Network_Distance_Miles"].replace(np.inf, np.nan)
+profile.to_parquet(output_profile, index=False)
+print(f"   {len(profile)} samples along {profile['Corridor_ID'].nunique()} corridors")
+
+# --- NEVI Sites ---
+# New sites for the analyzed corridors, evenly spaced inside each failing gap
+new_sites = nevi_sites(nevi_gap_table[nevi_gap_table["Corridor_Idx"].isin(analyzed_rows)])
+new_sites = gpd.GeoDataFrame({
+    "Corridor_ID": all_segments.index.to_numpy()[new_sites["Corridor_Idx"]],
+    "Road_Name": all_segments["PRIMARY_NA"].to_numpy()[new_sites["Corridor_Idx"]]
+    if "PRIMARY_NA" in all_segments else "Unknown",
+    "Milepost": new_sites["Position_M"] / MILE_M,
+}, geometry=shapely.line_interpolate_point(
+    all_segments.geometry.to_numpy()[new_sites["Corridor_Idx"]], new_sites["Position_M"].to_numpy()
+), crs="EPSG:5070").to_crs(epsg=4326)
+print(f"   {corridor_analysis['NEVI_Compliant'].sum()} of {len(corridor_analysis)} corridors meet NEVI; "
+      f"{len(new_sites)} new sites needed for the rest")
 
 # --- Reproject ---
 print(" Reprojecting to WGS84...")
@@ -233,6 +323,8 @@ print("Saving results...")
 corridor_analysis.to_file(output_corridors, driver="GeoJSON")
 if len(critical_gaps) > 0:
     critical_gaps.to_file(output_gaps, driver="GeoJSON")
+if len(new_sites) > 0:
+    new_sites.to_file(output_nevi_sites, driver="GeoJSON")
 
 print(f"\n Done! Saved to {output_corridors}")
 print(f"\n RELATIVE Coverage Distribution:")
@@ -242,4 +334,6 @@ print(f"\n Top 10 Corridors with Largest Gaps:")
 top_gaps = corridor_analysis.nlargest(10, "Max_Gap_Miles")[
     ["Road_Name", "Length_Miles", "Num_Stations", "Max_Gap_Miles", "Gap_Category"]
 ]
-print(top_gaps.to_string(index=False))
\ No newline at end of file
+print(top_gaps.to_string(index=False))
+print(f"\n Longest Stretches > {args.coverage_radius:.0f} Network Miles from a Charger:")
+print(network_gaps.head(10)[["Road_Name", "Start_Mile", "End_Mile", "Length_Miles"]].to_string(index=False))
\ No newline at end of file
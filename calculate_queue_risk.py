@@ -3,11 +3,15 @@ import pandas as pd
 from shapely.geometry import Point
 import numpy as np
 
+from hotspot_engine import contiguity_weights, hotspot_table
+from queue_engine import county_queue_rollup, demand_pairs, station_demand, station_queues
+
 # --- File Paths ---
 counties_path = "GEOJSON/Counties_Shoreline.geojson"
 ev_count_path = "GEOJSON/EV_Count.geojson"
 stations_csv = "Data/NY EV Charging stations_full.csv"
 output_path = "GEOJSON/Queue_Risk_Analysis.geojson"
+station_output_path = "GEOJSON/Station_Queue_Risk.geojson"
 
 print(" Loading data...")
 counties = gpd.read_file(counties_path)
@@ -94,6 +98,33 @@ counties["Station_Count"] = pd.to_numeric(counties["Station_Count"], errors='coe
 # Ensure Total_EVs is also numeric (safety check)
 counties["Total_EVs"] = pd.to_numeric(counties["Total_EVs"], errors='coerce').fillna(0)
 
+# --- Station Queue Model (Erlang C) ---
+print(" Modeling peak-hour queues at each station (M/M/c)...")
+# Registrations at ZIP centroids are split across nearby stations, then each
+# station's Level 2 and DC fast ports are served as separate M/M/c queues
+zip_xy = np.column_stack([ev_data.geometry.centroid.x, ev_data.geometry.centroid.y])
+station_xy = np.column_stack([stations_gdf.geometry.x, stations_gdf.geometry.y])
+l2_ports = stations_gdf["ev_level2_evse_num"].to_numpy()
+dc_ports = stations_gdf["ev_dc_fast_num"].to_numpy()
+station_load = station_demand(demand_pairs(zip_xy, station_xy), ev_data["EV_Count"].to_numpy(), l2_ports, dc_ports)
+station_load.index = stations_gdf.index
+queues = station_queues(station_load, l2_ports, dc_ports)
+
+station_queue_gdf = stations_gdf[["station_name", "city", "ev_level2_evse_num", "ev_dc_fast_num", "geometry"]].join(
+    station_load.round(1)
+).join(queues)
+station_queue_gdf["NAME"] = stations_in_counties.loc[~stations_in_counties.index.duplicated(), "NAME"]
+station_queue_gdf = station_queue_gdf[station_queue_gdf["Congestion"] != "No Ports"]
+
+print(f"   Modeled {len(station_queue_gdf):,} stations with Level 2 or DC fast ports")
+print(f"   Overloaded at peak: {station_queue_gdf['Overloaded'].sum():,}")
+print(f"   Median wait probability: {station_queue_gdf['Wait_Prob'].median():.2f}")
+
+county_queues = county_queue_rollup(station_queue_gdf, station_queue_gdf["NAME"].fillna("Unknown"))
+counties = counties.merge(county_queues, on="NAME", how="left")
+for col in ["Modeled_Stations", "Overloaded_Stations", "Peak_Arrivals_Hr", "Avg_Wait_Prob", "Avg_Wait_Minutes"]:
+    counties[col] = pd.to_numeric(counties[col], errors='coerce').fillna(0)
+
 # --- Calculate Queue Risk Metrics ---
 print("📊 Calculating queue risk metrics...")
 
@@ -137,6 +168,15 @@ counties["Risk_Category"] = pd.cut(
     labels=["Low", "Moderate", "High", "Critical"]
 )
 
+# --- Spatial Clustering of Queue Risk ---
+print("📊 Testing spatial clustering of queue risk (Moran's I / LISA / Gi*)...")
+county_weights = contiguity_weights(counties.geometry.to_numpy())
+county_hotspots, global_moran = hotspot_table(counties["Queue_Risk_Score"].to_numpy(), county_weights)
+for col in ["LISA_Cluster", "LISA_P", "Gi_Z", "Gi_Hotspot"]:
+    counties[col] = county_hotspots[col].to_numpy()
+print(f"   Global Moran's I = {global_moran['I']:.3f} (pseudo p = {global_moran['P_Sim']:.3f})")
+print(f"   High-High clusters: {(counties['LISA_Cluster'] == 'High-High').sum()} counties")
+
 # --- Reproject back to WGS84 ---
 print("📐 Reprojecting back to WGS84 for web mapping...")
 counties = counties.to_crs(epsg=4326)
@@ -152,10 +192,25 @@ output_cols = [
     "Station_Density",
     "Queue_Risk_Score",
     "Risk_Category",
+    "LISA_Cluster",
+    "LISA_P",
+    "Gi_Z",
+    "Gi_Hotspot",
+    "Modeled_Stations",
+    "Overloaded_Stations",
+    "Peak_Arrivals_Hr",
+    "Avg_Wait_Prob",
+    "Avg_Wait_Minutes",
     "geometry"
 ]
 counties[output_cols].to_file(output_path, driver="GeoJSON")
 
+station_queue_gdf = station_queue_gdf.to_crs(epsg=4326)
+for col in station_queue_gdf.columns.drop(["station_name", "city", "NAME", "Overloaded", "Congestion", "geometry"]):
+    station_queue_gdf[col] = station_queue_gdf[col].round(3)
+station_queue_gdf.to_file(station_output_path, driver="GeoJSON")
+print(f" Saved station queue layer to {station_output_path}")
+
 print(f" Done! Saved to {output_path}")
 print(f"\n Queue Risk Summary Statistics:")
 print(f"   Mean Queue Risk Score: {counties['Queue_Risk_Score'].mean():.2f}")
@@ -164,4 +219,6 @@ print(f"   Counties at High Risk: {(counties['Risk_Category'] == 'High').sum()}"
 print(f"   Counties at Moderate Risk: {(counties['Risk_Category'] == 'Moderate').sum()}")
 print(f"   Counties at Low Risk: {(counties['Risk_Category'] == 'Low').sum()}")
 print(f"\n Top 5 Highest Risk Counties:")
-print(counties.nlargest(5, "Queue_Risk_Score")[["NAME", "Queue_Risk_Score", "EVs_per_Port", "Station_Count"]])
\ No newline at end of file
+print(counties.nlargest(5, "Queue_Risk_Score")[["NAME", "Queue_Risk_Score", "EVs_per_Port", "Station_Count"]])
+print(f"\n Top 5 Counties by Peak Wait Probability:")
+print(counties.nlargest(5, "Avg_Wait_Prob")[["NAME", "Avg_Wait_Prob", "Avg_Wait_Minutes", "Overloaded_Stations"]])
\ No newline at end of file
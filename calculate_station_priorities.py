@@ -1,7 +1,17 @@
+import argparse
+import os
+import sys
 import geopandas as gpd
 import pandas as pd
-import numpy as np
-from shapely.geometry import Point
+from scipy import sparse
+
+from hotspot_engine import grid_weights, hotspot_table
+from priority_engine import (
+    DEFAULT_WEIGHTS, MILE_M, adaptive_grid, assign_priority, build_grid, build_hex_grid,
+    changed_station_points, composite_score, county_crosswalk, dac_overlap_matrix, diff_stations,
+    label_regions, overlap_fingerprint, rescore_station_changes, score_cells, score_cells_parallel,
+    station_layer, station_snapshot, summarize_regions, weight_sensitivity
+)
 
 # --- File Paths ---
 stations_csv = "Data/NY EV Charging stations_full.csv"
@@ -11,6 +21,94 @@ queue_path = "GEOJSON/Queue_Risk_Analysis.geojson"
 counties_path = "GEOJSON/Counties_Shoreline.geojson"
 state_path = "GEOJSON/State_Shoreline.geojson"
 output_path = "GEOJSON/Station_Priority_Zones.geojson"
+grid_output_path = "GEOJSON/Station_Priority_Grid.parquet"  # all cells, unfiltered
+snapshot_path = "GEOJSON/Station_Priority_Snapshot.csv"  # stations used for the last run
+crosswalk_path = "GEOJSON/Priority_Cell_County.csv"  # Cell_ID -> county area shares
+sensitivity_path = "GEOJSON/Priority_Weight_Sensitivity.csv"  # Cell_ID -> rank stability across weightings
+regions_path = "GEOJSON/Priority_Regions.geojson"  # contiguous Critical/High areas
+hotspots_path = "GEOJSON/Priority_Hotspots.csv"  # Cell_ID -> LISA cluster / Gi* hotspot
+dac_overlap_path = "GEOJSON/Cell_DAC_Overlap.npz"
+dac_fingerprint_path = "GEOJSON/Cell_DAC_Overlap.sha1"  # grid + DAC inputs behind the saved overlap
+
+# --- Run Options ---
+parser = argparse.ArgumentParser(description="Score candidate EV station placement zones across NY")
+parser.add_argument("--cell-miles", type=float, default=10.0,
+                    help="Grid cell size in miles (default: 10)")
+parser.add_argument("--cell-shape", choices=["square", "hex"], default="square",
+                    help="Grid cell shape; hex cells match the square cell area (default: square)")
+parser.add_argument("--reuse-dac-overlap", action="store_true",
+                    help="Load the saved cell x DAC overlap matrix instead of recomputing it")
+parser.add_argument("--adaptive", action="store_true",
+                    help="Refine hotspot cells with a quadtree instead of using a uniform grid")
+parser.add_argument("--min-cell-miles", type=float, default=1.25,
+                    help="Smallest cell size for --adaptive (default: 1.25)")
+parser.add_argument("--refine-score", type=float, default=40,
+                    help="Split cells scoring at or above this in --adaptive mode (default: 40)")
+parser.add_argument("--refine-gradient", type=float, default=15,
+                    help="Split cells differing from a neighbor by this much in --adaptive mode (default: 15)")
+parser.add_argument("--delta", action="store_true",
+                    help="Only re-score cells near stations changed since the last run")
+parser.add_argument("--workers", type=int, default=1,
+                    help="Score grid chunks in this many processes (default: 1, serial)")
+parser.add_argument("--sensitivity-samples", type=int, default=10000,
+                    help="Random weightings for the rank-stability sweep; 0 skips it (default: 10000)")
+parser.add_argument("--rank-samples", type=int, default=2000,
+                    help="Weightings of the sweep used for rank percentiles (default: 2000)")
+parser.add_argument("--hotspot-permutations", type=int, default=999,
+                    help="Permutations for Moran's I / LISA hotspot tests; 0 skips them (default: 999)")
+args = parser.parse_args()
+if args.adaptive and args.cell_shape == "hex":
+    parser.error("--adaptive refines square cells only; drop --cell-shape hex")
+if args.adaptive and args.workers > 1:
+    parser.error("--adaptive scores each refinement level serially; drop --workers")
+
+# --- Incremental Update (station CSV refresh) ---
+if args.delta:
+    if not (os.path.exists(grid_output_path) and os.path.exists(snapshot_path)):
+        print(f" Delta mode needs {grid_output_path} and {snapshot_path} - run a full analysis first")
+        sys.exit(1)
+
+    print(" Diffing station snapshot...")
+    new_snapshot = station_snapshot(pd.read_csv(stations_csv))
+    changes = diff_stations(pd.read_csv(snapshot_path), new_snapshot)
+    print(f"   {len(changes)} station changes: {changes['Change'].value_counts().to_dict()}")
+
+    priority_gdf = gpd.read_parquet(grid_output_path).to_crs(epsg=5070)
+    stations_gdf = station_layer(new_snapshot, priority_gdf.crs)
+
+    updated = rescore_station_changes(
+        priority_gdf, stations_gdf, changed_station_points(changes, priority_gdf.crs), DEFAULT_WEIGHTS
+    )
+    print(f"   Re-scored {len(updated)} of {len(priority_gdf)} cells")
+
+    if os.path.exists(crosswalk_path):
+        regions = summarize_regions(
+            priority_gdf, label_regions(priority_gdf, priority_gdf["Priority_Score"] >= 60),
+            crosswalk=pd.read_csv(crosswalk_path)
+        )
+        regions.to_crs(epsg=4326).to_file(regions_path, driver="GeoJSON")
+
+    priority_gdf = priority_gdf.to_crs(epsg=4326)
+    priority_gdf.to_parquet(grid_output_path, index=False)
+    priority_zones = priority_gdf[priority_gdf["Priority_Score"] >= 40]
+    priority_zones.to_file(output_path, driver="GeoJSON")
+    new_snapshot.to_csv(snapshot_path, index=False)
+    if args.sensitivity_samples > 0:
+        # Ranks are grid-wide, so any re-scored cell shifts everyone's percentiles
+        sensitivity = weight_sensitivity(priority_gdf, args.sensitivity_samples, rank_samples=args.rank_samples)
+        sensitivity.insert(0, "Cell_ID", priority_gdf["Cell_ID"].to_numpy())
+        sensitivity.to_csv(sensitivity_path, index=False)
+    if args.hotspot_permutations > 0:
+        hotspots, _ = hotspot_table(
+            priority_gdf["Priority_Score"], grid_weights(priority_gdf.to_crs(epsg=5070)),
+            args.hotspot_permutations
+        )
+        hotspots.insert(0, "Cell_ID", priority_gdf["Cell_ID"].to_numpy())
+        hotspots.to_csv(hotspots_path, index=False)
+
+    print(f" Updated {grid_output_path} and {output_path}")
+    print(priority_zones["Priority_Category"].value_counts())
+    sys.exit(0)
 
 print(" Loading data layers...")
 
@@ -29,138 +127,144 @@ print(f"   Loaded {len(queue_risk)} counties with queue risk data")
 # --- Create Analysis Grid ---
 print("\n🗺️ Creating analysis grid...")
 
-# Reproject to equal area
+# Reproject all layers to equal area (EPSG:5070)
 ny_state = ny_state.to_crs(epsg=5070)
-bounds = ny_state.total_bounds  # minx, miny, maxx, maxy
-
-# Create 10-mile grid cells across NY
-CELL_SIZE = 16093.4  # 10 miles in meters
-x_coords = np.arange(bounds[0], bounds[2], CELL_SIZE)
-y_coords = np.arange(bounds[1], bounds[3], CELL_SIZE)
-
-from shapely.geometry import box
+corridors = corridors.to_crs(epsg=5070)
+dac = dac.to_crs(epsg=5070)
+queue_risk = queue_risk.to_crs(epsg=5070)
+counties = counties.to_crs(epsg=5070)
 
-grid_cells = []
-for x in x_coords:
-    for y in y_coords:
-        cell = box(x, y, x + CELL_SIZE, y + CELL_SIZE)
-        # Only keep cells that intersect NY state
-        if ny_state.geometry.intersects(cell).any():
-            grid_cells.append(cell)
+# Prepare stations (one row per station ID - the same set --delta counts)
+stations_snapshot = station_snapshot(stations_df)
+stations_gdf = station_layer(stations_snapshot, "EPSG:5070")
+print(f"   Counting {len(stations_gdf)} unique stations ({len(stations_df) - len(stations_gdf)} duplicate or unlocated rows dropped)")
 
-grid_gdf = gpd.GeoDataFrame(geometry=grid_cells, crs="EPSG:5070")
-print(f"   Created {len(grid_gdf)} grid cells (10 mile resolution)")
+# Create grid cells across NY (10 miles by default)
+CELL_SIZE = args.cell_miles * MILE_M  # cell size in meters
+if args.adaptive:
+    grid_gdf, adaptive_scores, adaptive_overlap = adaptive_grid(
+        ny_state, corridors, dac, queue_risk, stations_gdf,
+        cell_size=CELL_SIZE, min_cell_size=args.min_cell_miles * MILE_M,
+        threshold=args.refine_score, gradient=args.refine_gradient
+    )
+    print(f"   Created {len(grid_gdf)} adaptive grid cells "
+          f"({args.cell_miles:g} down to {args.min_cell_miles:g} mile resolution)")
+    print(grid_gdf["Level"].value_counts().sort_index().to_string())
+elif args.cell_shape == "hex":
+    grid_gdf = build_hex_grid(ny_state, CELL_SIZE)
+    print(f"   Created {len(grid_gdf)} hex cells ({args.cell_miles:g} mile square-equivalent resolution)")
+else:
+    grid_gdf = build_grid(ny_state, CELL_SIZE)
+    print(f"   Created {len(grid_gdf)} grid cells ({args.cell_miles:g} mile resolution)")
 
 # --- Calculate Priority Scores for Each Cell ---
 print("\n Calculating multi-criteria priority scores...")
 
-# Reproject all layers to EPSG:5070
-corridors = corridors.to_crs(epsg=5070)
-dac = dac.to_crs(epsg=5070)
-queue_risk = queue_risk.to_crs(epsg=5070)
-counties = counties.to_crs(epsg=5070)
-
-# Prepare stations
-stations_df = stations_df.dropna(subset=["Latitude", "Longitude"])
-stations_gdf = gpd.GeoDataFrame(
-    stations_df,
-    geometry=[Point(xy) for xy in zip(stations_df.Longitude, stations_df.Latitude)],
-    crs="EPSG:4326"
-).to_crs(epsg=5070)
-
-priority_scores = []
-
-for idx, cell in grid_gdf.iterrows():
-    cell_geom = cell.geometry
-    cell_center = cell_geom.centroid
-    
-    # 1. CORRIDOR PROXIMITY SCORE (30% weight)
-    # Higher score if cell intersects corridors with gaps
-    corridor_intersect = corridors[corridors.geometry.intersects(cell_geom)]
-    if len(corridor_intersect) > 0:
-        # Use worst gap in the cell
-        max_gap = corridor_intersect["Max_Gap_Miles"].max()
-        avg_gap = corridor_intersect["Max_Gap_Miles"].mean()
-        
-        # Higher gap = higher priority
-        if max_gap > 50:
-            corridor_score = 100
-        elif max_gap > 30:
-            corridor_score = 75
-        elif max_gap > 15:
-            corridor_score = 50
-        else:
-            corridor_score = 25
-    else:
-        corridor_score = 0
-    
-    # 2. EQUITY SCORE (25% weight)
-    # Higher score if cell contains DAC areas
-    dac_intersect = dac[dac.geometry.intersects(cell_geom)]
-    if len(dac_intersect) > 0:
-        # Calculate DAC area within cell
-        dac_area = dac_intersect.geometry.intersection(cell_geom).area.sum()
-        dac_pct = (dac_area / cell_geom.area) * 100
-        equity_score = min(100, dac_pct * 2)  # Scale up
-    else:
-        equity_score = 0
-    
-    # 3. QUEUE RISK SCORE (25% weight)
-    # Higher score if cell is in high-risk county
-    county_intersect = queue_risk[queue_risk.geometry.intersects(cell_center)]
-    if len(county_intersect) > 0:
-        queue_score = county_intersect.iloc[0]["Queue_Risk_Score"]
-    else:
-        queue_score = 0
-    
-    # 4. STATION DENSITY SCORE (20% weight)
-    # INVERSE - fewer nearby stations = higher priority
-    buffer_5mi = cell_center.buffer(8046.72)  # 5 mile radius
-    nearby_stations = stations_gdf[stations_gdf.geometry.within(buffer_5mi)]
-    num_nearby = len(nearby_stations)
-    
-    if num_nearby == 0:
-        density_score = 100
-    elif num_nearby <= 2:
-        density_score = 75
-    elif num_nearby <= 5:
-        density_score = 50
+# Cell x DAC intersection areas (rows = Cell_ID, columns = DAC row order)
+dac_overlap = None
+dac_fingerprint = overlap_fingerprint(grid_gdf.geometry.to_numpy(), dac)
+if args.reuse_dac_overlap and not args.adaptive and os.path.exists(dac_overlap_path):
+    saved_fingerprint = None
+    if os.path.exists(dac_fingerprint_path):
+        with open(dac_fingerprint_path) as f:
+            saved_fingerprint = f.read().strip()
+    if saved_fingerprint != dac_fingerprint:
+        print("   Saved DAC overlap was built from a different grid or DAC layer - recomputing")
     else:
-        density_score = max(0, 50 - (num_nearby - 5) * 5)
-    
-    # WEIGHTED COMPOSITE SCORE
-    composite_score = (
-        corridor_score * 0.30 +
-        equity_score * 0.25 +
-        queue_score * 0.25 +
-        density_score * 0.20
+        dac_overlap = sparse.load_npz(dac_overlap_path).tocsr()
+        print(f"   Reusing DAC overlap matrix from {dac_overlap_path}")
+
+compute_overlap = dac_overlap is None
+
+# Score every cell at once with spatial-index queries
+if args.adaptive:
+    # adaptive_grid() already scored every leaf when deciding where to refine
+    scores, dac_overlap = adaptive_scores, adaptive_overlap
+elif args.workers > 1:
+    print(f"   Scoring in parallel with {args.workers} workers...")
+    scores, dac_overlap = score_cells_parallel(
+        grid_gdf, corridors, dac, queue_risk, stations_gdf,
+        workers=args.workers, dac_overlap=dac_overlap
     )
-    
-    # Priority Category
-    if composite_score >= 75:
-        priority = "Critical Priority"
-    elif composite_score >= 60:
-        priority = "High Priority"
-    elif composite_score >= 40:
-        priority = "Moderate Priority"
-    else:
-        priority = "Low Priority"
-    
-    priority_scores.append({
-        "Priority_Score": composite_score,
-        "Priority_Category": priority,
-        "Corridor_Score": corridor_score,
-        "Equity_Score": equity_score,
-        "Queue_Score": queue_score,
-        "Density_Score": density_score,
-        "Nearby_Stations": num_nearby,
-        "geometry": cell_geom
-    })
-    
-    if (idx + 1) % 100 == 0:
-        print(f"   Processed {idx + 1}/{len(grid_gdf)} cells...")
-
-priority_gdf = gpd.GeoDataFrame(priority_scores, geometry="geometry", crs="EPSG:5070")
+else:
+    if compute_overlap:
+        dac_overlap = dac_overlap_matrix(grid_gdf.geometry.to_numpy(), dac)
+    scores = score_cells(grid_gdf, corridors, dac, queue_risk, stations_gdf, dac_overlap=dac_overlap)
+
+if compute_overlap:
+    sparse.save_npz(dac_overlap_path, dac_overlap)
+    with open(dac_fingerprint_path, "w") as f:
+        f.write(dac_fingerprint)
+    print(f"   Saved {dac_overlap.nnz} cell x DAC overlaps to {dac_overlap_path}")
+
+scores.insert(0, "Cell_ID", grid_gdf.index.to_numpy())
+
+# WEIGHTED COMPOSITE SCORE
+# Corridor 30% | Equity 25% | Queue Risk 25% | Low Density 20%
+scores["Priority_Score"] = composite_score(scores, DEFAULT_WEIGHTS)
+scores["Priority_Category"] = assign_priority(scores["Priority_Score"])
+
+count_cols = [c for c in scores.columns if c.startswith(("Stations_", "DCFC_"))]
+
+# Carry lattice indices (and quadtree level) so neighbors stay O(1) downstream
+index_cols = [c for c in ["Grid_Col", "Grid_Row", "Hex_Q", "Hex_R", "Level"] if c in grid_gdf.columns]
+for col in index_cols:
+    scores[col] = grid_gdf[col].to_numpy()
+
+priority_gdf = gpd.GeoDataFrame(
+    scores[[
+        "Cell_ID", "Priority_Score", "Priority_Category", "Corridor_Score", "Equity_Score",
+        "Queue_Score", "Density_Score", "Nearby_Stations"
+    ] + count_cols + index_cols],
+    geometry=grid_gdf.geometry,
+    crs="EPSG:5070"
+)
+print(f"   Scored {len(priority_gdf)} cells")
+
+# --- Save Full Grid ---
+# Every cell with its component scores, so the app can re-weight the whole
+# grid instead of the pre-filtered zones (GeoParquet stores geometry as WKB)
+print("\nSaving full scored grid...")
+priority_gdf.to_crs(epsg=4326).to_parquet(grid_output_path, index=False)
+print(f" Saved {len(priority_gdf)} cells to {grid_output_path}")
+stations_snapshot.to_csv(snapshot_path, index=False)
+
+# Cell -> county crosswalk so the app can attach County with a key merge
+crosswalk = county_crosswalk(grid_gdf, counties)
+crosswalk.to_csv(crosswalk_path, index=False)
+print(f" Saved cell -> county crosswalk ({(~crosswalk['Is_Majority']).sum()} border shares) to {crosswalk_path}")
+
+# --- Contiguous Priority Regions ---
+# Edge-connected Critical/High cells, dissolved into fundable areas
+regions = summarize_regions(
+    priority_gdf, label_regions(priority_gdf, priority_gdf["Priority_Score"] >= 60), crosswalk=crosswalk
+)
+regions.to_crs(epsg=4326).to_file(regions_path, driver="GeoJSON")
+print(f" Saved {len(regions)} contiguous Critical/High regions to {regions_path}")
+if len(regions):
+    print(regions[["Region_ID", "Num_Cells", "Area_SqMi", "Mean_Score", "Primary_County"]].head().to_string(index=False))
+
+# --- Priority Hotspots (spatial autocorrelation) ---
+# Queen contiguity built once from the cell lattice; LISA clusters and Gi*
+# hot spots separate significant clusters from isolated high scores
+if args.hotspot_permutations > 0:
+    print(f"\nTesting priority hotspots ({args.hotspot_permutations} permutations)...")
+    cell_weights = grid_weights(priority_gdf)
+    hotspots, global_moran = hotspot_table(priority_gdf["Priority_Score"], cell_weights, args.hotspot_permutations)
+    hotspots.insert(0, "Cell_ID", priority_gdf["Cell_ID"].to_numpy())
+    hotspots.to_csv(hotspots_path, index=False)
+    print(f" Global Moran's I = {global_moran['I']:.3f} (pseudo p = {global_moran['P_Sim']:.3f})")
+    print(f" {(hotspots['LISA_Cluster'] == 'High-High').sum()} High-High cells - saved to {hotspots_path}")
+
+# --- Weight Sensitivity ---
+# How robust each cell's priority is to the choice of criterion weights
+if args.sensitivity_samples > 0:
+    print(f"\nSweeping {args.sensitivity_samples} random weightings...")
+    sensitivity = weight_sensitivity(priority_gdf, args.sensitivity_samples, rank_samples=args.rank_samples)
+    sensitivity.insert(0, "Cell_ID", priority_gdf["Cell_ID"].to_numpy())
+    sensitivity.to_csv(sensitivity_path, index=False)
+    robust = (sensitivity["Pct_Critical_High"] >= 90).sum()
+    print(f" {robust} cells are Critical/High under 90%+ of weightings - saved to {sensitivity_path}")
 
 # Filter to only high-priority cells
 priority_zones = priority_gdf[
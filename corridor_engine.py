@@ -0,0 +1,496 @@
+# corridor_engine.py
+# Reusable building blocks for the corridor spacing analysis.
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+MILE_M = 1609.34  # meters per mile
+BUFFER_DISTANCE = 804.672  # 0.5 miles in meters - direct corridor access
+MIN_LEVEL2_PORTS = 4  # Level 2 ports needed to count as highway-capable
+INDEX_MAX_DISTANCE = 5 * MILE_M  # widest access buffer the station index supports
+SNAP_TOLERANCE = 50  # meters; segment endpoints in the same 50 m cell are joined
+NEVI_MAX_SPACING = 50 * MILE_M  # NEVI: DC fast stations no more than 50 miles apart
+NEVI_MAX_DISTANCE = 1 * MILE_M  # ...within 1 mile of the corridor
+NEVI_MIN_PORTS = 4  # ...with at least 4 DC fast ports
+
+# Vehicle classes for the corridor stage: planning range between charges,
+# how far off the corridor a driver will go, and which stations qualify
+# (min_level2_ports=None means Level 2 never qualifies)
+VEHICLE_PROFILES = {
+    "LDV": {"name": "Light-Duty EV", "range_mi": 200, "access_mi": 0.5,
+            "min_dc_fast_ports": 1, "min_level2_ports": MIN_LEVEL2_PORTS},
+    "MDV": {"name": "Medium-Duty Truck", "range_mi": 120, "access_mi": 1.0,
+            "min_dc_fast_ports": 2, "min_level2_ports": None},
+    "HDV": {"name": "Heavy-Duty Truck", "range_mi": 150, "access_mi": 1.0,
+            "min_dc_fast_ports": 4, "min_level2_ports": None},
+}
+
+
+def highway_capable(stations_df: pd.DataFrame) -> pd.Series:
+    """DC fast stations or stations with at least MIN_LEVEL2_PORTS Level 2 ports."""
+    dc_fast = pd.to_numeric(stations_df["ev_dc_fast_num"], errors="coerce").fillna(0)
+    level2 = pd.to_numeric(stations_df["ev_level2_evse_num"], errors="coerce").fillna(0)
+    return (dc_fast > 0) | (level2 >= MIN_LEVEL2_PORTS)
+
+
+def locate_stations(lines, points, max_distance: float = BUFFER_DISTANCE) -> pd.DataFrame:
+    """Finds every (corridor, station) pair within `max_distance` of each other.
+
+    One STRtree query over the station points and one vectorized
+    line_locate_point call. Returns Corridor_Idx / Station_Idx positions with
+    Distance_M (to the line) and Position_M (along the line).
+    """
+    lines, points = np.asarray(lines), np.asarray(points)
+    tree = shapely.STRtree(points)
+    corr_idx, stn_idx = tree.query(lines, predicate="dwithin", distance=max_distance)
+    return pd.DataFrame({
+        "Corridor_Idx": corr_idx,
+        "Station_Idx": stn_idx,
+        "Distance_M": shapely.distance(lines[corr_idx], points[stn_idx]),
+        "Position_M": shapely.line_locate_point(lines[corr_idx], points[stn_idx]),
+    })
+
+
+def gap_stats(positions, length_m: float):
+    """Average spacing and max gap (miles) for sorted station positions along a line.
+
+    Matches the corridor stage rules: with fewer than 2 stations both equal
+    the corridor length; otherwise gaps run start -> first station -> ... ->
+    last station -> end.
+    """
+    positions = np.sort(np.asarray(positions, dtype=float))
+    length_mi = length_m / MILE_M
+    if len(positions) < 2:
+        return length_mi, length_mi
+
+    gaps = np.diff(positions)
+    if positions[0] > 0:
+        gaps = np.concatenate([[positions[0]], gaps])
+    if positions[-1] < length_m:
+        gaps = np.concatenate([gaps, [length_m - positions[-1]]])
+    gaps = gaps / MILE_M
+    return float(gaps.mean()), float(gaps.max())
+
+
+# --- Station-to-Corridor Index ---
+def station_corridor_index(lines, stations_df: pd.DataFrame, points,
+                           max_distance: float = INDEX_MAX_DISTANCE) -> pd.DataFrame:
+    """Sparse table of every (corridor, station) pair within `max_distance`.
+
+    `points` are the projected station locations in `stations_df` row order.
+    Each row carries Distance_M to the line, Position_M along it and the
+    station's port counts, so spacing can be recomputed for any access
+    buffer or capacity filter without another spatial query.
+    """
+    pairs = locate_stations(lines, points, max_distance)
+    dc_fast = pd.to_numeric(stations_df["ev_dc_fast_num"], errors="coerce").fillna(0).to_numpy()
+    level2 = pd.to_numeric(stations_df["ev_level2_evse_num"], errors="coerce").fillna(0).to_numpy()
+    pairs["DC_Fast_Ports"] = dc_fast[pairs["Station_Idx"]].astype(int)
+    pairs["Level2_Ports"] = level2[pairs["Station_Idx"]].astype(int)
+    return pairs.sort_values(["Corridor_Idx", "Position_M"], kind="stable").reset_index(drop=True)
+
+
+def select_stations(index: pd.DataFrame, buffer_m: float = BUFFER_DISTANCE,
+                    min_level2_ports: int = MIN_LEVEL2_PORTS, dc_fast_only: bool = False,
+                    min_dc_fast_ports: int = 1) -> pd.DataFrame:
+    """Index rows within `buffer_m` of the line that have at least
+    `min_dc_fast_ports` DC fast ports or at least `min_level2_ports` Level 2
+    ports (DC fast only if `dc_fast_only`)."""
+    capable = index["DC_Fast_Ports"] >= max(min_dc_fast_ports, 1)
+    if not dc_fast_only:
+        capable |= index["Level2_Ports"] >= min_level2_ports
+    return index[capable & (index["Distance_M"] <= buffer_m)]
+
+
+def spacing_stats(index: pd.DataFrame, lengths_m, buffer_m: float = BUFFER_DISTANCE,
+                  min_level2_ports: int = MIN_LEVEL2_PORTS, dc_fast_only: bool = False,
+                  min_dc_fast_ports: int = 1) -> pd.DataFrame:
+    """Spacing statistics for every corridor from the station index.
+
+    Keeps the stations picked by select_stations(), then computes all
+    corridors' gaps at once with sorted-array diffs, following the same
+    rules as gap_stats(). Returns one row per entry of `lengths_m`.
+    """
+    kept = select_stations(index, buffer_m, min_level2_ports, dc_fast_only, min_dc_fast_ports)
+    return _spacing_table(kept, lengths_m)
+
+
+def _spacing_table(kept: pd.DataFrame, lengths_m) -> pd.DataFrame:
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    n = len(lengths_m)
+    corr = kept["Corridor_Idx"].to_numpy()
+    pos = kept["Position_M"].to_numpy()  # index rows are sorted by corridor, then position
+
+    num_stations = np.bincount(corr, minlength=n)
+    num_dc_fast = np.bincount(corr, weights=kept["DC_Fast_Ports"] > 0, minlength=n).astype(int)
+
+    gap_corr, gap_start, gap_end = gap_pieces(corr, pos, lengths_m)
+    gap_mi = (gap_end - gap_start) / MILE_M
+
+    gap_count = np.bincount(gap_corr, minlength=n)
+    gap_sum = np.bincount(gap_corr, weights=gap_mi, minlength=n)
+    gap_max = np.zeros(n)
+    np.maximum.at(gap_max, gap_corr, gap_mi)
+
+    return pd.DataFrame({
+        "Num_Stations": num_stations,
+        "DC_Fast_Count": num_dc_fast,
+        "Avg_Spacing_Miles": gap_sum / gap_count,
+        "Max_Gap_Miles": gap_max,
+        "Stations_per_Mile": num_stations / (lengths_m / MILE_M),
+    })
+
+
+def profile_stations(index: pd.DataFrame, profile: dict) -> pd.DataFrame:
+    """Index rows that qualify for one vehicle profile."""
+    level2 = profile.get("min_level2_ports")
+    return select_stations(
+        index, profile["access_mi"] * MILE_M, level2 or 0, level2 is None, profile["min_dc_fast_ports"]
+    )
+
+
+def profile_stats(index: pd.DataFrame, lengths_m, profiles: dict = VEHICLE_PROFILES) -> pd.DataFrame:
+    """Spacing statistics for several vehicle profiles from one shared station index.
+
+    Each profile's qualifying stations are stacked onto its own block of
+    corridor ids (profile k uses ids k * n ... k * n + n - 1), so every
+    profile's gaps come out of a single spacing pass. Returns one row per
+    entry of `lengths_m` with <KEY>_Stations, <KEY>_Avg_Spacing_Miles,
+    <KEY>_Max_Gap_Miles, <KEY>_Gap_Pct_of_Range and <KEY>_Within_Range
+    columns for every profile key.
+    """
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    n = len(lengths_m)
+    blocks = []
+    for k, profile in enumerate(profiles.values()):
+        kept = profile_stations(index, profile)[["Corridor_Idx", "Position_M", "DC_Fast_Ports"]].copy()
+        kept["Corridor_Idx"] += k * n
+        blocks.append(kept)
+    stacked = _spacing_table(pd.concat(blocks, ignore_index=True), np.tile(lengths_m, len(profiles)))
+
+    columns = {}
+    for k, (key, profile) in enumerate(profiles.items()):
+        block = stacked.iloc[k * n:(k + 1) * n]
+        max_gap = block["Max_Gap_Miles"].to_numpy()
+        columns[f"{key}_Stations"] = block["Num_Stations"].to_numpy()
+        columns[f"{key}_Avg_Spacing_Miles"] = block["Avg_Spacing_Miles"].to_numpy()
+        columns[f"{key}_Max_Gap_Miles"] = max_gap
+        columns[f"{key}_Gap_Pct_of_Range"] = max_gap / profile["range_mi"] * 100
+        columns[f"{key}_Within_Range"] = max_gap <= profile["range_mi"]
+    return pd.DataFrame(columns)
+
+
+def gap_categories(max_gap):
+    """Relative gap categories and 0-100 coverage scores from corridor max gaps.
+
+    Categories split at the 25th / 50th / 75th / 90th percentiles of the
+    given corridors, so they are relative to the set passed in.
+    """
+    gap = np.asarray(max_gap, dtype=float)
+    if gap.size == 0:
+        return np.array([], dtype=object), np.array([])
+    p25, p50, p75, p90 = np.percentile(gap, [25, 50, 75, 90])
+    category = np.select(
+        [gap <= p25, gap <= p50, gap <= p75, gap <= p90],
+        ["Best Covered", "Well Covered", "Adequate", "Moderate Gap"],
+        "Critical Gap",
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.select(
+            [gap <= p25, gap <= p50, gap <= p75, gap <= p90],
+            [
+                90 + (p25 - gap) / p25 * 10,  # 90-100
+                70 + (p50 - gap) / (p50 - p25) * 20,  # 70-90
+                50 + (p75 - gap) / (p75 - p50) * 20,  # 50-70
+                25 + (p90 - gap) / (p90 - p75) * 25,  # 25-50
+            ],
+            np.maximum(0, 25 - (gap - p90) / p90 * 25),  # 0-25
+        )
+    return category, score
+
+
+# --- Gap Stretches ---
+def gap_pieces(corr, pos, lengths_m, min_stations: int = 2):
+    """Every gap along every corridor from station positions sorted by corridor, then position.
+
+    Same rules as gap_stats(): a corridor with fewer than `min_stations`
+    stations (2, as there) is one full-length gap; otherwise gaps run
+    start -> first station, between neighbors and last station -> end, with
+    end pieces of zero length dropped. Pass min_stations=1 to split
+    single-station corridors at the station. Returns (corridor, start_m,
+    end_m) arrays sorted by corridor, then start.
+    """
+    corr, pos = np.asarray(corr, dtype=int), np.asarray(pos, dtype=float)
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    sparse = np.bincount(corr, minlength=len(lengths_m)) < min_stations
+    corr, pos = corr[~sparse[corr]], pos[~sparse[corr]]
+    first = np.r_[True, corr[1:] != corr[:-1]] if len(corr) else np.array([], dtype=bool)
+    last = np.r_[corr[1:] != corr[:-1], True] if len(corr) else np.array([], dtype=bool)
+    inner = np.flatnonzero(~first)
+    empty = np.flatnonzero(sparse)
+
+    gap_corr = np.concatenate([corr[first], corr[inner], corr[last], empty])
+    gap_start = np.concatenate([np.zeros(first.sum()), pos[inner - 1], pos[last], np.zeros(len(empty))])
+    gap_end = np.concatenate([pos[first], pos[inner], lengths_m[corr[last]], lengths_m[empty]])
+    keep = np.concatenate([
+        pos[first] > 0, np.ones(len(inner), dtype=bool), pos[last] < lengths_m[corr[last]], np.ones(len(empty), dtype=bool)
+    ])
+    order = np.lexsort((gap_start[keep], gap_corr[keep]))
+    return gap_corr[keep][order], gap_start[keep][order], gap_end[keep][order]
+
+
+def vertex_positions(lines):
+    """Coordinates of every line vertex with its line row and distance along the line."""
+    coords, line_of = shapely.get_coordinates(np.asarray(lines), return_index=True)
+    step = np.r_[0, np.hypot(*np.diff(coords, axis=0).T)]
+    step[np.r_[True, line_of[1:] != line_of[:-1]]] = 0
+    cum = np.cumsum(step)
+    starts = np.searchsorted(line_of, np.arange(len(lines)))
+    return coords, line_of, cum - cum[np.minimum(starts, len(cum) - 1)[line_of]]
+
+
+def line_substrings(lines, line_idx, start_m, end_m):
+    """Vectorized substrings of `lines[line_idx]` between two distances along each line.
+
+    Interior vertices come from one sorted vertex table and the cut points
+    from one line_interpolate_point call, so thousands of stretches are
+    built with a single linestrings() call.
+    """
+    lines = np.asarray(lines)
+    line_idx = np.asarray(line_idx, dtype=int)
+    start_m, end_m = np.asarray(start_m, dtype=float), np.asarray(end_m, dtype=float)
+    if len(line_idx) == 0:
+        return np.array([], dtype=object)
+    coords, line_of, position = vertex_positions(lines)
+    offset = np.r_[0, np.cumsum(shapely.length(lines) + 1)[:-1]]
+    vertex_key = offset[line_of] + position
+
+    lo = np.searchsorted(vertex_key, offset[line_idx] + start_m, side="right")
+    hi = np.searchsorted(vertex_key, offset[line_idx] + end_m, side="left")
+    inner = np.maximum(hi - lo, 0)
+    piece = np.repeat(np.arange(len(line_idx)), inner + 2)
+
+    # Per piece: cut point, interior vertices, cut point
+    rank = np.arange(len(piece)) - np.repeat(np.cumsum(inner + 2) - (inner + 2), inner + 2)
+    xy = np.empty((len(piece), 2))
+    is_start, is_end = rank == 0, rank == (inner + 1)[piece]
+    xy[is_start] = shapely.get_coordinates(shapely.line_interpolate_point(lines[line_idx], start_m))
+    xy[is_end] = shapely.get_coordinates(shapely.line_interpolate_point(lines[line_idx], end_m))
+    middle = ~(is_start | is_end)
+    xy[middle] = coords[(lo[piece] + rank - 1)[middle]]
+    return shapely.linestrings(xy, indices=piece)
+
+
+def gap_stretches(lines, corr, pos, min_gap_m: float = 0.0, rows=None) -> gpd.GeoDataFrame:
+    """Gaps longer than `min_gap_m` as line substrings with start/end mileposts.
+
+    `corr` / `pos` are station positions sorted by corridor, then position;
+    `rows` optionally limits the result to some corridors. The geometry is
+    in the CRS of `lines` (set it on the result).
+    """
+    lines = np.asarray(lines)
+    gap_corr, gap_start, gap_end = gap_pieces(corr, pos, shapely.length(lines))
+    keep = gap_end - gap_start > min_gap_m
+    if rows is not None:
+        keep &= np.isin(gap_corr, rows)
+    gap_corr, gap_start, gap_end = gap_corr[keep], gap_start[keep], gap_end[keep]
+    return gpd.GeoDataFrame({
+        "Corridor_Idx": gap_corr,
+        "Start_Mile": gap_start / MILE_M,
+        "End_Mile": gap_end / MILE_M,
+        "Gap_Miles": (gap_end - gap_start) / MILE_M,
+    }, geometry=line_substrings(lines, gap_corr, gap_start, gap_end))
+
+
+def distance_profile(lengths_m, corr, pos, step_m: float = 0.5 * MILE_M) -> pd.DataFrame:
+    """Distance along each corridor to the nearest station, sampled every `step_m`.
+
+    `corr` / `pos` are station positions sorted by corridor, then position.
+    Samples run from 0 to each corridor's end (always included); all
+    corridors are handled with one searchsorted over a concatenated
+    milepost axis. Distance_M is NaN on corridors without stations.
+    """
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    corr, pos = np.asarray(corr, dtype=int), np.asarray(pos, dtype=float)
+    count = np.floor(lengths_m / step_m).astype(int) + 1
+    sample_corr = np.repeat(np.arange(len(lengths_m)), count + 1)
+    rank = np.arange(len(sample_corr)) - np.repeat(np.cumsum(count + 1) - (count + 1), count + 1)
+    sample_pos = np.minimum(rank * step_m, lengths_m[sample_corr])
+    keep = np.r_[sample_pos[1:] != sample_pos[:-1], True] | (rank == 0)  # drop a duplicate end sample
+    sample_corr, sample_pos = sample_corr[keep], sample_pos[keep]
+
+    offset = np.r_[0, np.cumsum(lengths_m + 1)[:-1]]
+    station_key = offset[corr] + pos
+    sample_key = offset[sample_corr] + sample_pos
+    after = np.searchsorted(station_key, sample_key)
+    distance = np.full(len(sample_key), np.inf)
+    if len(station_key):
+        nxt = np.minimum(after, len(station_key) - 1)
+        prv = np.maximum(after - 1, 0)
+        distance = np.where(corr[nxt] == sample_corr, np.abs(station_key[nxt] - sample_key), np.inf)
+        distance = np.minimum(distance, np.where(corr[prv] == sample_corr, np.abs(sample_key - station_key[prv]), np.inf))
+    return pd.DataFrame({
+        "Corridor_Idx": sample_corr,
+        "Position_M": sample_pos,
+        "Distance_M": np.where(np.isfinite(distance), distance, np.nan),
+    })
+
+
+# --- NEVI Compliance ---
+def nevi_stations(index: pd.DataFrame, max_distance_m: float = NEVI_MAX_DISTANCE,
+                  min_ports: int = NEVI_MIN_PORTS) -> pd.DataFrame:
+    """Index rows that count toward the NEVI rule: enough DC fast ports, close enough to the line.
+
+    The station extract carries port counts but no power ratings, so every
+    DC fast port is taken to meet the 150 kW minimum.
+    """
+    return index[(index["DC_Fast_Ports"] >= min_ports) & (index["Distance_M"] <= max_distance_m)]
+
+
+def nevi_gaps(index: pd.DataFrame, lengths_m, max_spacing_m: float = NEVI_MAX_SPACING,
+              max_distance_m: float = NEVI_MAX_DISTANCE, min_ports: int = NEVI_MIN_PORTS) -> pd.DataFrame:
+    """Every gap between NEVI-qualifying stations, with the new sites needed to close it.
+
+    Corridor ends count as gap ends, so the first and last stations must
+    also be within `max_spacing_m` of them. A gap of G needs
+    ceil(G / max_spacing) - 1 evenly spaced new sites, which is the fewest
+    possible with existing stations kept; a corridor with no qualifying
+    station always needs at least one. Returns Corridor_Idx, Start_M,
+    End_M, Sites_Needed and NEVI_Compliant per gap.
+    """
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    kept = nevi_stations(index, max_distance_m, min_ports)
+    corr = kept["Corridor_Idx"].to_numpy()
+    gap_corr, gap_start, gap_end = gap_pieces(corr, kept["Position_M"].to_numpy(), lengths_m, min_stations=1)
+    sites = np.maximum(np.ceil((gap_end - gap_start) / max_spacing_m - 1e-9) - 1, 0).astype(int)
+    unserved = np.bincount(corr, minlength=len(lengths_m))[gap_corr] == 0
+    sites = np.where(unserved, np.maximum(sites, 1), sites)
+    return pd.DataFrame({
+        "Corridor_Idx": gap_corr,
+        "Start_M": gap_start,
+        "End_M": gap_end,
+        "Sites_Needed": sites,
+        "NEVI_Compliant": sites == 0,
+    })
+
+
+def nevi_compliance(gaps: pd.DataFrame, lengths_m) -> pd.DataFrame:
+    """Per-corridor NEVI summary from nevi_gaps(): one row per entry of `lengths_m`."""
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    n = len(lengths_m)
+    corr = gaps["Corridor_Idx"].to_numpy()
+    gap_m = (gaps["End_M"] - gaps["Start_M"]).to_numpy()
+    max_gap = np.zeros(n)
+    np.maximum.at(max_gap, corr, gap_m)
+    sites = np.bincount(corr, weights=gaps["Sites_Needed"], minlength=n).astype(int)
+    failing = np.bincount(corr, weights=gap_m * ~gaps["NEVI_Compliant"].to_numpy(), minlength=n)
+    return pd.DataFrame({
+        "NEVI_Max_Gap_Miles": max_gap / MILE_M,
+        "NEVI_Sites_Needed": sites,
+        "NEVI_Noncompliant_Miles": failing / MILE_M,
+        "NEVI_Compliant": sites == 0,
+    })
+
+
+def nevi_sites(gaps: pd.DataFrame) -> pd.DataFrame:
+    """Mileposts of the new sites from nevi_gaps(), evenly spaced inside each failing gap."""
+    need = gaps[gaps["Sites_Needed"] > 0]
+    k = need["Sites_Needed"].to_numpy()
+    gap = np.repeat(np.arange(len(need)), k)
+    j = np.arange(len(gap)) - np.repeat(np.cumsum(k) - k, k) + 1
+    start, end = need["Start_M"].to_numpy()[gap], need["End_M"].to_numpy()[gap]
+    return pd.DataFrame({
+        "Corridor_Idx": need["Corridor_Idx"].to_numpy()[gap],
+        "Position_M": start + (end - start) * j / (k[gap] + 1),
+    })
+
+
+# --- Route Assembly ---
+def union_find(n: int, left, right) -> np.ndarray:
+    """Root label of every node after joining each (left[i], right[i]) pair."""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # path halving
+            i = parent[i]
+        return i
+
+    for a, b in zip(np.asarray(left).tolist(), np.asarray(right).tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([find(i) for i in range(n)], dtype=int)
+
+
+def assemble_routes(segments: gpd.GeoDataFrame, name_col: str = "PRIMARY_NA",
+                    tolerance: float = SNAP_TOLERANCE) -> gpd.GeoDataFrame:
+    """Stitches corridor segments into continuous routes (projected CRS, meters).
+
+    Segment endpoints are quantized to `tolerance`-sized cells per route
+    name; endpoints sharing a cell become one node, snapped to the mean
+    position of its endpoints. Endpoints within half the tolerance always
+    meet. A union-find over shared nodes groups connected segments, and
+    line_merge joins each group into continuous lines. A group with
+    branches yields one row per merged line, all sharing its Route_ID.
+    Keeps `name_col` so the result drops into the per-corridor spacing code.
+    """
+    names = (
+        segments[name_col].fillna("Unknown").astype(str).to_numpy()
+        if name_col in segments.columns else np.full(len(segments), "Unknown", dtype=object)
+    )
+    parts, source = shapely.get_parts(segments.geometry.to_numpy(), return_index=True)
+    lineal = (shapely.get_type_id(parts) == 1) & (shapely.get_num_coordinates(parts) >= 2)
+    parts, source = parts[lineal], source[lineal]
+    n = len(parts)
+    if n == 0:
+        return gpd.GeoDataFrame(
+            {"Route_ID": [], name_col: [], "Num_Segments": []}, geometry=[], crs=segments.crs
+        )
+
+    # Endpoint nodes: endpoints of the same route sharing a quantized cell on
+    # any of four half-cell-offset lattices (so neighbors split by a cell
+    # edge still join), grouped with a union-find
+    coords, line_of = shapely.get_coordinates(parts, return_index=True)
+    starts = np.flatnonzero(np.r_[True, line_of[1:] != line_of[:-1]])
+    ends = np.r_[starts[1:] - 1, len(coords) - 1]
+    end_xy = np.vstack([coords[starts], coords[ends]])
+    name_code = np.tile(pd.factorize(names[source])[0], 2)
+    left, right = [], []
+    for offset in ((0, 0), (0.5, 0), (0, 0.5), (0.5, 0.5)):
+        cell = np.floor(end_xy / tolerance + offset).astype(np.int64)
+        _, key = np.unique(np.column_stack([name_code, cell]), axis=0, return_inverse=True)
+        order = np.argsort(key.ravel(), kind="stable")
+        same = key.ravel()[order][1:] == key.ravel()[order][:-1]
+        left.append(order[:-1][same])
+        right.append(order[1:][same])
+    node = np.unique(union_find(2 * n, np.concatenate(left), np.concatenate(right)), return_inverse=True)[1]
+
+    # Snap endpoints to their node's mean position so line_merge sees exact matches
+    count = np.bincount(node)
+    snapped_xy = np.column_stack([np.bincount(node, weights=end_xy[:, d]) / count for d in range(2)])
+    coords[starts], coords[ends] = snapped_xy[node[:n]], snapped_xy[node[n:]]
+    lines = shapely.linestrings(coords, indices=line_of)
+
+    # Union-find: parts sharing an endpoint node belong to the same route
+    endpoint_part = np.tile(np.arange(n), 2)
+    order = np.argsort(node, kind="stable")
+    same = node[order][1:] == node[order][:-1]
+    root = union_find(n, endpoint_part[order][:-1][same], endpoint_part[order][1:][same])
+    route_id = np.unique(root, return_inverse=True)[1]
+
+    by_route = np.argsort(route_id, kind="stable")
+    merged = shapely.line_merge(shapely.multilinestrings(lines[by_route], indices=route_id[by_route]))
+    pieces, piece_route = shapely.get_parts(merged, return_index=True)
+    keep = shapely.length(pieces) > 0
+    pieces, piece_route = pieces[keep], piece_route[keep]
+
+    first_part = np.full(route_id.max() + 1, n)
+    np.minimum.at(first_part, route_id, np.arange(n))
+    num_segments = pd.Series(source).groupby(route_id).nunique().to_numpy()
+    return gpd.GeoDataFrame({
+        "Route_ID": piece_route,
+        name_col: names[source[first_part[piece_route]]],
+        "Num_Segments": num_segments[piece_route],
+    }, geometry=pieces, crs=segments.crs)
@@ -0,0 +1,191 @@
+# hotspot_engine.py
+# Spatial autocorrelation (Moran's I, LISA, Getis-Ord Gi*) for grid cells and counties.
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from scipy.spatial import cKDTree
+from scipy.stats import norm
+
+from priority_engine import neighbor_index
+
+LISA_LABELS = {1: "High-High", 2: "Low-High", 3: "Low-Low", 4: "High-Low"}
+
+
+# --- Spatial Weights ---
+def contiguity_weights(geoms, tolerance: float = None) -> sparse.csr_matrix:
+    """Binary queen contiguity between polygons from one STRtree query.
+
+    Polygons within `tolerance` of each other (sharing an edge or a corner,
+    up to floating-point seams) are neighbors; the default is a millionth
+    of the median polygon's side, as dissolve_regions() snaps hex seams.
+    Islands with no touching polygon are linked to their nearest polygon
+    centroid, so every row has at least one neighbor.
+    """
+    geoms = np.asarray(geoms)
+    if tolerance is None:
+        tolerance = np.sqrt(np.median(shapely.area(geoms))) * 1e-6 if len(geoms) else 0.0
+    left, right = shapely.STRtree(geoms).query(geoms, predicate="dwithin", distance=tolerance)
+    keep = left != right
+    return _binary_weights(left[keep], right[keep], geoms)
+
+
+def grid_weights(grid: gpd.GeoDataFrame) -> sparse.csr_matrix:
+    """Queen contiguity for a priority grid, from lattice indices where it has them.
+
+    Hex grids (Hex_Q / Hex_R, 6 neighbors) and single-level square grids
+    (Grid_Col / Grid_Row, 8 neighbors) are linked with neighbor_index(), so
+    the weights do not depend on floating-point cell edges or the CRS the
+    grid was saved in. Adaptive grids mixing quadtree levels fall back to
+    contiguity_weights().
+    """
+    single_level = "Level" not in grid.columns or grid["Level"].nunique() <= 1
+    if "Hex_Q" not in grid.columns and not ("Grid_Col" in grid.columns and single_level):
+        return contiguity_weights(grid.geometry.to_numpy())
+    neighbors = neighbor_index(grid, queen=True)
+    left = np.repeat(np.arange(len(grid)), neighbors.shape[1])
+    right = neighbors.ravel()
+    return _binary_weights(left[right >= 0], right[right >= 0], grid.geometry.to_numpy())
+
+
+def _binary_weights(left, right, geoms) -> sparse.csr_matrix:
+    """Symmetric 0/1 matrix from neighbor pairs, with islands linked to their nearest centroid."""
+    n = len(geoms)
+    isolated = np.flatnonzero(np.bincount(left, minlength=n) == 0)
+    if len(isolated) and n > 1:
+        xy = shapely.get_coordinates(shapely.centroid(geoms))
+        _, nearest = cKDTree(xy).query(xy[isolated], k=2)
+        left = np.concatenate([left, isolated, nearest[:, 1]])
+        right = np.concatenate([right, nearest[:, 1], isolated])
+
+    weights = sparse.csr_matrix((np.ones(len(left)), (left, right)), shape=(n, n))
+    weights.data[:] = 1  # symmetric island links may have been added twice
+    return weights
+
+
+def row_standardize(weights: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Scales every row to sum to 1 (rows without neighbors stay zero)."""
+    sums = np.asarray(weights.sum(axis=1)).ravel()
+    scale = np.divide(1.0, sums, out=np.zeros_like(sums), where=sums > 0)
+    return sparse.diags(scale) @ weights
+
+
+# --- Global and Local Statistics ---
+def morans_i(values, weights: sparse.csr_matrix, permutations: int = 999, seed: int = 0,
+             batch_size: int = 100) -> dict:
+    """Global Moran's I with a permutation pseudo p-value.
+
+    `weights` are binary (row-standardized here). Permuted value vectors are
+    stacked into (n x batch) blocks so each batch is one sparse product.
+    """
+    rng = np.random.default_rng(seed)
+    z = np.asarray(values, dtype=float)
+    z = z - z.mean()
+    w = row_standardize(weights)
+    n, s0 = len(z), w.sum()
+    denom = (z @ z) * s0 / n
+    observed = (z @ (w @ z)) / denom if denom > 0 else 0.0
+
+    simulated = np.empty(permutations)
+    for start in range(0, permutations, batch_size):
+        size = min(batch_size, permutations - start)
+        shuffled = np.column_stack([rng.permutation(z) for _ in range(size)])
+        simulated[start:start + size] = np.einsum("ij,ij->j", shuffled, w @ shuffled) / denom if denom > 0 else 0
+
+    expected = -1.0 / (n - 1)
+    extreme = (simulated >= observed).sum() if observed >= simulated.mean() else (simulated <= observed).sum()
+    return {
+        "I": float(observed),
+        "Expected_I": expected,
+        "P_Sim": float((extreme + 1) / (permutations + 1)),
+        "Z_Sim": float((observed - simulated.mean()) / simulated.std()) if simulated.std() > 0 else 0.0,
+    }
+
+
+def local_morans(values, weights: sparse.csr_matrix, permutations: int = 999, seed: int = 0,
+                 alpha: float = 0.05, block_size: int = 2 ** 23) -> pd.DataFrame:
+    """Local Moran's I (LISA) with conditional permutation inference.
+
+    Each cell's neighbors are replaced by random draws from the other n - 1
+    observations, keeping the cell itself fixed. As in PySAL's conditional
+    randomization, every permutation draws one set of distinct ids from
+    0..n-2 that all cells share: a cell with k neighbors takes the first k
+    and shifts ids at or above its own row up by one, so its draws are
+    without replacement and never include itself. Lags are evaluated for
+    (cells x permutations x neighbors) blocks of about `block_size` values,
+    one neighbor count at a time. Returns Local_I, the spatial lag, a folded
+    pseudo p-value (LISA_P) and LISA_Cluster (High-High, Low-Low, High-Low,
+    Low-High or Not Significant at `alpha`).
+    """
+    rng = np.random.default_rng(seed)
+    x = np.asarray(values, dtype=float)
+    n = len(x)
+    z = x - x.mean()
+    m2 = (z @ z) / n
+    weights = sparse.csr_matrix(weights)
+    cardinality = np.diff(weights.indptr)
+    lag = row_standardize(weights) @ z
+    local_i = z * lag / m2 if m2 > 0 else np.zeros(n)
+
+    # Count permutations at least as extreme as the observed lag, cells grouped by neighbor count
+    above = np.zeros(n)
+    z32 = z.astype(np.float32)
+    max_k = int(cardinality.max(initial=0))
+    permuted_ids = np.array(
+        [rng.choice(n - 1, max_k, replace=False) for _ in range(permutations)], dtype=np.int32
+    ).reshape(permutations, max_k)
+    for k in np.unique(cardinality[cardinality > 0]):
+        cells = np.flatnonzero(cardinality == k)
+        batch_size = max(1, block_size // (len(cells) * k))
+        for start in range(0, permutations, batch_size):
+            size = min(batch_size, permutations - start)
+            draws = np.broadcast_to(permuted_ids[None, start:start + size, :k], (len(cells), size, k))
+            draws = draws + (draws >= cells[:, None, None])  # skip the cell itself
+            sim_lag = z32[draws].sum(axis=2) / k
+            above[cells] += (sim_lag >= lag[cells, None]).sum(axis=1)
+    extreme = np.minimum(above, permutations - above)
+    p_sim = (extreme + 1) / (permutations + 1)
+
+    quadrant = np.select(
+        [(z > 0) & (lag > 0), (z < 0) & (lag > 0), (z < 0) & (lag < 0), (z > 0) & (lag < 0)],
+        [1, 2, 3, 4], 0,
+    )
+    significant = (p_sim <= alpha) & (quadrant > 0) & (cardinality > 0)
+    cluster = np.where(significant, pd.Series(quadrant).map(LISA_LABELS).to_numpy(), "Not Significant")
+    return pd.DataFrame({"Local_I": local_i, "Spatial_Lag": lag, "LISA_P": p_sim, "LISA_Cluster": cluster})
+
+
+def getis_ord_g_star(values, weights: sparse.csr_matrix) -> pd.DataFrame:
+    """Getis-Ord Gi* z-scores with the analytic normal approximation.
+
+    Uses binary weights with each cell included in its own neighborhood.
+    Hotspot bins follow the usual 90 / 95 / 99% confidence bands.
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x)
+    w = sparse.csr_matrix(weights, dtype=float).copy()
+    w.setdiag(1)
+    w.eliminate_zeros()
+
+    mean = x.mean()
+    s = np.sqrt((x @ x) / n - mean ** 2)
+    w_sum = np.asarray(w.sum(axis=1)).ravel()
+    w_sq = np.asarray(w.multiply(w).sum(axis=1)).ravel()
+    spread = s * np.sqrt(np.maximum(n * w_sq - w_sum ** 2, 0) / (n - 1))
+    gi_z = np.divide(w @ x - mean * w_sum, spread, out=np.zeros(n), where=spread > 0)
+    gi_p = 2 * norm.sf(np.abs(gi_z))
+
+    confidence = np.select([gi_p <= 0.01, gi_p <= 0.05, gi_p <= 0.10], ["99%", "95%", "90%"], "")
+    hotspot = np.where(
+        confidence == "", "Not Significant",
+        np.char.add(np.where(gi_z > 0, "Hot Spot ", "Cold Spot "), confidence.astype(str)),
+    )
+    return pd.DataFrame({"Gi_Z": gi_z, "Gi_P": gi_p, "Gi_Hotspot": hotspot})
+
+
+def hotspot_table(values, weights: sparse.csr_matrix, permutations: int = 999, seed: int = 0,
+                  alpha: float = 0.05):
+    """LISA and Gi* columns for one variable, plus its global Moran's I summary."""
+    local = local_morans(values, weights, permutations, seed, alpha)
+    return pd.concat([local, getis_ord_g_star(values, weights)], axis=1), morans_i(values, weights, permutations, seed)
@@ -0,0 +1,172 @@
+# network_engine.py
+# Network-distance charger coverage over the corridor road graph.
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from corridor_engine import BUFFER_DISTANCE, MILE_M, locate_stations, vertex_positions
+
+NODE_PRECISION = 1.0  # meters; points closer than this share a graph node
+COVERAGE_RADIUS = 25 * MILE_M  # within 25 network miles of a charger = 50-mile spacing
+
+
+class CorridorNetwork:
+    """Road graph over corridor lines for network distance to the nearest charger.
+
+    Built once per set of lines (projected CRS, meters). Nodes are line
+    vertices plus crossings between lines, so a driver at an interchange
+    can reach chargers on the crossing corridor. Each solve() splices
+    station positions into the cached node table as extra nodes and runs
+    one multi-source Dijkstra, so re-solving after station changes skips
+    the geometry work entirely.
+    """
+
+    def __init__(self, lines, names=None):
+        self.lines = np.asarray(lines)
+        self.names = np.asarray(names) if names is not None else np.full(len(self.lines), "Unknown", dtype=object)
+        self.lengths = shapely.length(self.lines)
+        self.line_tree = shapely.STRtree(self.lines)
+
+        # Line vertices with their position along the line
+        coords, line_of, position = vertex_positions(self.lines)
+
+        # Crossings between different lines, located on both of them
+        left, right = self.line_tree.query(self.lines, predicate="intersects")
+        pair = left < right
+        left, right = left[pair], right[pair]
+        crossing_xy, crossing_of = shapely.get_coordinates(
+            shapely.intersection(self.lines[left], self.lines[right]), return_index=True
+        )
+        crossing_pts = shapely.points(crossing_xy)
+        a, b = left[crossing_of], right[crossing_of]
+
+        node_line = np.concatenate([line_of, a, b])
+        node_pos = np.concatenate([
+            position,
+            shapely.line_locate_point(self.lines[a], crossing_pts),
+            shapely.line_locate_point(self.lines[b], crossing_pts),
+        ])
+        node_xy = np.vstack([coords, crossing_xy, crossing_xy])
+        _, node_id = np.unique(np.round(node_xy / NODE_PRECISION).astype(np.int64), axis=0, return_inverse=True)
+
+        # Node table sorted once along the lines; solve() merges stations into it
+        self.line_offset = np.r_[0, np.cumsum(self.lengths + 1)[:-1]]
+        node_key = self.line_offset[node_line] + node_pos
+        order = np.argsort(node_key, kind="stable")
+        self.node_key, self.node_line, self.node_pos = node_key[order], node_line[order], node_pos[order]
+        self.node_id = node_id.ravel()[order]
+        self.num_nodes = int(self.node_id.max()) + 1 if len(self.node_id) else 0
+
+    def solve(self, station_points, access_distance: float = BUFFER_DISTANCE) -> pd.DataFrame:
+        """Network distance to the nearest charger at both ends of every edge.
+
+        Stations within `access_distance` of a line are snapped onto it (a
+        station at an interchange snaps to every line it serves) and become
+        zero-distance sources. Returns one row per edge: Line_Idx,
+        Start_M / End_M along the line and Start_Dist_M / End_Dist_M
+        (inf where no charger is reachable).
+        """
+        pairs = locate_stations(self.lines, np.asarray(station_points), access_distance)
+        return self.solve_positions(pairs["Corridor_Idx"].to_numpy(), pairs["Position_M"].to_numpy())
+
+    def solve_positions(self, station_line, station_pos) -> pd.DataFrame:
+        """solve() for stations already snapped to (line row, position along line)."""
+        station_line = np.asarray(station_line, dtype=int)
+        station_pos = np.clip(np.asarray(station_pos, dtype=float), 0, self.lengths[station_line])
+        station_key = self.line_offset[station_line] + station_pos
+        order = np.argsort(station_key)  # np.insert keeps the given order at equal slots
+        station_line, station_pos, station_key = station_line[order], station_pos[order], station_key[order]
+        station_node = self.num_nodes + np.arange(len(station_line))
+        at = np.searchsorted(self.node_key, station_key, side="right")
+        line = np.insert(self.node_line, at, station_line)
+        pos = np.insert(self.node_pos, at, station_pos)
+        node = np.insert(self.node_id, at, station_node)
+        consecutive = line[1:] == line[:-1]
+        u, v = node[:-1][consecutive], node[1:][consecutive]
+        start, end = pos[:-1][consecutive], pos[1:][consecutive]
+        edge_line = line[:-1][consecutive]
+
+        # Overlapping lines give parallel edges; keep the shortest (csr_matrix would sum them)
+        n = self.num_nodes + len(station_line)
+        rows, cols = np.r_[u, v].astype(np.int64), np.r_[v, u].astype(np.int64)
+        weight = np.tile(np.maximum(end - start, 1e-9), 2)  # csgraph drops explicit zeros
+        pair_key = rows * n + cols
+        order = np.argsort(pair_key)
+        first = np.flatnonzero(np.r_[True, np.diff(pair_key[order]) != 0])
+        keep = order[first]
+        shortest = np.minimum.reduceat(weight[order], first) if len(first) else weight[:0]
+        graph = sparse.csr_matrix((shortest, (rows[keep], cols[keep])), shape=(n, n))
+        if len(station_line):
+            dist = csgraph.dijkstra(graph, directed=True, indices=station_node, min_only=True)
+        else:
+            dist = np.full(n, np.inf)
+
+        return pd.DataFrame({
+            "Line_Idx": edge_line,
+            "Start_M": start,
+            "End_M": end,
+            "Start_Dist_M": dist[u],
+            "End_Dist_M": dist[v],
+        })
+
+    @staticmethod
+    def distance_at(edges: pd.DataFrame, line_idx, positions) -> np.ndarray:
+        """Network distance to the nearest charger at arbitrary points along lines."""
+        line_idx = np.asarray(line_idx)
+        positions = np.asarray(positions, dtype=float)
+        keys = edges["Line_Idx"].to_numpy() * 1e9 + edges["Start_M"].to_numpy()
+        k = np.clip(np.searchsorted(keys, line_idx * 1e9 + positions, side="right") - 1, 0, len(edges) - 1)
+        t = positions - edges["Start_M"].to_numpy()[k]
+        remaining = edges["End_M"].to_numpy()[k] - positions
+        return np.minimum(edges["Start_Dist_M"].to_numpy()[k] + t, edges["End_Dist_M"].to_numpy()[k] + remaining)
+
+    def uncovered_stretches(self, edges: pd.DataFrame, radius: float = COVERAGE_RADIUS) -> pd.DataFrame:
+        """Continuous stretches farther than `radius` (network) from any charger.
+
+        Within an edge the distance is min(du + t, dv + L - t), so the
+        uncovered part is the interval where both exceed `radius`. Touching
+        intervals along a line are merged. Returns Line_Idx, Road_Name,
+        Start_Mile, End_Mile and Length_Miles, longest first.
+        """
+        start, end = edges["Start_M"].to_numpy(), edges["End_M"].to_numpy()
+        du, dv = edges["Start_Dist_M"].to_numpy(), edges["End_Dist_M"].to_numpy()
+        with np.errstate(invalid="ignore"):
+            lo = start + np.clip(radius - du, 0, end - start)
+            hi = end - np.clip(radius - dv, 0, end - start)
+        open_ = hi > lo
+        line, lo, hi = edges["Line_Idx"].to_numpy()[open_], lo[open_], hi[open_]
+
+        # Merge intervals that touch along the same line (edges are sorted by line, position)
+        new_stretch = np.r_[True, (line[1:] != line[:-1]) | (lo[1:] > hi[:-1] + 1e-6)]
+        stretch = np.cumsum(new_stretch) - 1
+        stretches = pd.DataFrame({"Line_Idx": line, "Start_M": lo, "End_M": hi}).groupby(stretch).agg(
+            Line_Idx=("Line_Idx", "first"), Start_M=("Start_M", "min"), End_M=("End_M", "max")
+        )
+        stretches["Road_Name"] = self.names[stretches["Line_Idx"].to_numpy()] if len(stretches) else []
+        stretches["Start_Mile"] = stretches["Start_M"] / MILE_M
+        stretches["End_Mile"] = stretches["End_M"] / MILE_M
+        stretches["Length_Miles"] = (stretches["End_M"] - stretches["Start_M"]) / MILE_M
+        return stretches.drop(columns=["Start_M", "End_M"]).sort_values(
+            "Length_Miles", ascending=False
+        ).reset_index(drop=True)
+
+    def line_summary(self, edges: pd.DataFrame, radius: float = COVERAGE_RADIUS) -> pd.DataFrame:
+        """Per line: farthest network distance to a charger and longest uncovered stretch (miles)."""
+        length = edges["End_M"].to_numpy() - edges["Start_M"].to_numpy()
+        du, dv = edges["Start_Dist_M"].to_numpy(), edges["End_Dist_M"].to_numpy()
+        with np.errstate(invalid="ignore"):
+            t_peak = np.clip((dv + length - du) / 2, 0, length)
+            peak = np.where(np.isfinite(du) | np.isfinite(dv), np.minimum(du + t_peak, dv + length - t_peak), np.inf)
+
+        n = len(self.lines)
+        farthest = np.zeros(n)
+        np.maximum.at(farthest, edges["Line_Idx"].to_numpy(), peak)
+        stretches = self.uncovered_stretches(edges, radius)
+        longest = np.zeros(n)
+        np.maximum.at(longest, stretches["Line_Idx"].to_numpy(dtype=int), stretches["Length_Miles"].to_numpy())
+        return pd.DataFrame({
+            "Max_Charger_Distance_Miles": np.where(np.isfinite(farthest), farthest / MILE_M, np.nan),
+            "Longest_Uncovered_Miles": longest,
+        })
@@ -4,10 +4,28 @@ import folium
 from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import branca.colormap as cm
 from pathlib import Path
 import base64
+import plotly.graph_objects as go
+import shapely
+
+from corridor_engine import (
+    INDEX_MAX_DISTANCE, MILE_M, MIN_LEVEL2_PORTS, NEVI_MAX_DISTANCE, NEVI_MAX_SPACING, NEVI_MIN_PORTS, VEHICLE_PROFILES, distance_profile,
+    gap_categories, gap_stretches, line_substrings, nevi_compliance, nevi_gaps, nevi_sites, select_stations,
+    spacing_stats
+)
+from network_engine import COVERAGE_RADIUS, CorridorNetwork
+from trip_engine import simulate_trips, trip_failure_rates
+from queue_engine import (
+    DC_SERVICE_HOURS, DC_SESSIONS_PER_EV_DAY, L2_SERVICE_HOURS, L2_SESSIONS_PER_EV_DAY, PEAK_HOUR_SHARE,
+    county_queue_rollup, station_queues
+)
+from priority_engine import assign_priority, composite_score, density_scores, label_regions, summarize_regions
+from siting_engine import PARETO_OBJECTIVES, cell_centers, coverage_matrix, pareto_frontier, site_stations
+from whatif_engine import WhatIfIndex
 
 
 # ---------------- Page Setup ----------------
@@ -148,8 +166,18 @@ dac_path = GEO_PATH + "Final_DAC_Attributes.geojson"
 corridors_path = GEO_PATH + "AltFuels_rounds1_7_2023_11_07.geojson"
 eq_geo = GEO_PATH + "Equity_Coverage.geojson"
 queue_geo = GEO_PATH + "Queue_Risk_Analysis.geojson"
+station_queue_geo = GEO_PATH + "Station_Queue_Risk.geojson"
 corridor_spacing_geo = GEO_PATH + "Corridor_Spacing_Analysis.geojson"
 corridor_gaps_geo = GEO_PATH + "Corridor_Coverage_Gaps.geojson"
+corridor_segments_parquet = GEO_PATH + "Corridor_Segments.parquet"
+corridor_station_index_parquet = GEO_PATH + "Corridor_Station_Index.parquet"
+corridor_profile_parquet = GEO_PATH + "Corridor_Charger_Profile.parquet"
+corridor_nevi_sites_geo = GEO_PATH + "Corridor_NEVI_Sites.geojson"
+priority_zones_geo = GEO_PATH + "Station_Priority_Zones.geojson"
+priority_grid_parquet = GEO_PATH + "Station_Priority_Grid.parquet"
+priority_county_csv = GEO_PATH + "Priority_Cell_County.csv"
+priority_sensitivity_csv = GEO_PATH + "Priority_Weight_Sensitivity.csv"
+priority_hotspots_csv = GEO_PATH + "Priority_Hotspots.csv"
 station_csv = DATA_PATH + "NY EV Charging stations_full.csv"
 
 # ---------------- Cached Data Loaders ----------------
@@ -157,10 +185,110 @@ station_csv = DATA_PATH + "NY EV Charging stations_full.csv"
 def load_geojson(path: str):
     return gpd.read_file(path)
 
+@st.cache_data(show_spinner=False)
+def load_parquet(path: str):
+    return gpd.read_parquet(path)
+
 @st.cache_data(show_spinner=False)
 def load_csv(path: str):
     return pd.read_csv(path)
 
+@st.cache_data(show_spinner=False)
+def load_table(path: str):
+    return pd.read_parquet(path)
+
+@st.cache_data(show_spinner=False)
+def load_cell_centers(path: str):
+    """Projected cell centroids of a priority grid file (row order preserved)"""
+    gdf = load_parquet(path) if path.endswith(".parquet") else load_geojson(path)
+    return cell_centers(gdf)
+
+@st.cache_resource(show_spinner=False)
+def load_whatif_index(grid_path: str):
+    """Spatial indexes kept in the app process for hypothetical-station updates"""
+    grid = load_parquet(grid_path) if grid_path.endswith(".parquet") else load_geojson(grid_path)
+    return WhatIfIndex(grid, load_geojson(corridor_spacing_geo), load_csv(station_csv))
+
+@st.cache_resource(show_spinner=False)
+def load_corridor_network(path: str):
+    """Road graph over the clipped corridor segments, re-solved for each station filter"""
+    segments = load_parquet(path).to_crs(epsg=5070)
+    return CorridorNetwork(segments.geometry.to_numpy(), segments["Road_Name"].to_numpy())
+
+@st.cache_data(show_spinner=False)
+def simulated_trip_rates(access_buffer, min_level2_ports, dc_fast_only, min_dc_fast_ports, min_length, range_mi,
+                         n_trips=200_000):
+    """Per-corridor Completed / Detour / Stranded trip shares for the current station rules"""
+    index = load_table(corridor_station_index_parquet)
+    lengths = load_parquet(corridor_segments_parquet)["Length_M"].to_numpy()
+    stops = select_stations(index, access_buffer * MILE_M, min_level2_ports, dc_fast_only, min_dc_fast_ports)
+    detour = select_stations(index, INDEX_MAX_DISTANCE, min_level2_ports, dc_fast_only, min_dc_fast_ports)
+    trips = simulate_trips(
+        lengths, stops["Corridor_Idx"], stops["Position_M"], n_trips,
+        detour=(detour["Corridor_Idx"], detour["Position_M"]),
+        route_weights=np.where(lengths >= min_length * MILE_M, lengths, 0),
+        range_mi=range_mi,
+    )
+    return trip_failure_rates(trips, len(lengths))
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def cached_site_coverage(centers, radius_mi, candidates):
+    """Zone x candidate coverage matrix (CSC and CSR), shared by reruns that only change weights or K"""
+    # cache_resource: the matrices run to millions of entries statewide, so skip cache_data's pickled copies
+    coverage = coverage_matrix(centers, centers[np.flatnonzero(candidates)], radius_mi * MILE_M)
+    return coverage, coverage.tocsr()
+
+@st.cache_data(show_spinner=False)
+def cached_site_stations(grid_path, components, weights, k, radius_mi, candidates, method, _grid):
+    """Chosen sites for one grid file / component scores / weighting / K / radius / candidate set / solver"""
+    centers = load_cell_centers(grid_path)
+    if len(centers) != len(_grid):
+        centers = cell_centers(_grid)
+    coverage, coverage_rows = cached_site_coverage(centers, radius_mi, candidates)
+    sites = site_stations(
+        _grid, k, radius_mi=radius_mi, weights=dict(weights), candidates=candidates, method=method,
+        coverage=coverage, coverage_rows=coverage_rows,
+    )
+    return sites, dict(sites.attrs)
+
+@st.cache_data(show_spinner=False)
+def cached_pareto_frontier(grid_path, components, centers, k, radius_mi, candidates):
+    """Pareto frontier with corridor max-gap reduction measured on the what-if station mileposts"""
+    corridor_gaps = load_whatif_index(grid_path).corridor_gap_inputs()
+    return pareto_frontier(components, centers, k, radius_mi, candidates=candidates, corridor_gaps=corridor_gaps)
+
+# ---------------- Hotspot Styling ----------------
+HOTSPOT_FIELDS = {"LISA clusters": "LISA_Cluster", "Gi* hot spots": "Gi_Hotspot"}
+HOTSPOT_COLORS = {
+    "High-High": "#b2182b", "Low-Low": "#2166ac", "High-Low": "#f4a582", "Low-High": "#92c5de",
+    "Hot Spot 99%": "#b2182b", "Hot Spot 95%": "#ef8a62", "Hot Spot 90%": "#fddbc7",
+    "Cold Spot 99%": "#2166ac", "Cold Spot 95%": "#67a9cf", "Cold Spot 90%": "#d1e5f0",
+}
+
+def add_hotspot_layer(m, gdf: gpd.GeoDataFrame, field: str, name: str, tooltip_fields, tooltip_aliases):
+    """Draws significant LISA clusters / Gi* hot and cold spots; non-significant features are skipped"""
+    significant = gdf[gdf[field].isin(list(HOTSPOT_COLORS))]
+    if significant.empty:
+        return
+    folium.GeoJson(
+        significant[list(dict.fromkeys(tooltip_fields + [field])) + ["geometry"]],
+        name=name,
+        style_function=lambda f: {
+            "fillColor": HOTSPOT_COLORS.get(f["properties"].get(field), "#ffffff"),
+            "color": "#333",
+            "weight": 0.5,
+            "fillOpacity": 0.7,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=tooltip_fields,
+            aliases=tooltip_aliases,
+            sticky=True,
+            labels=True,
+            style="font-size: 12px;"
+        ),
+        show=True,
+    ).add_to(m)
+
 def simplify_geometries(gdf: gpd.GeoDataFrame, tolerance=0.001):
     gdf = gdf.copy()
     gdf["geometry"] = gdf["geometry"].simplify(tolerance, preserve_topology=True)
@@ -274,6 +402,9 @@ if "current_mode" not in st.session_state:
     st.session_state.current_mode = "default"
 if "show_stations" not in st.session_state:
     st.session_state.show_stations = False
+if "whatif_stations" not in st.session_state:
+    st.session_state.whatif_stations = []
+    st.session_state.whatif_last_click = None
 
 # ---------------- Analysis Mode Selection ----------------
 st.subheader("Select Analysis Mode")
@@ -469,6 +600,10 @@ elif st.session_state.current_mode == "queue":
         - **Station Coverage**: Geographic distribution and density of charging stations (40% weight)
         
         Higher scores indicate areas where EV drivers may experience longer wait times or difficulty finding available chargers.
+
+        **Station Queues** model each station's Level 2 and DC fast ports as M/M/c (Erlang C) queues at the peak hour.
+        Nearby registrations are split across stations by port count and distance; the sliders below recompute
+        every station's wait probability and expected wait.
         """)
     
     st.markdown("Adjust Risk Parameters")
@@ -481,7 +616,27 @@ elif st.session_state.current_mode == "queue":
                                 help="Counties exceeding this ratio are flagged critical")
     with col_c:
         show_stations_toggle = st.checkbox("Show Charging Stations", value=True, key="show_stations_queue")
+        queue_hotspots = st.selectbox(
+            "Hotspot Overlay", ["None"] + list(HOTSPOT_FIELDS), key="queue_hotspots",
+            help="Statistically significant clusters of queue risk (999 permutations / Gi* z-scores)"
+        )
     
+    with st.expander("Station Queue Model (M/M/c)", expanded=False):
+        q_a, q_b, q_c = st.columns(3)
+        with q_a:
+            l2_sessions = st.slider("Level 2 sessions per EV per day", 0.01, 0.20, L2_SESSIONS_PER_EV_DAY, step=0.01,
+                                    key="queue_l2_sessions")
+            l2_service = st.slider("Level 2 session (hours)", 1.0, 6.0, L2_SERVICE_HOURS, step=0.5,
+                                   key="queue_l2_service")
+        with q_b:
+            dc_sessions = st.slider("DC fast sessions per EV per day", 0.005, 0.10, DC_SESSIONS_PER_EV_DAY,
+                                    step=0.005, format="%.3f", key="queue_dc_sessions")
+            dc_service_min = st.slider("DC fast session (minutes)", 15, 90, int(DC_SERVICE_HOURS * 60), step=5,
+                                       key="queue_dc_service")
+        with q_c:
+            peak_share = st.slider("Peak-hour share of daily sessions (%)", 5, 30, int(PEAK_HOUR_SHARE * 100),
+                                   key="queue_peak_share")
+
     st.info(f"Highlighting counties with Queue Risk Score ≥ {risk_threshold} or EVs/Port ≥ {ev_port_max}")
 
     # Load queue risk data OUTSIDE spinner so it updates with slider changes
@@ -503,6 +658,27 @@ elif st.session_state.current_mode == "queue":
         st.error(f"Failed to load queue risk data: {e}")
         queue_df = None
 
+    # Station queues recomputed for the current assumptions (allocated demand is stored per station)
+    station_queue_df = None
+    if queue_df is not None and Path(station_queue_geo).exists():
+        station_queue_df = load_geojson(station_queue_geo).copy()
+        live_queues = station_queues(
+            station_queue_df[["L2_EVs", "DC_EVs"]],
+            station_queue_df["ev_level2_evse_num"].fillna(0).to_numpy(),
+            station_queue_df["ev_dc_fast_num"].fillna(0).to_numpy(),
+            l2_sessions=l2_sessions, dc_sessions=dc_sessions, peak_share=peak_share / 100,
+            l2_service=l2_service, dc_service=dc_service_min / 60,
+        )
+        station_queue_df = station_queue_df.drop(columns=live_queues.columns, errors="ignore").join(live_queues)
+        county_queues = county_queue_rollup(station_queue_df, station_queue_df["NAME"].fillna("Unknown"))
+        queue_df = queue_df.drop(columns=county_queues.columns.drop("NAME"), errors="ignore").merge(
+            county_queues, on="NAME", how="left"
+        )
+        for col in county_queues.columns.drop("NAME"):
+            queue_df[col] = queue_df[col].fillna(0)
+        queue_df["Avg_Wait_Minutes"] = queue_df["Avg_Wait_Minutes"].round(1)
+        queue_df["Avg_Wait_Pct"] = (queue_df["Avg_Wait_Prob"] * 100).round(1)
+
     if queue_df is not None:
         with st.spinner("Generating risk map..."):
             # Create map
@@ -546,8 +722,13 @@ elif st.session_state.current_mode == "queue":
                 style_function=risk_style,
                 highlight_function=lambda f: {"weight": 3, "color": "#000", "fillOpacity": 0.9},
                 tooltip=folium.GeoJsonTooltip(
-                    fields=["NAME", "Queue_Risk_Score", "EVs_per_Port", "Station_Count", "Total_EVs", "Risk_Category"],
-                    aliases=["County:", "Risk Score:", "EVs per Port:", "Stations:", "Total EVs:", "Risk Level:"],
+                    fields=["NAME", "Queue_Risk_Score", "EVs_per_Port", "Station_Count", "Total_EVs", "Risk_Category"] + (
+                        ["Avg_Wait_Pct", "Avg_Wait_Minutes", "Overloaded_Stations"] if station_queue_df is not None else []
+                    ),
+                    aliases=["County:", "Risk Score:", "EVs per Port:", "Stations:", "Total EVs:", "Risk Level:"] + (
+                        ["Peak Wait Chance (%):", "Avg Peak Wait (min):", "Overloaded Stations:"]
+                        if station_queue_df is not None else []
+                    ),
                     sticky=True,
                     labels=True,
                     style="font-size: 13px; font-weight: bold;"
@@ -557,8 +738,47 @@ elif st.session_state.current_mode == "queue":
             
             colormap.add_to(m)
             
+            # Significant spatial clusters of queue risk
+            if queue_hotspots != "None":
+                field = HOTSPOT_FIELDS[queue_hotspots]
+                if field in queue_df.columns:
+                    add_hotspot_layer(
+                        m, queue_df, field, f"Queue Risk {queue_hotspots}",
+                        ["NAME", "Queue_Risk_Score", field], ["County:", "Risk Score:", "Cluster:"]
+                    )
+                else:
+                    st.info("Re-run `calculate_queue_risk.py` to add hotspot statistics.")
+            
+            # Charging stations colored by their own modeled congestion
+            if show_stations_toggle and station_queue_df is not None:
+                congestion_colors = {"Low": "#1a9850", "Moderate": "#fee08b", "High": "#f46d43", "Overloaded": "#a50026"}
+                station_layer = folium.FeatureGroup(name="Station Congestion (M/M/c)")
+                for r in station_queue_df.itertuples():
+                    color = congestion_colors.get(r.Congestion, "#999")
+                    wait_text = "overloaded" if r.Overloaded else f"{r.Wait_Minutes:.1f} min"
+                    folium.CircleMarker(
+                        location=[r.geometry.y, r.geometry.x],
+                        radius=3,
+                        color=color,
+                        fill=True,
+                        fill_color=color,
+                        fill_opacity=0.8,
+                        weight=1.5,
+                        popup=folium.Popup(
+                            f"<b>{r.station_name}</b><br>"
+                            f"Congestion: {r.Congestion}<br>"
+                            f"Peak Wait Chance: {r.Wait_Prob * 100:.1f}%<br>"
+                            f"Avg Peak Wait: {wait_text}<br>"
+                            f"Level 2: {r.ev_level2_evse_num:.0f} ports, {r.L2_Arrivals_Hr:.2f} arrivals/hr<br>"
+                            f"DC Fast: {r.ev_dc_fast_num:.0f} ports, {r.DC_Arrivals_Hr:.2f} arrivals/hr<br>"
+                            f"City: {r.city}",
+                            max_width=280
+                        ),
+                    ).add_to(station_layer)
+                station_layer.add_to(m)
+
             # Add charging stations with risk-based coloring
-            if show_stations_toggle:
+            elif show_stations_toggle:
                 try:
                     stations_df = load_csv(station_csv).dropna(subset=["Latitude", "Longitude"])
                     
@@ -618,7 +838,8 @@ elif st.session_state.current_mode == "queue":
             folium.LayerControl(collapsed=False).add_to(m)
         
         st_folium(m, height=650, use_container_width=True, 
-                  key=f"map_queue_{risk_threshold}_{ev_port_max}_{show_stations_toggle}", returned_objects=[])
+                  key=(f"map_queue_{risk_threshold}_{ev_port_max}_{show_stations_toggle}_{queue_hotspots}_"
+                       f"{l2_sessions}_{l2_service}_{dc_sessions}_{dc_service_min}_{peak_share}"), returned_objects=[])
         
         # Summary Tables
         st.markdown("---")
@@ -676,6 +897,38 @@ elif st.session_state.current_mode == "queue":
             st.metric("High Risk Counties", (queue_df["Risk_Category"] == "High").sum())
         with stat_cols[3]:
             st.metric("Total EVs", f"{queue_df['Total_EVs'].sum():,.0f}")
+
+        if station_queue_df is not None:
+            st.markdown("---")
+            st.markdown("Station Queues at Peak Hour")
+            arrivals = station_queue_df["L2_Arrivals_Hr"] + station_queue_df["DC_Arrivals_Hr"]
+            queue_cols = st.columns(4)
+            with queue_cols[0]:
+                st.metric("Modeled Stations", f"{len(station_queue_df):,}")
+            with queue_cols[1]:
+                st.metric("Overloaded Stations", f"{station_queue_df['Overloaded'].sum():,}",
+                          help="Peak arrivals exceed what the ports can serve")
+            with queue_cols[2]:
+                st.metric("Peak Wait Chance", f"{np.average(station_queue_df['Wait_Prob'], weights=arrivals + 1e-12) * 100:.1f}%",
+                          help="Arrival-weighted probability that a driver finds every port busy")
+            with queue_cols[3]:
+                stable = ~station_queue_df["Overloaded"]
+                st.metric("Avg Peak Wait", f"{np.average(station_queue_df.loc[stable, 'Wait_Minutes'], weights=arrivals[stable] + 1e-12):.1f} min"
+                          if stable.any() else "n/a")
+
+            busiest = station_queue_df.sort_values(["Overloaded", "Wait_Prob"], ascending=False).head(15)
+            display_busiest = busiest[[
+                "station_name", "NAME", "ev_level2_evse_num", "ev_dc_fast_num", "Wait_Prob", "Wait_Minutes", "Congestion"
+            ]].copy()
+            display_busiest["Wait_Prob"] *= 100
+            display_busiest.columns = ["Station", "County", "Level 2", "DC Fast", "Wait Chance (%)", "Avg Wait (min)",
+                                       "Congestion"]
+            st.dataframe(
+                display_busiest.reset_index(drop=True).style.format({
+                    "Level 2": "{:.0f}", "DC Fast": "{:.0f}", "Wait Chance (%)": "{:.1f}", "Avg Wait (min)": "{:.1f}"
+                }, na_rep="overloaded"),
+                height=300
+            )
             
     except Exception as e:
         st.error(f"Could not generate summary: {e}")
@@ -705,20 +958,38 @@ elif st.session_state.current_mode == "corridor_spacing":
         """)
     
     # Controls
+    rule_set = st.radio(
+        "Rule Set",
+        ["Relative Gaps", "NEVI Compliance"],
+        horizontal=True,
+        key="corridor_rule_set",
+        help="Relative gaps rank corridors against each other; NEVI checks the absolute federal spacing rule"
+    )
+    nevi_mode = rule_set == "NEVI Compliance"
+    vehicle_key = st.selectbox(
+        "Vehicle Profile",
+        list(VEHICLE_PROFILES),
+        format_func=lambda k: VEHICLE_PROFILES[k]["name"],
+        key="vehicle_profile",
+        help="Sets the range, access buffer and qualifying-station rule below; each profile keeps its own tweaks"
+    )
+    vehicle = VEHICLE_PROFILES[vehicle_key]
+
     st.markdown(" Filter Corridor Segments")
     col_a, col_b, col_c = st.columns(3)
     with col_a:
         gap_filter = st.selectbox(
-            "Show Gap Category",
-            ["All", "Well Covered", "Adequate", "Moderate Gap", "Critical Gap"],
-            key="gap_filter"
+            "Show Compliance" if nevi_mode else "Show Gap Category",
+            ["All", "Compliant", "Non-Compliant"] if nevi_mode
+            else ["All", "Well Covered", "Adequate", "Moderate Gap", "Critical Gap"],
+            key="nevi_filter" if nevi_mode else "gap_filter"
         )
     with col_b:
         min_length = st.slider(
             "Min Corridor Length (miles)",
-            0, 50, 5,
+            0, 50, 15,
             key="min_length",
-            help="Filter out very short road segments"
+            help="Filter out very short road segments; gap categories are re-ranked among the remaining corridors"
         )
     with col_c:
         show_stations_toggle = st.checkbox(
@@ -726,18 +997,178 @@ elif st.session_state.current_mode == "corridor_spacing":
             value=True,
             key="show_stations_corridor"
         )
+        show_gap_lines = st.checkbox(
+            "Show Gap Stretches",
+            value=True,
+            key="show_gap_lines",
+            help="Stretches between stations longer than the Moderate Gap threshold (75th percentile max gap)"
+        )
+    
+    # Spacing rules, recomputed live from the station-to-corridor index
+    col_d, col_e, col_f = st.columns(3)
+    with col_d:
+        access_buffer = st.slider(
+            "Corridor Access Buffer (miles)",
+            0.1, 5.0, float(vehicle["access_mi"]), step=0.1,
+            key=f"access_buffer_{vehicle_key}",
+            help="Stations within this distance of the road count toward its spacing"
+        )
+        vehicle_range = st.slider(
+            "Vehicle Range (miles)",
+            50, 400, vehicle["range_mi"], step=10,
+            key=f"vehicle_range_{vehicle_key}",
+            help="Corridors whose largest gap exceeds this strand the vehicle"
+        )
+    with col_e:
+        min_level2_ports = st.slider(
+            "Min Level 2 Ports (highway-capable)",
+            1, 12, vehicle["min_level2_ports"] or MIN_LEVEL2_PORTS,
+            key=f"min_level2_ports_{vehicle_key}",
+            help="Level 2 stations need at least this many ports to count"
+        )
+        min_dc_fast_ports = st.slider(
+            "Min DC Fast Ports",
+            1, 8, vehicle["min_dc_fast_ports"],
+            key=f"min_dc_fast_ports_{vehicle_key}",
+            help="DC fast stations need at least this many ports to count"
+        )
+    with col_f:
+        dc_fast_only = st.checkbox(
+            "Count DC Fast Stations Only",
+            value=vehicle["min_level2_ports"] is None,
+            key=f"dc_fast_only_{vehicle_key}"
+        )
+        coverage_radius = st.slider(
+            "Network Coverage Radius (miles)",
+            5, 50, int(COVERAGE_RADIUS / MILE_M),
+            key="coverage_radius",
+            help="Road stretches farther than this (driving along corridors) from a counted station are uncovered"
+        )
     
+    # NEVI rule thresholds
+    if nevi_mode:
+        col_g, col_h, col_i = st.columns(3)
+        with col_g:
+            nevi_spacing = st.slider(
+                "Max Spacing Between Stations (miles)",
+                25, 100, int(NEVI_MAX_SPACING / MILE_M), step=5,
+                key="nevi_spacing"
+            )
+        with col_h:
+            nevi_distance = st.slider(
+                "Max Distance from Corridor (miles)",
+                0.25, 5.0, NEVI_MAX_DISTANCE / MILE_M, step=0.25,
+                key="nevi_distance"
+            )
+        with col_i:
+            nevi_ports = st.slider(
+                "Min DC Fast Ports per Station",
+                1, 8, NEVI_MIN_PORTS,
+                key="nevi_ports",
+                help="The station data has no power ratings, so all DC fast ports are assumed to be 150 kW"
+            )
+    else:
+        nevi_spacing, nevi_distance, nevi_ports = NEVI_MAX_SPACING / MILE_M, NEVI_MAX_DISTANCE / MILE_M, NEVI_MIN_PORTS
+
     # Load corridor spacing data
     try:
-        corridor_spacing_gdf = load_geojson(corridor_spacing_geo).copy()
-        
-        # Load NY State boundary to filter corridors
-        ny_state = load_geojson(state_path)
-        
-        # Clip corridors to NY state boundaries
-        corridor_spacing_gdf = gpd.clip(corridor_spacing_gdf, ny_state)
+        if Path(corridor_segments_parquet).exists() and Path(corridor_station_index_parquet).exists():
+            # Every clipped segment plus the sparse station index: stats for any rule set in milliseconds
+            corridor_segments = load_parquet(corridor_segments_parquet)
+            spacing = spacing_stats(
+                load_table(corridor_station_index_parquet),
+                corridor_segments["Length_M"].to_numpy(),
+                buffer_m=access_buffer * MILE_M,
+                min_level2_ports=min_level2_ports,
+                dc_fast_only=dc_fast_only,
+                min_dc_fast_ports=min_dc_fast_ports,
+            )
+            corridor_spacing_gdf = corridor_segments.join(spacing)
+            corridor_spacing_gdf = corridor_spacing_gdf.join(simulated_trip_rates(
+                access_buffer, min_level2_ports, dc_fast_only, min_dc_fast_ports, min_length, vehicle_range
+            ))
+
+            # Network distance to the nearest counted station, across corridor crossings
+            network = load_corridor_network(corridor_segments_parquet)
+            counted = select_stations(
+                load_table(corridor_station_index_parquet), access_buffer * MILE_M, min_level2_ports, dc_fast_only,
+                min_dc_fast_ports
+            )
+            network_edges = network.solve_positions(counted["Corridor_Idx"], counted["Position_M"])
+            corridor_spacing_gdf = corridor_spacing_gdf.join(
+                network.line_summary(network_edges, coverage_radius * MILE_M)
+            )
+            network_gaps = network.uncovered_stretches(network_edges, coverage_radius * MILE_M)
+            network_gaps = network_gaps[
+                corridor_spacing_gdf["Length_Miles"].to_numpy()[network_gaps["Line_Idx"].to_numpy(dtype=int)] >= min_length
+            ]
+            corridor_spacing_gdf = corridor_spacing_gdf[corridor_spacing_gdf["Length_Miles"] >= min_length].copy()
+            corridor_spacing_gdf["Gap_Category"], corridor_spacing_gdf["Coverage_Score"] = gap_categories(
+                corridor_spacing_gdf["Max_Gap_Miles"]
+            )
+
+            # Gap stretches longer than the Moderate Gap threshold, cut from the projected road lines
+            gap_lines = gap_stretches(
+                network.lines, counted["Corridor_Idx"], counted["Position_M"],
+                np.percentile(corridor_spacing_gdf["Max_Gap_Miles"], 75) * MILE_M if len(corridor_spacing_gdf) else np.inf,
+                rows=corridor_spacing_gdf.index.to_numpy(),
+            ).set_crs(epsg=5070).to_crs(epsg=4326)
+            gap_rows = gap_lines.pop("Corridor_Idx").to_numpy()
+            gap_lines.insert(0, "Road_Name", corridor_segments["Road_Name"].to_numpy()[gap_rows])
+            gap_lines.insert(0, "Corridor_ID", corridor_segments["Corridor_ID"].to_numpy()[gap_rows])
+
+            # NEVI rule from the same index: compliance, failing stretches and new sites
+            nevi_gap_table = nevi_gaps(
+                load_table(corridor_station_index_parquet), corridor_segments["Length_M"].to_numpy(),
+                nevi_spacing * MILE_M, nevi_distance * MILE_M, nevi_ports
+            )
+            corridor_spacing_gdf = corridor_spacing_gdf.join(
+                nevi_compliance(nevi_gap_table, corridor_segments["Length_M"].to_numpy())
+            )
+            nevi_gap_table = nevi_gap_table[nevi_gap_table["Corridor_Idx"].isin(corridor_spacing_gdf.index)]
+            failing = nevi_gap_table[~nevi_gap_table["NEVI_Compliant"]]
+            nevi_lines = gpd.GeoDataFrame({
+                "Corridor_ID": corridor_segments["Corridor_ID"].to_numpy()[failing["Corridor_Idx"]],
+                "Road_Name": corridor_segments["Road_Name"].to_numpy()[failing["Corridor_Idx"]],
+                "Start_Mile": (failing["Start_M"] / MILE_M).round(1).to_numpy(),
+                "End_Mile": (failing["End_M"] / MILE_M).round(1).to_numpy(),
+                "Sites_Needed": failing["Sites_Needed"].to_numpy(),
+            }, geometry=line_substrings(
+                network.lines, failing["Corridor_Idx"], failing["Start_M"], failing["End_M"]
+            ), crs="EPSG:5070").to_crs(epsg=4326)
+            new_sites = nevi_sites(nevi_gap_table)
+            new_sites = gpd.GeoDataFrame({
+                "Corridor_ID": corridor_segments["Corridor_ID"].to_numpy()[new_sites["Corridor_Idx"]],
+                "Road_Name": corridor_segments["Road_Name"].to_numpy()[new_sites["Corridor_Idx"]],
+                "Milepost": new_sites["Position_M"].to_numpy() / MILE_M,
+            }, geometry=shapely.line_interpolate_point(
+                network.lines[new_sites["Corridor_Idx"].to_numpy()], new_sites["Position_M"].to_numpy()
+            ), crs="EPSG:5070").to_crs(epsg=4326)
+        else:
+            corridor_spacing_gdf = load_geojson(corridor_spacing_geo).copy()
+            network_gaps = None
+            counted = None
+            nevi_lines = None
+            new_sites = load_geojson(corridor_nevi_sites_geo) if Path(corridor_nevi_sites_geo).exists() else None
+            if nevi_mode and (nevi_spacing, nevi_distance, nevi_ports) != (50, 1.0, 4):
+                st.info("Re-run `calculate_corridor_spacing.py` to build the station index needed for custom NEVI thresholds.")
+            gap_lines = load_geojson(corridor_gaps_geo) if Path(corridor_gaps_geo).exists() else None
+            if gap_lines is not None and "Gap_Miles" not in gap_lines:
+                gap_lines = None  # older files hold whole corridors, not stretches
+            if (access_buffer, min_level2_ports, dc_fast_only, min_dc_fast_ports, coverage_radius) != (0.5, 4, False, 1, 25):
+                st.info("Re-run `calculate_corridor_spacing.py` to build the station index needed for custom spacing rules.")
+            
+            # Load NY State boundary to filter corridors
+            ny_state = load_geojson(state_path)
+            
+            # Clip corridors to NY state boundaries
+            corridor_spacing_gdf = gpd.clip(corridor_spacing_gdf, ny_state)
         
         # Ensure numeric columns
+        corridor_spacing_gdf["Max_Gap_Miles"] = pd.to_numeric(corridor_spacing_gdf["Max_Gap_Miles"], errors="coerce")
+        corridor_spacing_gdf["Within_Range"] = np.where(
+            corridor_spacing_gdf["Max_Gap_Miles"] <= vehicle_range, "Yes", "No"
+        )
         corridor_spacing_gdf["Coverage_Score"] = pd.to_numeric(
             corridor_spacing_gdf["Coverage_Score"], errors="coerce"
         ).fillna(0)
@@ -750,13 +1181,28 @@ elif st.session_state.current_mode == "corridor_spacing":
         corridor_spacing_gdf["Num_Stations"] = pd.to_numeric(
             corridor_spacing_gdf["Num_Stations"], errors="coerce"
         ).fillna(0)
+        for col in ["Max_Charger_Distance_Miles", "Longest_Uncovered_Miles", "Trip_Stranded_Pct", "Trip_Detour_Pct"]:
+            # Older spacing files predate the network and trip stages
+            corridor_spacing_gdf[col] = pd.to_numeric(
+                corridor_spacing_gdf.get(col, pd.Series(index=corridor_spacing_gdf.index, dtype=float)), errors="coerce"
+            ).round(1)
         
         # Apply filters
         filtered_corridors = corridor_spacing_gdf[
             corridor_spacing_gdf["Length_Miles"] >= min_length
         ].copy()
         
-        if gap_filter != "All":
+        if nevi_mode and "NEVI_Compliant" not in filtered_corridors:
+            st.warning("This spacing file predates the NEVI check. Re-run `calculate_corridor_spacing.py`.")
+            filtered_corridors = filtered_corridors.iloc[0:0]
+        elif nevi_mode:
+            filtered_corridors["NEVI_Compliant"] = filtered_corridors["NEVI_Compliant"].astype(bool)
+            filtered_corridors["NEVI_Status"] = filtered_corridors["NEVI_Compliant"].map(
+                {True: "Compliant", False: "Non-Compliant"}
+            )
+            if gap_filter != "All":
+                filtered_corridors = filtered_corridors[filtered_corridors["NEVI_Status"] == gap_filter]
+        elif gap_filter != "All":
             filtered_corridors = filtered_corridors[
                 filtered_corridors["Gap_Category"] == gap_filter
             ]
@@ -789,8 +1235,12 @@ elif st.session_state.current_mode == "corridor_spacing":
                 score = float(feat["properties"].get("Coverage_Score", 0))
                 category = feat["properties"].get("Gap_Category", "Unknown")
                 
-                # Color based on gap category
-                if category == "Critical Gap":
+                # Color based on NEVI status or gap category
+                if nevi_mode:
+                    compliant = feat["properties"].get("NEVI_Compliant")
+                    color = "#1a9850" if compliant else "#d73027"
+                    weight = 2 if compliant else 4
+                elif category == "Critical Gap":
                     color = "#d73027"  # Dark red
                     weight = 4
                 elif category == "Moderate Gap":
@@ -809,6 +1259,30 @@ elif st.session_state.current_mode == "corridor_spacing":
                     "opacity": 0.8
                 }
             
+            if nevi_mode:
+                tooltip_fields = [
+                    "Road_Name", "Length_Miles", "NEVI_Status", "NEVI_Max_Gap_Miles",
+                    "NEVI_Noncompliant_Miles", "NEVI_Sites_Needed"
+                ]
+                tooltip_aliases = [
+                    "Road:", "Length (mi):", "NEVI:", "Longest NEVI Gap (mi):",
+                    "Non-Compliant Miles:", "New Sites Needed:"
+                ]
+                filtered_corridors = filtered_corridors.round({"NEVI_Max_Gap_Miles": 1, "NEVI_Noncompliant_Miles": 1})
+            else:
+                tooltip_fields = [
+                    "Road_Name", "Length_Miles", "Num_Stations", "Avg_Spacing_Miles", "Max_Gap_Miles", "Within_Range",
+                    "Trip_Stranded_Pct", "Trip_Detour_Pct", "Max_Charger_Distance_Miles", "Longest_Uncovered_Miles", "Coverage_Score", "Gap_Category"
+                ]
+                tooltip_aliases = [
+                    "Road:", "Length (mi):", "Stations:", "Avg Spacing (mi):", "Max Gap (mi):",
+                    f"Within {vehicle['name']} Range ({vehicle_range} mi):",
+                    "Simulated Trips Stranded (%):", "Simulated Trips Needing Detour (%):",
+                    "Farthest from Charger (network mi):", "Longest Uncovered Stretch (mi):",
+                    "Coverage Score:", "Gap Category:"
+                ]
+                filtered_corridors = filtered_corridors.round({"Max_Gap_Miles": 1, "Avg_Spacing_Miles": 1})
+
             # Add corridor spacing layer
             folium.GeoJson(
                 filtered_corridors,
@@ -820,22 +1294,8 @@ elif st.session_state.current_mode == "corridor_spacing":
                     "opacity": 1.0
                 },
                 tooltip=folium.GeoJsonTooltip(
-                    fields=[
-                        "Road_Name",
-                        "Length_Miles",
-                        "Num_Stations",
-                        "Avg_Spacing_Miles",
-                        "Coverage_Score",
-                        "Gap_Category"
-                    ],
-                    aliases=[
-                        "Road:",
-                        "Length (mi):",
-                        "Stations:",
-                        "Avg Spacing (mi):",
-                        "Coverage Score:",
-                        "Gap Category:"
-                    ],
+                    fields=tooltip_fields,
+                    aliases=tooltip_aliases,
                     sticky=True,
                     labels=True,
                     style="font-size: 13px; font-weight: bold;"
@@ -843,7 +1303,57 @@ elif st.session_state.current_mode == "corridor_spacing":
                 show=True,
             ).add_to(m)
             
-            colormap.add_to(m)
+            if not nevi_mode:
+                colormap.add_to(m)
+
+            # NEVI: failing stretches and the fewest new sites that close them
+            if nevi_mode and show_gap_lines and nevi_lines is not None and len(nevi_lines) > 0:
+                shown_failing = nevi_lines[nevi_lines["Corridor_ID"].isin(filtered_corridors["Corridor_ID"])]
+                if len(shown_failing) > 0:
+                    folium.GeoJson(
+                        shown_failing,
+                        name="Non-Compliant Stretches",
+                        style_function=lambda f: {"color": "#7f0000", "weight": 7, "opacity": 0.55, "dashArray": "8 6"},
+                        tooltip=folium.GeoJsonTooltip(
+                            fields=["Road_Name", "Start_Mile", "End_Mile", "Sites_Needed"],
+                            aliases=["Road:", "From Milepost:", "To Milepost:", "New Sites Needed:"],
+                            sticky=True,
+                        ),
+                        show=True,
+                    ).add_to(m)
+            if nevi_mode and new_sites is not None and len(new_sites) > 0:
+                site_layer = folium.FeatureGroup(name="Proposed NEVI Sites", show=True)
+                for _, r in new_sites[new_sites["Corridor_ID"].isin(filtered_corridors["Corridor_ID"])].iterrows():
+                    folium.CircleMarker(
+                        location=[r.geometry.y, r.geometry.x],
+                        radius=7,
+                        color="#4c1d95",
+                        fill=True,
+                        fill_color="#a78bfa",
+                        fill_opacity=0.9,
+                        weight=2,
+                        tooltip=f"Proposed site: {r['Road_Name']} mile {r['Milepost']:.1f}",
+                    ).add_to(site_layer)
+                site_layer.add_to(m)
+
+            # Gap stretches drawn over the corridor they belong to
+            if not nevi_mode and show_gap_lines and gap_lines is not None and len(gap_lines) > 0:
+                shown_gaps = gap_lines[gap_lines["Corridor_ID"].isin(filtered_corridors["Corridor_ID"])].round(
+                    {"Start_Mile": 1, "End_Mile": 1, "Gap_Miles": 1}
+                )
+                if len(shown_gaps) > 0:
+                    folium.GeoJson(
+                        shown_gaps,
+                        name="Gap Stretches",
+                        style_function=lambda f: {"color": "#7f0000", "weight": 7, "opacity": 0.55, "dashArray": "8 6"},
+                        tooltip=folium.GeoJsonTooltip(
+                            fields=["Road_Name", "Start_Mile", "End_Mile", "Gap_Miles"],
+                            aliases=["Road:", "From Milepost:", "To Milepost:", "Gap (mi):"],
+                            localize=True,
+                            sticky=True,
+                        ),
+                        show=True,
+                    ).add_to(m)
             
             # Add charging stations if requested
             if show_stations_toggle:
@@ -897,10 +1407,57 @@ elif st.session_state.current_mode == "corridor_spacing":
             m,
             height=650,
             use_container_width=True,
-            key=f"map_corridor_spacing_{gap_filter}_{min_length}_{show_stations_toggle}",
+            key=(
+                f"map_corridor_spacing_{gap_filter}_{min_length}_{show_stations_toggle}"
+                f"_{access_buffer}_{min_level2_ports}_{dc_fast_only}_{coverage_radius}_{show_gap_lines}"
+                f"_{rule_set}_{nevi_spacing}_{nevi_distance}_{nevi_ports}"
+                f"_{vehicle_key}_{vehicle_range}_{min_dc_fast_ports}"
+            ),
             returned_objects=[]
         )
         
+        # NEVI summary
+        if nevi_mode:
+            st.markdown("---")
+            st.subheader("NEVI Compliance Summary")
+            nevi_cols = st.columns(4)
+            total_miles = filtered_corridors["Length_Miles"].sum()
+            failing_miles = filtered_corridors["NEVI_Noncompliant_Miles"].sum()
+            with nevi_cols[0]:
+                st.metric(
+                    "Compliant Corridors",
+                    f"{filtered_corridors['NEVI_Compliant'].sum()} / {len(filtered_corridors)}"
+                )
+            with nevi_cols[1]:
+                st.metric(
+                    "Compliant Miles",
+                    f"{total_miles - failing_miles:,.0f} ({(total_miles - failing_miles) / total_miles * 100:.0f}%)"
+                    if total_miles > 0 else "0"
+                )
+            with nevi_cols[2]:
+                st.metric("Non-Compliant Miles", f"{failing_miles:,.0f}")
+            with nevi_cols[3]:
+                st.metric("New Sites Needed", f"{filtered_corridors['NEVI_Sites_Needed'].sum():,.0f}")
+
+            needing = filtered_corridors[filtered_corridors["NEVI_Sites_Needed"] > 0].sort_values(
+                "NEVI_Sites_Needed", ascending=False
+            )
+            if not needing.empty:
+                display_nevi = needing[["Road_Name", "Length_Miles", "NEVI_Max_Gap_Miles", "NEVI_Sites_Needed"]].copy()
+                display_nevi.columns = ["Road", "Length (mi)", "Longest NEVI Gap (mi)", "New Sites"]
+                st.dataframe(
+                    display_nevi.head(15).reset_index(drop=True).style.format({
+                        "Length (mi)": "{:.1f}",
+                        "Longest NEVI Gap (mi)": "{:.1f}"
+                    }),
+                    height=300
+                )
+            st.caption(
+                f"DC fast stations with at least {nevi_ports} ports within {nevi_distance:g} mi of the corridor, "
+                f"no more than {nevi_spacing} mi apart (corridor ends included). "
+                "The station data has no power ratings, so all DC fast ports are assumed to be 150 kW."
+            )
+
         # Summary Statistics
         st.markdown("---")
         st.subheader("Corridor Spacing Summary")
@@ -955,7 +1512,21 @@ elif st.session_state.current_mode == "corridor_spacing":
                     st.metric(f" {category}", f"{count} ({pct:.1f}%)")
                 else:
                     st.metric(f" {category}", f"{count} ({pct:.1f}%)")
-        
+
+            beyond_range = (filtered_corridors["Within_Range"] == "No").sum()
+            st.metric(
+                f" Beyond {vehicle['name']} Range ({vehicle_range} mi)",
+                f"{beyond_range} ({beyond_range / max(len(filtered_corridors), 1) * 100:.1f}%)"
+            )
+            if filtered_corridors["Trip_Stranded_Pct"].notna().any():
+                # Trip-weighted: corridors are sampled in proportion to length
+                trip_weights = filtered_corridors["Length_Miles"]
+                st.metric(
+                    " Simulated Trips Stranded",
+                    f"{np.average(filtered_corridors['Trip_Stranded_Pct'].fillna(0), weights=trip_weights):.1f}%",
+                    help="Monte-Carlo long-distance trips with sampled range and departure charge"
+                )
+
         # Overall statistics
         st.markdown("---")
         st.markdown("Overall Statistics")
@@ -980,7 +1551,93 @@ elif st.session_state.current_mode == "corridor_spacing":
                 "Total Stations",
                 f"{filtered_corridors['Num_Stations'].sum():,.0f}"
             )
-    
+
+        # Longest stretches by network distance (live index only)
+        if network_gaps is not None:
+            st.markdown("---")
+            st.markdown(f"Longest Stretches > {coverage_radius} Network Miles from a Charger")
+            if not network_gaps.empty:
+                display_stretches = network_gaps[["Road_Name", "Start_Mile", "End_Mile", "Length_Miles"]].head(10)
+                display_stretches.columns = ["Road", "From (mi)", "To (mi)", "Length (mi)"]
+                st.dataframe(
+                    display_stretches.reset_index(drop=True).style.format({
+                        "From (mi)": "{:.1f}",
+                        "To (mi)": "{:.1f}",
+                        "Length (mi)": "{:.1f}"
+                    }),
+                    height=300
+                )
+            else:
+                st.success("Every corridor point is within range of a charger over the network!")
+
+        # Distance-to-charger profile along one corridor
+        st.markdown("---")
+        st.markdown("Distance-to-Charger Profile")
+        profile_choices = filtered_corridors.sort_values("Max_Gap_Miles", ascending=False)
+        profile_labels = {
+            f"{r.Road_Name} ({r.Length_Miles:.0f} mi, ID {r.Corridor_ID})": r.Corridor_ID
+            for r in profile_choices.itertuples()
+        }
+        profile_label = st.selectbox(
+            "Corridor",
+            list(profile_labels),
+            key="profile_corridor",
+            help="Sorted by largest gap"
+        )
+        profile_id = profile_labels.get(profile_label)
+
+        if profile_id is not None and counted is not None:
+            # Live: re-sample from the counted stations and the network solve above
+            row = int(np.flatnonzero(corridor_segments["Corridor_ID"].to_numpy() == profile_id)[0])
+            on_route = counted[counted["Corridor_Idx"] == row]
+            profile = distance_profile(
+                network.lengths[[row]], np.zeros(len(on_route), dtype=int), on_route["Position_M"]
+            )
+            profile = pd.DataFrame({
+                "Milepost": profile["Position_M"] / MILE_M,
+                "Distance_Miles": profile["Distance_M"] / MILE_M,
+                "Network_Distance_Miles": network.distance_at(
+                    network_edges, np.full(len(profile), row), profile["Position_M"]
+                ) / MILE_M,
+            }).replace(np.inf, np.nan)
+        elif profile_id is not None and Path(corridor_profile_parquet).exists():
+            profile_table = load_table(corridor_profile_parquet)
+            profile = profile_table[profile_table["Corridor_ID"] == profile_id]
+        else:
+            profile = None
+
+        if profile is not None and len(profile) > 0:
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                x=profile["Milepost"],
+                y=profile["Distance_Miles"],
+                mode="lines",
+                fill="tozeroy",
+                line=dict(color="#d73027", width=2),
+                name="Along this road",
+                hovertemplate="Mile %{x:.1f}<br>%{y:.1f} mi to a charger<extra></extra>"
+            ))
+            fig.add_trace(go.Scatter(
+                x=profile["Milepost"],
+                y=profile["Network_Distance_Miles"],
+                mode="lines",
+                line=dict(color="#1e3a8a", width=1.5, dash="dot"),
+                name="Via the corridor network",
+                hovertemplate="Mile %{x:.1f}<br>%{y:.1f} network mi to a charger<extra></extra>"
+            ))
+            fig.update_layout(
+                height=320,
+                template="plotly_white",
+                xaxis_title="Milepost (mi)",
+                yaxis_title="Distance to Nearest Charger (mi)",
+                legend=dict(orientation="h", y=1.12),
+                margin=dict(l=20, r=20, t=30, b=20)
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("Sampled every 0.5 mile. Peaks are the middle of the gaps between stations.")
+        elif profile_id is not None:
+            st.info("Re-run `calculate_corridor_spacing.py` to build the distance-to-charger profiles.")
+
     else:
         st.warning("No corridor data available with current filters")
 
@@ -1000,7 +1657,7 @@ elif st.session_state.current_mode == "optimization":
         - **Corridor Gaps (30%)**: Areas along corridors with large spacing between stations
         - **Equity (25%)**: Disadvantaged Communities (DAC) needing infrastructure
         - **Queue Risk (25%)**: Counties with high EV-to-port ratios
-        - **Low Station Density (20%)**: Areas with few existing stations within 5 miles
+        - **Low Station Density (20%)**: Areas with few existing stations within the selected radius (5 miles by default)
         
         **Priority Categories:**
         - **Critical**: Score ≥75 - Immediate action recommended
@@ -1043,6 +1700,94 @@ elif st.session_state.current_mode == "optimization":
     with weight_col4:
         density_weight = st.slider("Low Density", 0, 100, 20, 5, key="w_density") / 100
     
+    # Station density radius (multi-radius counts are precomputed in the batch run)
+    dens_col1, dens_col2 = st.columns(2)
+    with dens_col1:
+        density_radius = st.selectbox(
+            "Low Density Radius (miles)",
+            [1, 5, 10],
+            index=1,
+            key="density_radius",
+            help="Radius used to count existing stations around each zone"
+        )
+    with dens_col2:
+        density_ports = st.radio(
+            "Count Stations",
+            ["All ports", "DC fast only"],
+            horizontal=True,
+            key="density_ports"
+        )
+    
+    # Station siting (maximal covering)
+    st.markdown(" Station Siting Optimizer")
+    site_col1, site_col2, site_col3 = st.columns(3)
+    with site_col1:
+        num_sites = st.number_input(
+            "New Stations to Site (K)",
+            0, 500, 0, step=1,
+            key="num_sites",
+            help="Pick K zones that maximize weighted coverage of corridor gaps, DAC area and queue risk (0 = off)"
+        )
+    with site_col2:
+        site_radius = st.slider(
+            "Site Coverage Radius (miles)",
+            1, 25, 10,
+            key="site_radius",
+            help="A new station covers every zone whose center lies within this distance"
+        )
+    with site_col3:
+        site_method = st.selectbox(
+            "Siting Solver",
+            ["Greedy", "Exact (MILP)"],
+            key="site_method",
+            help="Greedy is sub-second statewide; the exact MILP can take up to 10 s and keeps greedy's picks if it "
+                 "cannot beat them in time"
+        )
+    show_frontier = st.checkbox(
+        "Show equity vs corridor Pareto frontier for K sites",
+        value=False,
+        key="show_frontier",
+        help="Trade-offs between corridor max-gap reduction, DAC coverage and queue-risk coverage instead of one "
+             "weighted ranking"
+    )
+    show_regions = st.checkbox(
+        "Group Critical/High zones into contiguous regions",
+        value=False,
+        key="show_regions",
+        help="Dissolve edge-connected Critical and High zones into regions for area-based proposals"
+    )
+    priority_hotspots = st.selectbox(
+        "Priority Hotspot Overlay",
+        ["None"] + list(HOTSPOT_FIELDS),
+        key="priority_hotspots",
+        help="Statistically significant clusters of the batch priority score (not the custom weights)"
+    )
+    show_stability = st.checkbox(
+        "Show weight-stability layer",
+        value=False,
+        key="show_stability",
+        help="Share of 10,000 random weightings under which each zone is Critical or High priority"
+    )
+    
+    # What-if: hypothetical stations placed by clicking the map
+    st.markdown(" What-If: Drop a Hypothetical Station")
+    wi_col1, wi_col2, wi_col3, wi_col4 = st.columns(4)
+    with wi_col1:
+        whatif_enabled = st.checkbox(
+            "Click map to add a station",
+            value=False,
+            key="whatif_enabled",
+            help="Each click places a hypothetical station and updates nearby zones and corridor gaps"
+        )
+    with wi_col2:
+        whatif_type = st.selectbox("Hypothetical Station Type", ["DC Fast", "Level 2"], key="whatif_type")
+    with wi_col3:
+        whatif_ports = st.number_input("Ports", 1, 20, 4, step=1, key="whatif_ports")
+    with wi_col4:
+        if st.button("Clear Hypothetical Stations", key="whatif_clear"):
+            st.session_state.whatif_stations = []
+            st.session_state.whatif_last_click = None
+    
     # Normalize weights
     total_weight = corridor_weight + equity_weight + queue_weight + density_weight
     if total_weight > 0:
@@ -1050,53 +1795,85 @@ elif st.session_state.current_mode == "optimization":
         equity_weight /= total_weight
         queue_weight /= total_weight
         density_weight /= total_weight
+    custom_weights = {
+        "Corridor_Score": corridor_weight,
+        "Equity_Score": equity_weight,
+        "Queue_Score": queue_weight,
+        "Density_Score": density_weight,
+    }
     # 
     # Load priority zones data
     try:
-        priority_zones_path = "GEOJSON/Station_Priority_Zones.geojson"
-        priority_gdf = load_geojson(priority_zones_path).copy()
+        # Prefer the full unfiltered grid so custom weights can lift any cell over the threshold
+        if Path(priority_grid_parquet).exists():
+            priority_zones_path = priority_grid_parquet
+            priority_gdf = load_parquet(priority_zones_path).copy()
+        else:
+            priority_zones_path = priority_zones_geo
+            priority_gdf = load_geojson(priority_zones_path).copy()
         
-        # Spatially join with counties to get county names
+        # Attach county names from the precomputed crosswalk (majority county per cell)
+        crosswalk = None
         try:
-            counties = load_geojson(counties_path)[["NAME", "geometry"]].copy()
-            counties = counties.rename(columns={"NAME": "County"})
-            
-            # Perform spatial join to assign county names
-            priority_gdf = gpd.sjoin(
-                priority_gdf, 
-                counties, 
-                how="left", 
-                predicate="intersects"
-            )
-            
-            # If a zone intersects multiple counties, keep the first
-            if "County" in priority_gdf.columns:
-                priority_gdf = priority_gdf.drop_duplicates(subset=priority_gdf.columns.difference(["County"]).tolist())
+            if "Cell_ID" in priority_gdf.columns and Path(priority_county_csv).exists():
+                crosswalk = load_csv(priority_county_csv)
+                majority = crosswalk.loc[crosswalk["Is_Majority"], ["Cell_ID", "County"]]
+                priority_gdf = priority_gdf.merge(majority, on="Cell_ID", how="left")
+            else:
+                # Older outputs without a crosswalk: fall back to a spatial join
+                counties = load_geojson(counties_path)[["NAME", "geometry"]].copy()
+                counties = counties.rename(columns={"NAME": "County"})
+                priority_gdf = gpd.sjoin(priority_gdf, counties, how="left", predicate="intersects")
+                
+                # If a zone intersects multiple counties, keep the first
+                priority_gdf = priority_gdf[~priority_gdf.index.duplicated(keep="first")]
             
         except Exception as e:
             st.warning(f"Could not assign county names: {e}")
             priority_gdf["County"] = "Unknown"
         
+        # Rank stability across random weightings (batch sweep output)
+        if "Cell_ID" in priority_gdf.columns and Path(priority_sensitivity_csv).exists():
+            priority_gdf = priority_gdf.merge(load_csv(priority_sensitivity_csv), on="Cell_ID", how="left")
+        if priority_hotspots != "None" and "Cell_ID" in priority_gdf.columns and Path(priority_hotspots_csv).exists():
+            priority_gdf = priority_gdf.merge(load_csv(priority_hotspots_csv), on="Cell_ID", how="left")
+        
+        # Re-derive density score for the selected radius / charger type
+        count_col = f"{'DCFC' if density_ports == 'DC fast only' else 'Stations'}_{density_radius}mi"
+        if count_col in priority_gdf.columns:
+            priority_gdf["Nearby_Stations"] = priority_gdf[count_col]
+            priority_gdf["Density_Score"] = density_scores(priority_gdf[count_col].to_numpy())
+        
         # Recalculate composite score with user weights
-        priority_gdf["Custom_Score"] = (
-            priority_gdf["Corridor_Score"] * corridor_weight +
-            priority_gdf["Equity_Score"] * equity_weight +
-            priority_gdf["Queue_Score"] * queue_weight +
-            priority_gdf["Density_Score"] * density_weight
-        )
+        priority_gdf["Custom_Score"] = composite_score(priority_gdf, custom_weights)
         
-        # Reassign categories based on custom score
-        def assign_priority(score):
-            if score >= 75:
-                return "Critical Priority"
-            elif score >= 60:
-                return "High Priority"
-            elif score >= 40:
-                return "Moderate Priority"
-            else:
-                return "Low Priority"
+        # Apply hypothetical stations as local updates from the persistent indexes
+        whatif_corridors = None
+        if st.session_state.whatif_stations:
+            try:
+                whatif = load_whatif_index(priority_zones_path)
+                base_score = priority_gdf["Custom_Score"].to_numpy().copy()
+                
+                deltas = whatif.count_deltas(st.session_state.whatif_stations)
+                rows = deltas.index.to_numpy()
+                for col in deltas.columns:
+                    col_pos = priority_gdf.columns.get_loc(col)
+                    priority_gdf.iloc[rows, col_pos] = priority_gdf.iloc[rows, col_pos].to_numpy() + deltas[col].to_numpy()
+                if count_col in priority_gdf.columns:
+                    priority_gdf["Nearby_Stations"] = priority_gdf[count_col]
+                    priority_gdf["Density_Score"] = density_scores(priority_gdf[count_col].to_numpy())
+                
+                whatif_corridors = whatif.corridor_updates(st.session_state.whatif_stations)
+                rows, corridor_scores = whatif.cell_corridor_scores(whatif_corridors)
+                priority_gdf.iloc[rows, priority_gdf.columns.get_loc("Corridor_Score")] = corridor_scores
+                
+                priority_gdf["Custom_Score"] = composite_score(priority_gdf, custom_weights)
+                priority_gdf["Score_Change"] = priority_gdf["Custom_Score"] - base_score
+            except Exception as e:
+                st.warning(f"Could not apply hypothetical stations: {e}")
         
-        priority_gdf["Custom_Category"] = priority_gdf["Custom_Score"].apply(assign_priority)
+        # Reassign categories based on custom score
+        priority_gdf["Custom_Category"] = assign_priority(priority_gdf["Custom_Score"])
         # Apply filters
         filtered_zones = priority_gdf[priority_gdf["Custom_Score"] >= min_score].copy()
         
@@ -1107,6 +1884,42 @@ elif st.session_state.current_mode == "optimization":
         
         st.info(f"Displaying {len(filtered_zones)} priority zones (filtered from {len(priority_gdf)} total)")
         
+        # Choose new station sites among the displayed zones, covering demand across the whole grid
+        sites = None
+        if num_sites > 0 and len(filtered_zones) > 0:
+            try:
+                site_weights = tuple((col, w) for col, w in custom_weights.items() if col != "Density_Score")
+                sites, site_attrs = cached_site_stations(
+                    priority_zones_path,
+                    priority_gdf[[col for col, _ in site_weights]].to_numpy(dtype=float),  # what-if edits change these
+                    site_weights,
+                    int(num_sites),
+                    site_radius,
+                    priority_gdf.index.isin(filtered_zones.index),
+                    "milp" if site_method == "Exact (MILP)" else "greedy",
+                    priority_gdf,
+                )
+                sites.attrs.update(site_attrs)
+            except Exception as e:
+                st.warning(f"Could not optimize station sites: {e}")
+        
+        # Contiguous Critical/High regions under the current weights
+        regions = None
+        if show_regions:
+            if {"Grid_Col", "Grid_Row"} <= set(priority_gdf.columns) or "Hex_Q" in priority_gdf.columns:
+                try:
+                    projected = priority_gdf.to_crs(epsg=5070)
+                    region_labels = label_regions(
+                        projected, priority_gdf["Custom_Category"].isin(["Critical Priority", "High Priority"])
+                    )
+                    regions = summarize_regions(
+                        projected, region_labels, score_col="Custom_Score", crosswalk=crosswalk
+                    ).to_crs(epsg=4326)
+                except Exception as e:
+                    st.warning(f"Could not build contiguous regions: {e}")
+            else:
+                st.info("Re-run `calculate_station_priorities.py` to add grid positions needed for region grouping.")
+        
     except FileNotFoundError:
         st.error(f"Priority zones data not found at {priority_zones_path}")
         st.warning("Please run `calculate_station_priorities.py` first to generate the optimization analysis.")
@@ -1140,9 +1953,12 @@ elif st.session_state.current_mode == "optimization":
                 elif category == "High Priority":
                     color = "#fc8d59"
                     opacity = 0.6
-                else:  # Moderate
+                elif category == "Moderate Priority":
                     color = "#fee08b"
                     opacity = 0.5
+                else:  # Low (only shown when the minimum score is below 40)
+                    color = "#d9d9d9"
+                    opacity = 0.3
                 
                 return {
                     "fillColor": color,
@@ -1178,7 +1994,7 @@ elif st.session_state.current_mode == "optimization":
                         "Equity Score:",
                         "Queue Risk Score:",
                         "Low Density Score:",
-                        "Existing Stations (5mi):"
+                        f"Existing Stations ({density_radius}mi):"
                     ],
                     sticky=True,
                     labels=True,
@@ -1189,6 +2005,70 @@ elif st.session_state.current_mode == "optimization":
             
             colormap.add_to(m)
             
+            # Contiguous Critical/High regions
+            if regions is not None and len(regions) > 0:
+                region_fields = ["Region_ID", "Num_Cells", "Area_SqMi", "Mean_Score", "Max_Score"]
+                region_aliases = ["Region:", "Zones:", "Area (sq mi):", "Mean Score:", "Max Score:"]
+                if "Counties" in regions.columns:
+                    region_fields.append("Counties")
+                    region_aliases.append("Counties:")
+                folium.GeoJson(
+                    regions[region_fields + ["geometry"]],
+                    name="Contiguous Regions",
+                    style_function=lambda f: {"color": "#4a1486", "weight": 3, "fillOpacity": 0},
+                    tooltip=folium.GeoJsonTooltip(
+                        fields=region_fields,
+                        aliases=region_aliases,
+                        sticky=True,
+                        labels=True,
+                        localize=True,
+                        style="font-size: 12px;"
+                    ),
+                    show=True,
+                ).add_to(m)
+            
+            # Significant clusters of the batch priority score
+            if priority_hotspots != "None":
+                field = HOTSPOT_FIELDS[priority_hotspots]
+                if field in priority_gdf.columns:
+                    add_hotspot_layer(
+                        m, priority_gdf, field, f"Priority {priority_hotspots}",
+                        ["Priority_Score", field], ["Batch Priority Score:", "Cluster:"]
+                    )
+                else:
+                    st.info("Run `calculate_station_priorities.py` to generate priority hotspot statistics.")
+            
+            # Weight-stability layer: how often each zone stays Critical/High across weightings
+            if show_stability and "Pct_Critical_High" in filtered_zones.columns:
+                stability_cmap = cm.linear.PuBu_09.scale(0, 100)
+                stability_cmap.caption = "% of Weightings Rated Critical/High"
+                folium.GeoJson(
+                    filtered_zones[[
+                        "Pct_Critical_High", "Rank_Pctl_P05", "Rank_Pctl_P50", "Rank_Pctl_P95", "geometry"
+                    ]],
+                    name="Weight Stability",
+                    style_function=lambda f: {
+                        "fillColor": stability_cmap(float(f["properties"].get("Pct_Critical_High") or 0)),
+                        "color": "#000",
+                        "weight": 0.5,
+                        "fillOpacity": 0.7,
+                    },
+                    tooltip=folium.GeoJsonTooltip(
+                        fields=["Pct_Critical_High", "Rank_Pctl_P05", "Rank_Pctl_P50", "Rank_Pctl_P95"],
+                        aliases=[
+                            "% Weightings Critical/High:",
+                            "Rank Percentile (5th):",
+                            "Rank Percentile (median):",
+                            "Rank Percentile (95th):"
+                        ],
+                        sticky=True,
+                        labels=True,
+                        style="font-size: 12px;"
+                    ),
+                    show=True,
+                ).add_to(m)
+                stability_cmap.add_to(m)
+            
             # Add existing stations if requested
             if show_existing:
                 try:
@@ -1213,17 +2093,119 @@ elif st.session_state.current_mode == "optimization":
                 except Exception as e:
                     st.warning(f"Could not load existing stations: {e}")
             
+            # Hypothetical what-if stations
+            if st.session_state.whatif_stations:
+                whatif_fg = folium.FeatureGroup(name="Hypothetical Stations", show=True)
+                for i, h in enumerate(st.session_state.whatif_stations, start=1):
+                    folium.Marker(
+                        location=[h["lat"], h["lon"]],
+                        icon=folium.Icon(color="purple" if h["type"] == "DC Fast" else "cadetblue", icon="plug", prefix="fa"),
+                        tooltip=f"Hypothetical #{i}: {h['type']} ({h['ports']} ports)",
+                    ).add_to(whatif_fg)
+                whatif_fg.add_to(m)
+            
+            # Optimized new station sites
+            if sites is not None and len(sites) > 0:
+                sites_fg = folium.FeatureGroup(name="Optimized New Sites", show=True)
+                site_points = shapely.centroid(sites.geometry.to_numpy())
+                for pt, (_, r) in zip(site_points, sites.iterrows()):
+                    folium.Marker(
+                        location=[pt.y, pt.x],
+                        icon=folium.Icon(color="darkblue", icon="bolt", prefix="fa"),
+                        tooltip=f"Site #{r['Site_Rank']} · {r.get('County', 'Unknown')}",
+                        popup=folium.Popup(
+                            f"<b>New Site #{r['Site_Rank']}</b><br>"
+                            f"Priority Score: {r['Custom_Score']:.1f}<br>"
+                            f"Marginal Coverage: {r['Marginal_Coverage']:.0f}",
+                            max_width=220
+                        ),
+                    ).add_to(sites_fg)
+                sites_fg.add_to(m)
+            
             folium.LayerControl(collapsed=False).add_to(m)
         
         # Display map
-        st_folium(
+        map_state = st_folium(
             m,
             height=650,
             use_container_width=True,
-            key=f"map_optimization_{priority_filter}_{min_score}_{corridor_weight}",
-            returned_objects=[]
+            key=(
+                f"map_optimization_{priority_filter}_{min_score}_{corridor_weight}_{count_col}"
+                f"_{num_sites}_{site_radius}_{site_method}_{len(st.session_state.whatif_stations)}_{show_stability}_{show_regions}_{priority_hotspots}"
+            ),
+            returned_objects=["last_clicked"] if whatif_enabled else []
         )
         
+        # A new map click drops a hypothetical station
+        if whatif_enabled and map_state and map_state.get("last_clicked"):
+            click = map_state["last_clicked"]
+            if click != st.session_state.whatif_last_click:
+                st.session_state.whatif_last_click = click
+                st.session_state.whatif_stations.append({
+                    "lat": click["lat"],
+                    "lon": click["lng"],
+                    "type": whatif_type,
+                    "ports": int(whatif_ports),
+                })
+                st.rerun()
+        
+        # What-if impact
+        if st.session_state.whatif_stations and "Score_Change" in priority_gdf.columns:
+            st.markdown("---")
+            st.markdown("What-If Impact")
+            changed = priority_gdf[priority_gdf["Score_Change"].abs() > 1e-9]
+            wi_stat_cols = st.columns(3)
+            with wi_stat_cols[0]:
+                st.metric("Hypothetical Stations", len(st.session_state.whatif_stations))
+            with wi_stat_cols[1]:
+                st.metric("Zones Re-scored", len(changed))
+            with wi_stat_cols[2]:
+                st.metric(
+                    "Mean Score Change",
+                    f"{changed['Score_Change'].mean():+.1f}" if len(changed) else "0.0"
+                )
+            
+            if whatif_corridors is not None and not whatif_corridors.empty:
+                corridor_table = whatif_corridors[["Road_Name", "Current_Max_Gap", "New_Max_Gap"]].copy()
+                corridor_table.columns = ["Corridor", "Max Gap Now (mi)", "Max Gap With Station (mi)"]
+                st.dataframe(
+                    corridor_table.reset_index(drop=True).style.format({
+                        "Max Gap Now (mi)": "{:.1f}",
+                        "Max Gap With Station (mi)": "{:.1f}"
+                    }),
+                    use_container_width=True
+                )
+            else:
+                st.caption("No highway-capable hypothetical station lies within 0.5 mi of an analyzed corridor.")
+        
+        # Contiguous regions table
+        if regions is not None:
+            st.markdown("---")
+            st.markdown("Contiguous Priority Regions")
+            if len(regions) == 0:
+                st.caption("No Critical or High priority zones under the current weights.")
+            else:
+                region_cols = ["Region_ID", "Num_Cells", "Area_SqMi", "Mean_Score", "Max_Score", "Critical_Cells"]
+                if "Counties" in regions.columns:
+                    region_cols.append("Counties")
+                region_table = pd.DataFrame(regions[region_cols]).rename(columns={
+                    "Region_ID": "Region",
+                    "Num_Cells": "Zones",
+                    "Area_SqMi": "Area (sq mi)",
+                    "Mean_Score": "Mean Score",
+                    "Max_Score": "Max Score",
+                    "Critical_Cells": "Critical Zones",
+                })
+                st.dataframe(
+                    region_table.style.format({
+                        "Area (sq mi)": "{:,.0f}",
+                        "Mean Score": "{:.1f}",
+                        "Max Score": "{:.1f}"
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        
         # Summary Analysis
         st.markdown("---")
         st.subheader("Priority Zone Analysis")
@@ -1310,6 +2292,95 @@ elif st.session_state.current_mode == "optimization":
         with stat_cols[3]:
             st.metric("Total Zones", len(filtered_zones))
         
+        # Siting results
+        if sites is not None:
+            st.markdown("---")
+            st.markdown("Optimized Station Sites")
+            site_stat_cols = st.columns(3)
+            with site_stat_cols[0]:
+                st.metric("Sites Selected", len(sites))
+            with site_stat_cols[1]:
+                st.metric("Weighted Demand Covered", f"{sites.attrs['Coverage_Pct']:.1f}%")
+            with site_stat_cols[2]:
+                st.metric("Solver Used", "Exact (MILP)" if sites.attrs["Method"] == "milp" else "Greedy")
+            
+            if "County" not in sites.columns:
+                sites["County"] = "Unknown"
+            site_table = sites[[
+                "Site_Rank", "County", "Custom_Score", "Corridor_Score",
+                "Equity_Score", "Queue_Score", "Marginal_Coverage"
+            ]].copy()
+            site_table.columns = [
+                "Rank", "County", "Priority Score", "Corridor Gap",
+                "Equity", "Queue Risk", "Marginal Coverage"
+            ]
+            st.dataframe(
+                site_table.reset_index(drop=True).style.format({
+                    "Priority Score": "{:.1f}",
+                    "Corridor Gap": "{:.1f}",
+                    "Equity": "{:.1f}",
+                    "Queue Risk": "{:.1f}",
+                    "Marginal Coverage": "{:.0f}"
+                }),
+                height=300
+            )
+        
+        # Pareto frontier of K-site placements
+        if show_frontier and num_sites > 0:
+            st.markdown("---")
+            st.markdown("Siting Trade-offs: Pareto Frontier")
+            try:
+                centers = load_cell_centers(priority_zones_path)
+                if len(centers) != len(priority_gdf):
+                    centers = cell_centers(priority_gdf)
+                with st.spinner("Computing Pareto frontier..."):
+                    frontier = cached_pareto_frontier(
+                        priority_zones_path,
+                        pd.DataFrame(priority_gdf[list(PARETO_OBJECTIVES)]),
+                        centers,
+                        int(num_sites),
+                        site_radius,
+                        priority_gdf.index.isin(filtered_zones.index),
+                    )
+                
+                fig = go.Figure(go.Scatter(
+                    x=frontier["DAC_Coverage_Pct"],
+                    y=frontier["Max_Gap_Reduction_Miles"],
+                    mode="markers",
+                    marker=dict(
+                        size=10,
+                        color=frontier["Queue_Coverage_Pct"],
+                        colorscale="YlOrRd",
+                        colorbar=dict(title="Queue Risk<br>Covered (%)"),
+                        line=dict(width=0.5, color="#333")
+                    ),
+                    hovertemplate="DAC: %{x:.1f}%<br>Max-gap reduction: %{y:.1f} mi<br>Queue: %{marker.color:.1f}%<extra></extra>"
+                ))
+                fig.update_layout(
+                    height=420,
+                    template="plotly_white",
+                    xaxis_title="DAC (Equity) Demand Covered (%)",
+                    yaxis_title="Corridor Max-Gap Reduction (mi, summed)",
+                    margin=dict(l=20, r=20, t=30, b=20)
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(
+                    f"{len(frontier)} non-dominated placements of {int(num_sites)} stations "
+                    f"({site_radius} mi coverage radius). No point can improve one objective without losing another. "
+                    f"Max-gap reduction sums, over corridors, how many miles each corridor's longest gap shrinks when "
+                    f"a station is added where the corridor crosses each chosen zone."
+                )
+                
+                frontier_table = frontier[list(PARETO_OBJECTIVES.values())].copy()
+                frontier_table.columns = ["Max-Gap Reduction (mi)", "DAC Covered (%)", "Queue Risk Covered (%)"]
+                st.dataframe(
+                    frontier_table.style.format("{:.1f}"),
+                    height=250,
+                    use_container_width=True
+                )
+            except Exception as e:
+                st.warning(f"Could not compute Pareto frontier: {e}")
+        
         # Actionable recommendations
         st.markdown("---")
         st.markdown("Recommendations for Planners")
@@ -0,0 +1,770 @@
+# priority_engine.py
+# Reusable building blocks for the station placement priority analysis.
+import hashlib
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import ndimage, sparse
+from scipy.sparse import csgraph
+from scipy.spatial import cKDTree
+
+from corridor_engine import MILE_M
+
+
+# --- Analysis Grids ---
+def build_grid(boundary: gpd.GeoDataFrame, cell_size: float) -> gpd.GeoDataFrame:
+    """Builds a square analysis grid over `boundary` (projected CRS, meters).
+
+    All candidate cells are created as one geometry array and filtered against
+    the boundary with a single STRtree query. Grid_Col / Grid_Row give each
+    cell's integer position in the full bounding-box lattice.
+    """
+    minx, miny, maxx, maxy = boundary.total_bounds
+    x_coords = np.arange(minx, maxx, cell_size)
+    y_coords = np.arange(miny, maxy, cell_size)
+
+    # Same x-major ordering as the original nested loop
+    cols, rows = np.meshgrid(np.arange(len(x_coords)), np.arange(len(y_coords)), indexing="ij")
+    cols, rows = cols.ravel(), rows.ravel()
+    x0, y0 = x_coords[cols], y_coords[rows]
+    cells = shapely.box(x0, y0, x0 + cell_size, y0 + cell_size)
+
+    # One spatial-index query: which candidate cells touch the boundary?
+    tree = shapely.STRtree(cells)
+    _, hits = tree.query(boundary.geometry.values, predicate="intersects")
+    keep = np.unique(hits)
+
+    return gpd.GeoDataFrame(
+        {"Grid_Col": cols[keep], "Grid_Row": rows[keep]},
+        geometry=cells[keep],
+        crs=boundary.crs,
+    ).reset_index(drop=True)
+
+
+# Pointy-top axial coordinates: the six neighbors of (q, r) are (q + dq, r + dr)
+HEX_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, -1), (-1, 1))
+SQUARE_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+QUEEN_OFFSETS = SQUARE_OFFSETS + ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def build_hex_grid(boundary: gpd.GeoDataFrame, cell_size: float) -> gpd.GeoDataFrame:
+    """Builds a pointy-top hexagon grid over `boundary` (projected CRS, meters).
+
+    Hexagons have the same area as a `cell_size` square so resolutions stay
+    comparable. Each cell carries axial Hex_Q / Hex_R coordinates, so
+    neighbors are plain index arithmetic (see HEX_OFFSETS).
+    """
+    minx, miny, maxx, maxy = boundary.total_bounds
+    size = cell_size * np.sqrt(2 / (3 * np.sqrt(3)))  # center-to-vertex radius
+    width, row_step = np.sqrt(3) * size, 1.5 * size
+
+    # Axial (q, r) ranges covering the bounding box, origin at (minx, miny)
+    r_vals = np.arange(-1, int(np.ceil((maxy - miny) / row_step)) + 2)
+    n_q = int(np.ceil((maxx - minx) / width)) + 3
+    q_start = np.floor(-r_vals / 2).astype(int) - 1
+    r = np.repeat(r_vals, n_q)
+    q = (q_start[:, None] + np.arange(n_q)).ravel()
+
+    cx = minx + width * (q + r / 2)
+    cy = miny + row_step * r
+    angles = np.deg2rad(30 + 60 * np.arange(6))
+    coords = np.stack([cx[:, None] + size * np.cos(angles), cy[:, None] + size * np.sin(angles)], axis=-1)
+    cells = shapely.polygons(coords)
+
+    tree = shapely.STRtree(cells)
+    _, hits = tree.query(boundary.geometry.to_numpy(), predicate="intersects")
+    keep = np.unique(hits)
+
+    return gpd.GeoDataFrame(
+        {"Hex_Q": q[keep], "Hex_R": r[keep]},
+        geometry=cells[keep],
+        crs=boundary.crs,
+    ).reset_index(drop=True)
+
+
+def _lattice_key(cols, rows, stride):
+    return (np.asarray(cols, dtype=np.int64) + 1) * stride + (np.asarray(rows, dtype=np.int64) + 1)
+
+
+def neighbor_index(grid: gpd.GeoDataFrame, queen: bool = False) -> np.ndarray:
+    """Returns an (n_cells, k) array of neighbor row positions (-1 = none).
+
+    Works on hex grids (Hex_Q / Hex_R, 6 neighbors) and square grids
+    (Grid_Col / Grid_Row, 4 neighbors, or 8 with `queen`); only cells on the
+    same lattice level are matched.
+    """
+    if "Hex_Q" in grid.columns:
+        a, b, offsets = grid["Hex_Q"].to_numpy(), grid["Hex_R"].to_numpy(), HEX_OFFSETS
+    else:
+        offsets = QUEEN_OFFSETS if queen else SQUARE_OFFSETS
+        a, b = grid["Grid_Col"].to_numpy(), grid["Grid_Row"].to_numpy()
+    if len(a) == 0:
+        return np.empty((0, len(offsets)), dtype=int)
+
+    a_min, b_min = a.min(), b.min()
+    a, b = a - a_min, b - b_min
+    stride = b.max() + 3
+    lookup = pd.Index(_lattice_key(a, b, stride))
+    return np.column_stack([lookup.get_indexer(_lattice_key(a + da, b + db, stride)) for da, db in offsets])
+
+
+def neighbor_gradient(grid: gpd.GeoDataFrame, values) -> np.ndarray:
+    """Largest absolute difference between each cell and its lattice neighbors.
+
+    Cells with no neighbor present get 0.
+    """
+    values = np.asarray(values, dtype=float)
+    neighbors = neighbor_index(grid)
+    found = neighbors >= 0
+    diffs = np.abs(values[:, None] - values[np.where(found, neighbors, 0)])
+    return np.where(found, diffs, 0).max(axis=1, initial=0)
+
+
+def subdivide_cells(grid: gpd.GeoDataFrame, boundary: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Splits each cell into 4 quadrants, keeping those that touch the boundary.
+
+    Children get Grid_Col / Grid_Row on the next (twice as fine) lattice and
+    Level + 1.
+    """
+    b = shapely.bounds(grid.geometry.to_numpy())
+    xm, ym = (b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2
+    dx, dy = np.array([0, 1, 0, 1]), np.array([0, 0, 1, 1])
+
+    x0 = np.where(dx == 0, b[:, [0]], xm[:, None]).ravel()
+    x1 = np.where(dx == 0, xm[:, None], b[:, [2]]).ravel()
+    y0 = np.where(dy == 0, b[:, [1]], ym[:, None]).ravel()
+    y1 = np.where(dy == 0, ym[:, None], b[:, [3]]).ravel()
+    cells = shapely.box(x0, y0, x1, y1)
+
+    tree = shapely.STRtree(cells)
+    _, hits = tree.query(boundary.geometry.to_numpy(), predicate="intersects")
+    keep = np.unique(hits)
+
+    children = pd.DataFrame({
+        "Grid_Col": (grid["Grid_Col"].to_numpy()[:, None] * 2 + dx).ravel(),
+        "Grid_Row": (grid["Grid_Row"].to_numpy()[:, None] * 2 + dy).ravel(),
+        "Level": np.repeat(grid["Level"].to_numpy() + 1, 4),
+    })
+    return gpd.GeoDataFrame(
+        children.iloc[keep].reset_index(drop=True), geometry=cells[keep], crs=grid.crs
+    )
+
+
+def adaptive_grid(boundary: gpd.GeoDataFrame, corridors, dac, queue_risk, stations,
+                  cell_size: float, min_cell_size: float, threshold: float = 40,
+                  gradient: float = 15, weights=None):
+    """Builds a mixed-resolution quadtree grid focused on high-priority areas.
+
+    Starts from the uniform grid at `cell_size` and, level by level, splits
+    cells whose composite score is >= `threshold` or differs from a same-level
+    neighbor by >= `gradient`, until cells reach `min_cell_size`. Every level
+    is scored once to decide where to split, and those scores are kept for
+    the cells that become leaves, so the result needs no second scoring pass.
+    Returns the leaf cells (with a Level attribute, 0 = coarsest), their
+    score_cells() table and their cell x DAC overlap matrix, all in leaf order.
+    """
+    level_grid = build_grid(boundary, cell_size)
+    level_grid["Level"] = 0
+    leaves, leaf_scores, leaf_overlaps = [], [], []
+    size = cell_size
+
+    while len(level_grid):
+        overlap = dac_overlap_matrix(level_grid.geometry.to_numpy(), dac)
+        scores = score_cells(level_grid, corridors, dac, queue_risk, stations, dac_overlap=overlap)
+        if size / 2 < min_cell_size * (1 - 1e-9):
+            refine = np.zeros(len(level_grid), dtype=bool)
+        else:
+            composite = composite_score(scores, weights)
+            refine = (composite >= threshold) | (neighbor_gradient(level_grid, composite) >= gradient)
+
+        leaves.append(level_grid[~refine])
+        leaf_scores.append(scores[~refine])
+        leaf_overlaps.append(overlap[np.flatnonzero(~refine)])
+        level_grid = subdivide_cells(level_grid[refine], boundary)
+        size /= 2
+
+    grid = gpd.GeoDataFrame(pd.concat(leaves, ignore_index=True), geometry="geometry", crs=boundary.crs)
+    scores = pd.concat(leaf_scores, ignore_index=True).set_index(grid.index)
+    return grid, scores, sparse.vstack(leaf_overlaps).tocsr()
+
+# --- Multi-Criteria Scoring ---
+DEFAULT_WEIGHTS = {
+    "Corridor_Score": 0.30,
+    "Equity_Score": 0.25,
+    "Queue_Score": 0.25,
+    "Density_Score": 0.20,
+}
+DENSITY_RADIUS_MI = 5  # radius behind Density_Score / Nearby_Stations
+COUNT_RADII_MI = (1, 5, 10)  # extra Stations_*mi / DCFC_*mi columns
+
+
+def _pairs(tree_geoms, query_geoms, predicate, **kwargs):
+    """Returns (query_idx, tree_idx) arrays for every pair matching `predicate`."""
+    tree = shapely.STRtree(tree_geoms)
+    return tree.query(query_geoms, predicate=predicate, **kwargs)
+
+
+def gap_scores(max_gap) -> np.ndarray:
+    """Buckets a corridor's worst gap (miles) - higher gap = higher priority."""
+    max_gap = np.asarray(max_gap, dtype=float)
+    return np.select([max_gap > 50, max_gap > 30, max_gap > 15], [100, 75, 50], default=25)
+
+
+def corridor_scores(cells, corridors: gpd.GeoDataFrame) -> np.ndarray:
+    """Scores each cell by the worst Max_Gap_Miles of the corridors crossing it."""
+    cell_idx, corr_idx = _pairs(corridors.geometry.to_numpy(), cells, "intersects")
+    gaps = corridors["Max_Gap_Miles"].to_numpy(dtype=float)
+
+    max_gap = np.full(len(cells), np.nan)
+    np.fmax.at(max_gap, cell_idx, gaps[corr_idx])
+    hit = np.bincount(cell_idx, minlength=len(cells)) > 0
+
+    return np.where(hit, gap_scores(max_gap), 0)
+
+
+def dac_overlap_matrix(cells, dac: gpd.GeoDataFrame) -> sparse.csr_matrix:
+    """Builds a sparse (cells x DAC tracts) matrix of intersection areas in m^2.
+
+    Rows follow the grid cell order, columns follow the row order of `dac`.
+    Computed once with a bulk STRtree query + vectorized intersection, it lets
+    any tract attribute be aggregated to cells with a sparse mat-vec product.
+    """
+    dac_geoms = dac.geometry.to_numpy()
+    cell_idx, dac_idx = _pairs(dac_geoms, cells, "intersects")
+    areas = shapely.area(shapely.intersection(cells[cell_idx], dac_geoms[dac_idx]))
+    return sparse.csr_matrix((areas, (cell_idx, dac_idx)), shape=(len(cells), len(dac_geoms)))
+
+
+def overlap_fingerprint(cells, dac: gpd.GeoDataFrame) -> str:
+    """Hash identifying the inputs of dac_overlap_matrix().
+
+    Covers the matrix shape, the grid bounds and every cell vertex (so a
+    shifted origin or a different cell size changes it even at the same
+    cell count) and the DAC geometries as WKB.
+    """
+    digest = hashlib.sha1()
+    digest.update(np.array([len(cells), len(dac)], dtype=np.int64).tobytes())
+    digest.update(np.asarray(shapely.total_bounds(cells), dtype=np.float64).tobytes())
+    digest.update(np.round(shapely.get_coordinates(cells), 3).tobytes())
+    for wkb in shapely.to_wkb(dac.geometry.to_numpy()):
+        digest.update(wkb or b"")
+    return digest.hexdigest()
+
+
+def equity_scores(cells, dac: gpd.GeoDataFrame = None, overlap: sparse.csr_matrix = None) -> np.ndarray:
+    """Scores each cell by the share of its area covered by DAC polygons."""
+    if overlap is None:
+        overlap = dac_overlap_matrix(cells, dac)
+    dac_area = np.asarray(overlap.sum(axis=1)).ravel()
+    dac_pct = dac_area / shapely.area(cells) * 100
+    return np.minimum(100, dac_pct * 2)  # Scale up
+
+
+def queue_scores(centers, queue_risk: gpd.GeoDataFrame) -> np.ndarray:
+    """Takes the Queue_Risk_Score of the (first) county containing each cell center."""
+    cell_idx, county_idx = _pairs(queue_risk.geometry.to_numpy(), centers, "intersects")
+    first = np.full(len(centers), len(queue_risk))
+    np.minimum.at(first, cell_idx, county_idx)
+
+    values = np.append(queue_risk["Queue_Risk_Score"].to_numpy(dtype=float), 0.0)
+    return values[first]
+
+
+def station_counts(centers, stations: gpd.GeoDataFrame, radii_mi=COUNT_RADII_MI) -> pd.DataFrame:
+    """Counts stations around each cell center for several radii.
+
+    Uses a cKDTree over projected station coordinates (one for all stations,
+    one for DC fast only), so no buffer polygons are built. Returns
+    Stations_<r>mi and DCFC_<r>mi columns.
+    """
+    xy = shapely.get_coordinates(stations.geometry.to_numpy())
+    dc_fast = pd.to_numeric(stations["ev_dc_fast_num"], errors="coerce").fillna(0).to_numpy() > 0
+    center_xy = shapely.get_coordinates(centers)
+
+    counts = {}
+    for label, pts in [("Stations", xy), ("DCFC", xy[dc_fast])]:
+        tree = cKDTree(pts) if len(pts) else None
+        for r in radii_mi:
+            if tree is None:
+                counts[f"{label}_{r:g}mi"] = np.zeros(len(center_xy), dtype=int)
+            else:
+                counts[f"{label}_{r:g}mi"] = tree.query_ball_point(center_xy, r * MILE_M, return_length=True)
+    return pd.DataFrame(counts)
+
+
+def density_scores(nearby: np.ndarray) -> np.ndarray:
+    """Inverse density score - fewer nearby stations = higher priority."""
+    return np.select(
+        [nearby == 0, nearby <= 2, nearby <= 5],
+        [100, 75, 50],
+        default=np.maximum(0, 50 - (nearby - 5) * 5),
+    )
+
+
+def score_cells(grid: gpd.GeoDataFrame, corridors, dac, queue_risk, stations,
+                dac_overlap: sparse.csr_matrix = None) -> pd.DataFrame:
+    """Computes the four criterion scores for every grid cell in one pass.
+
+    All layers must share the grid's projected CRS. Each polygon/line criterion
+    is a bulk STRtree query followed by a grouped reduction, so cost grows with
+    the number of cell/feature matches rather than cells x features. Station
+    density comes from station_counts(), which also adds the multi-radius
+    Stations_*mi / DCFC_*mi columns. Pass a precomputed `dac_overlap` matrix
+    to skip the DAC overlay.
+    """
+    cells = grid.geometry.to_numpy()
+    centers = shapely.centroid(cells)
+
+    counts = station_counts(centers, stations)
+    nearby = counts[f"Stations_{DENSITY_RADIUS_MI}mi"].to_numpy()
+
+    scores = pd.DataFrame({
+        "Corridor_Score": corridor_scores(cells, corridors),
+        "Equity_Score": equity_scores(cells, dac, overlap=dac_overlap),
+        "Queue_Score": queue_scores(centers, queue_risk),
+        "Density_Score": density_scores(nearby),
+        "Nearby_Stations": nearby,
+    })
+    return pd.concat([scores, counts], axis=1).set_index(grid.index)
+
+
+def composite_score(scores, weights=None) -> np.ndarray:
+    """Weighted sum of the four criterion columns as one (cells x 4) @ (4,) product."""
+    weights = weights or DEFAULT_WEIGHTS
+    components = scores[list(weights)].to_numpy(dtype=float)
+    return components @ np.fromiter(weights.values(), dtype=float)
+
+
+def assign_priority(score) -> np.ndarray:
+    """Maps composite scores to priority categories."""
+    score = np.asarray(score)
+    return np.select(
+        [score >= 75, score >= 60, score >= 40],
+        ["Critical Priority", "High Priority", "Moderate Priority"],
+        default="Low Priority",
+    )
+
+
+def weight_sensitivity(scores: pd.DataFrame, n_samples: int = 10000, seed: int = 0,
+                       batch_size: int = 128, high_threshold: float = 60,
+                       rank_samples: int = 2000) -> pd.DataFrame:
+    """Rank stability of every cell across random criterion weightings.
+
+    Draws `n_samples` weight vectors uniformly from the simplex (Dirichlet
+    with all alphas = 1) and scores a batch of them as float32 (samples x 4)
+    @ (4 x cells) products over cache-sized chunks of cells. For each cell
+    returns the percentage of weightings scoring it Critical/High
+    (>= `high_threshold`) or Critical (>= 75), and the 5th / 50th / 95th
+    percentiles of its rank percentile (100 = top-ranked).
+
+    Ranking costs several times more per weighting than the threshold
+    counts, so rank percentiles use only the first `rank_samples`
+    weightings; at 2000 they are typically within a point of the full
+    sweep. Each ranked weighting compares cells against its own 0.1-point
+    score CDF (a 1001-entry lookup table), so no per-sample sort is needed.
+    """
+    rng = np.random.default_rng(seed)
+    components = np.ascontiguousarray(np.clip(scores[list(DEFAULT_WEIGHTS)].to_numpy(dtype=np.float32), 0, 100).T)
+    n_cells = components.shape[1]
+    n_ranked = max(min(rank_samples, n_samples), 1)
+    n_bins = 1001  # 0.1-point score bins over 0-100
+    cell_block = 4096  # cells per chunk, small enough to stay in cache
+
+    high = np.zeros(n_cells, dtype=np.int64)
+    critical = np.zeros(n_cells, dtype=np.int64)
+    rank_hist = np.zeros((n_cells, 101), dtype=np.int64)
+    block_offset = np.arange(cell_block)[:, None] * 101
+
+    for start in range(0, n_samples, batch_size):
+        weights = rng.dirichlet(np.ones(len(components)), size=min(batch_size, n_samples - start))
+        weights = (10 * weights).astype(np.float32)  # scores in 0.1 points
+        ranked = max(min(n_ranked - start, len(weights)), 0)
+        bins = np.empty((ranked, n_cells), dtype=np.uint16)
+        for lo in range(0, n_cells, cell_block):
+            sampled = weights @ components[:, lo:lo + cell_block]  # samples x cells
+            high[lo:lo + cell_block] += np.count_nonzero(sampled >= 10 * high_threshold, axis=0)
+            critical[lo:lo + cell_block] += np.count_nonzero(sampled >= 750, axis=0)
+            bins[:, lo:lo + cell_block] = sampled[:ranked]
+        if not ranked:
+            continue
+
+        # Rank percentile per weighting from its score CDF
+        ranks = np.empty(bins.shape, dtype=np.uint8)
+        for i, row in enumerate(bins):
+            cdf = np.cumsum(np.bincount(row, minlength=n_bins))
+            ranks[i] = np.rint(100 * cdf / n_cells).astype(np.uint8).take(row)
+        for lo in range(0, n_cells, cell_block):
+            block = ranks[:, lo:lo + cell_block].T  # cells x samples
+            rank_hist[lo:lo + len(block)] += np.bincount(
+                (block_offset[:len(block)] + block).ravel(), minlength=len(block) * 101
+            ).reshape(-1, 101)
+
+    cum = np.cumsum(rank_hist, axis=1, out=rank_hist)
+
+    def quantile(q):
+        return np.argmax(cum >= q * n_ranked - 1e-9, axis=1)
+
+    return pd.DataFrame({
+        "Pct_Critical_High": 100 * high / n_samples,
+        "Pct_Critical": 100 * critical / n_samples,
+        "Rank_Pctl_P05": quantile(0.05),
+        "Rank_Pctl_P50": quantile(0.50),
+        "Rank_Pctl_P95": quantile(0.95),
+    }, index=scores.index)
+
+def county_crosswalk(grid: gpd.GeoDataFrame, counties: gpd.GeoDataFrame, name_col: str = "NAME") -> pd.DataFrame:
+    """Cell -> county lookup with the area share of every county a cell touches.
+
+    Returns one row per (Cell_ID, County) pair with Area_Share (fraction of
+    the cell's area) and Is_Majority flagging the county holding the largest
+    share. Cell_ID is the grid's index.
+    """
+    cells = grid.geometry.to_numpy()
+    county_geoms = counties.geometry.to_numpy()
+    cell_idx, county_idx = _pairs(county_geoms, cells, "intersects")
+    shares = shapely.area(shapely.intersection(cells[cell_idx], county_geoms[county_idx])) / shapely.area(cells[cell_idx])
+
+    crosswalk = pd.DataFrame({
+        "Cell_ID": grid.index.to_numpy()[cell_idx],
+        "County": counties[name_col].to_numpy()[county_idx],
+        "Area_Share": shares,
+    })
+    crosswalk = crosswalk[crosswalk["Area_Share"] > 0].sort_values(
+        ["Cell_ID", "Area_Share"], ascending=[True, False], kind="stable"
+    )
+    crosswalk["Is_Majority"] = ~crosswalk["Cell_ID"].duplicated()
+    return crosswalk.reset_index(drop=True)
+
+# --- Contiguous Priority Regions ---
+def _fine_lattice(grid: gpd.GeoDataFrame):
+    """Each square cell's footprint on the finest lattice of a (possibly adaptive) grid.
+
+    Returns (col0, row0, scale): a cell covers fine columns col0 .. col0 + scale - 1
+    and likewise for rows.
+    """
+    level = grid["Level"].to_numpy() if "Level" in grid.columns else np.zeros(len(grid), dtype=int)
+    scale = 2 ** (level.max() - level) if len(level) else np.ones(0, dtype=int)
+    return grid["Grid_Col"].to_numpy() * scale, grid["Grid_Row"].to_numpy() * scale, scale
+
+
+def _paint_lattice(col0, row0, scale, values, shape):
+    """Raster (cols x rows) with each cell's footprint filled with its value."""
+    raster = np.zeros(shape, dtype=np.asarray(values).dtype)
+    for s in np.unique(scale):
+        sel = scale == s
+        off = np.arange(s)
+        raster[col0[sel, None, None] + off[None, :, None],
+               row0[sel, None, None] + off[None, None, :]] = np.asarray(values)[sel, None, None]
+    return raster
+
+
+def label_regions(grid: gpd.GeoDataFrame, mask) -> np.ndarray:
+    """Labels edge-connected groups of masked cells (0 = not in a region).
+
+    Square and adaptive grids are painted onto their finest Grid_Col /
+    Grid_Row lattice and labeled with scipy.ndimage.label, so cells of
+    different quadtree levels that share an edge join up. Hex grids use
+    connected components over neighbor_index(). Regions are numbered 1..n
+    from the most cells to the fewest.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    labels = np.zeros(len(grid), dtype=int)
+    if not mask.any():
+        return labels
+
+    if "Hex_Q" in grid.columns:
+        neighbors = neighbor_index(grid)
+        src = np.repeat(np.arange(len(grid)), neighbors.shape[1])
+        dst = neighbors.ravel()
+        link = (dst >= 0) & mask[src] & mask[np.maximum(dst, 0)]
+        adjacency = sparse.csr_matrix(
+            (np.ones(link.sum()), (src[link], dst[link])), shape=(len(grid), len(grid))
+        )
+        _, component = csgraph.connected_components(adjacency, directed=False)
+        labels[mask] = np.unique(component[mask], return_inverse=True)[1] + 1
+    else:
+        col0, row0, scale = _fine_lattice(grid)
+        col0, row0 = col0 - col0[mask].min(), row0 - row0[mask].min()
+        shape = ((col0 + scale)[mask].max(), (row0 + scale)[mask].max())
+        raster = _paint_lattice(col0[mask], row0[mask], scale[mask], np.ones(mask.sum(), dtype=bool), shape)
+        raster_labels, _ = ndimage.label(raster)
+        labels[mask] = raster_labels[col0[mask], row0[mask]]
+
+    # Renumber largest-first
+    sizes = np.bincount(labels)[1:]
+    rank = np.empty(len(sizes), dtype=int)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(1, len(sizes) + 1)
+    labels[mask] = rank[labels[mask] - 1]
+    return labels
+
+
+def _region_runs(grid: gpd.GeoDataFrame, labels: np.ndarray):
+    """Horizontal runs of same-region fine lattice cells as boxes, with their labels.
+
+    Box corners are computed from integer lattice positions, so touching
+    runs share bit-identical edges and union cleanly.
+    """
+    inside = labels > 0
+    col0, row0, scale = _fine_lattice(grid)
+    bounds = shapely.bounds(grid.geometry.to_numpy()[inside])
+    fine = np.median((bounds[:, 2] - bounds[:, 0]) / scale[inside])
+    origin_x = np.median(bounds[:, 0] - col0[inside] * fine)
+    origin_y = np.median(bounds[:, 1] - row0[inside] * fine)
+
+    c_min, r_min = col0[inside].min(), row0[inside].min()
+    shape = ((col0 + scale)[inside].max() - c_min, (row0 + scale)[inside].max() - r_min)
+    raster = _paint_lattice(col0[inside] - c_min, row0[inside] - r_min, scale[inside], labels[inside], shape)
+
+    padded = np.pad(raster.T, ((0, 0), (1, 1)))  # rows x (cols + 2)
+    change = padded[:, 1:] != padded[:, :-1]
+    run_row, run_start = np.nonzero(change & (padded[:, 1:] > 0))
+    _, run_end = np.nonzero(change & (padded[:, :-1] > 0))
+    run_label = padded[run_row, run_start + 1]
+
+    x = origin_x + (c_min + np.stack([run_start, run_end])) * fine
+    y = origin_y + (r_min + np.stack([run_row, run_row + 1])) * fine
+    return shapely.box(x[0], y[0], x[1], y[1]), run_label
+
+
+def dissolve_regions(grid: gpd.GeoDataFrame, labels: np.ndarray) -> gpd.GeoSeries:
+    """One dissolved polygon per region label (index = label).
+
+    Square / adaptive grids are merged from run-length boxes on the cell
+    lattice, so each region unions a handful of strips instead of every
+    cell. Hex grids union their cells with a small snapping grid to absorb
+    floating-point seams between neighbors.
+    """
+    labels = np.asarray(labels)
+    if not (labels > 0).any():
+        return gpd.GeoSeries([], crs=grid.crs)
+    if "Hex_Q" in grid.columns:
+        pieces, piece_label = grid.geometry.to_numpy()[labels > 0], labels[labels > 0]
+        snap = np.sqrt(np.median(shapely.area(pieces))) * 1e-6
+    else:
+        (pieces, piece_label), snap = _region_runs(grid, labels), None
+
+    order = np.argsort(piece_label, kind="stable")
+    region_ids, starts = np.unique(piece_label[order], return_index=True)
+    polygons = [shapely.union_all(group, grid_size=snap) for group in np.split(pieces[order], starts[1:])]
+    return gpd.GeoSeries(polygons, index=region_ids, crs=grid.crs)
+
+
+def summarize_regions(grid: gpd.GeoDataFrame, labels: np.ndarray, score_col: str = "Priority_Score",
+                      crosswalk: pd.DataFrame = None) -> gpd.GeoDataFrame:
+    """Per-region score statistics, area, counties and dissolved geometry.
+
+    `grid` must be in a projected CRS (meters). Scores are area-weighted so
+    adaptive grids with mixed cell sizes summarize fairly. `crosswalk` is the
+    county_crosswalk() table; Counties lists every county the region
+    touches, largest share first. Cells are matched on Cell_ID when the grid
+    has that column, otherwise on the grid index.
+    """
+    labels = np.asarray(labels)
+    inside = labels > 0
+    n_regions = labels.max(initial=0)
+    area = shapely.area(grid.geometry.to_numpy())
+    region_area = np.bincount(labels[inside], weights=area[inside], minlength=n_regions + 1)[1:]
+
+    def weighted_mean(values):
+        sums = np.bincount(labels[inside], weights=(values * area)[inside], minlength=n_regions + 1)[1:]
+        return np.divide(sums, region_area, out=np.zeros(n_regions), where=region_area > 0)
+
+    score = grid[score_col].to_numpy(dtype=float)
+    max_score = np.full(n_regions + 1, -np.inf)
+    np.maximum.at(max_score, labels[inside], score[inside])
+    summary = pd.DataFrame({
+        "Region_ID": np.arange(1, n_regions + 1),
+        "Num_Cells": np.bincount(labels[inside], minlength=n_regions + 1)[1:],
+        "Area_SqMi": region_area / MILE_M ** 2,
+        "Mean_Score": weighted_mean(score),
+        "Max_Score": max_score[1:],
+        "Critical_Cells": np.bincount(labels[inside & (score >= 75)], minlength=n_regions + 1)[1:],
+    })
+    for col in DEFAULT_WEIGHTS:
+        if col in grid.columns:
+            summary[f"Mean_{col}"] = weighted_mean(grid[col].to_numpy(dtype=float))
+
+    if crosswalk is not None:
+        cell_ids = grid["Cell_ID"].to_numpy() if "Cell_ID" in grid.columns else grid.index.to_numpy()
+        pos = pd.Index(cell_ids).get_indexer(crosswalk["Cell_ID"])
+        found = pos >= 0
+        shares = pd.DataFrame({
+            "Region_ID": labels[pos[found]],
+            "County": crosswalk["County"].to_numpy()[found],
+            "County_Area": crosswalk["Area_Share"].to_numpy()[found] * area[pos[found]],
+        })
+        shares = shares[shares["Region_ID"] > 0].groupby(["Region_ID", "County"], as_index=False)["County_Area"].sum()
+        shares = shares.sort_values(["Region_ID", "County_Area"], ascending=[True, False])
+        counties = shares.groupby("Region_ID")["County"].agg(list)
+        summary["Primary_County"] = summary["Region_ID"].map(counties.str[0])
+        summary["Counties"] = summary["Region_ID"].map(counties.str.join(", "))
+
+    geometry = dissolve_regions(grid, labels)
+    return gpd.GeoDataFrame(summary, geometry=geometry.reindex(summary["Region_ID"]).to_numpy(), crs=grid.crs)
+
+
+# --- Parallel Scoring ---
+# Shared layers live in each worker process; they are shipped once as WKB
+# through the pool initializer instead of being pickled with every task.
+_SHARED_LAYERS = {}
+_LAYER_COLUMNS = {
+    "corridors": ["Max_Gap_Miles"],
+    "dac": [],
+    "queue_risk": ["Queue_Risk_Score"],
+    "stations": ["ev_dc_fast_num"],
+}
+
+
+def _pack_layer(gdf: gpd.GeoDataFrame, columns) -> tuple:
+    """Reduces a layer to (WKB geometries, needed attribute arrays, CRS)."""
+    attrs = {col: gdf[col].to_numpy() for col in columns}
+    return shapely.to_wkb(gdf.geometry.to_numpy()), attrs, gdf.crs.to_wkt()
+
+
+def _unpack_layer(packed) -> gpd.GeoDataFrame:
+    wkb, attrs, crs = packed
+    return gpd.GeoDataFrame(attrs, geometry=shapely.from_wkb(wkb), crs=crs)
+
+
+def _init_worker(packed_layers):
+    for name, packed in packed_layers.items():
+        _SHARED_LAYERS[name] = _unpack_layer(packed)
+
+
+def _score_chunk(task):
+    chunk_id, cell_wkb, index, overlap = task
+    cells = shapely.from_wkb(cell_wkb)
+    grid = gpd.GeoDataFrame(geometry=cells, index=index, crs=_SHARED_LAYERS["dac"].crs)
+    if overlap is None:
+        overlap = dac_overlap_matrix(cells, _SHARED_LAYERS["dac"])
+    scores = score_cells(grid, dac_overlap=overlap, **_SHARED_LAYERS)
+    return chunk_id, scores, overlap
+
+
+def score_cells_parallel(grid: gpd.GeoDataFrame, corridors, dac, queue_risk, stations,
+                         workers: int, dac_overlap: sparse.csr_matrix = None, chunks_per_worker: int = 4):
+    """Runs score_cells() over spatial chunks of the grid in a process pool.
+
+    The grid is split into contiguous bands of its x-major cell order, each
+    band is scored in a worker, and the results are merged back in grid
+    order, so output is identical to the serial path. Returns the scores and
+    the assembled cell x DAC overlap matrix.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # The batch scripts run at module level, so prefer fork: spawned workers
+    # would re-import (and re-run) the calling script.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    packed = {
+        name: _pack_layer(layer, _LAYER_COLUMNS[name])
+        for name, layer in [("corridors", corridors), ("dac", dac),
+                            ("queue_risk", queue_risk), ("stations", stations)]
+    }
+    cell_wkb = shapely.to_wkb(grid.geometry.to_numpy())
+    bands = [b for b in np.array_split(np.arange(len(grid)), workers * chunks_per_worker) if len(b)]
+    tasks = [
+        (i, cell_wkb[b], grid.index[b], None if dac_overlap is None else dac_overlap[b])
+        for i, b in enumerate(bands)
+    ]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(packed,)) as pool:
+        for chunk_id, scores, overlap in pool.map(_score_chunk, tasks):
+            results[chunk_id] = (scores, overlap)
+
+    ordered = [results[i] for i in range(len(tasks))]
+    scores = pd.concat([r[0] for r in ordered])
+    overlap = sparse.vstack([r[1] for r in ordered]).tocsr()
+    return scores, overlap
+
+
+# --- Incremental Station Updates ---
+STATION_ID_COL = "id"  # AFDC station ID
+SNAPSHOT_COLUMNS = [STATION_ID_COL, "Latitude", "Longitude", "ev_dc_fast_num"]
+
+
+def station_snapshot(stations_df: pd.DataFrame) -> pd.DataFrame:
+    """Reduces the station CSV to the fields that drive the density criterion.
+
+    One row per station ID (duplicate feed rows dropped). Full and delta
+    runs both count this set, so a delta update matches a full rescore.
+    """
+    snap = stations_df.dropna(subset=["Latitude", "Longitude"]).copy()
+    if STATION_ID_COL not in snap.columns:
+        # No AFDC ID - key stations by their coordinates instead
+        snap[STATION_ID_COL] = snap["Latitude"].round(6).astype(str) + "," + snap["Longitude"].round(6).astype(str)
+    snap["ev_dc_fast_num"] = pd.to_numeric(snap["ev_dc_fast_num"], errors="coerce").fillna(0)
+    return snap[SNAPSHOT_COLUMNS].drop_duplicates(subset=STATION_ID_COL).reset_index(drop=True)
+
+
+def station_layer(snapshot: pd.DataFrame, crs) -> gpd.GeoDataFrame:
+    """Station snapshot as points in the grid's projected CRS."""
+    return gpd.GeoDataFrame(
+        snapshot, geometry=gpd.points_from_xy(snapshot.Longitude, snapshot.Latitude), crs="EPSG:4326"
+    ).to_crs(crs)
+
+
+def diff_stations(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Compares two station snapshots by ID, coordinates and DC fast ports.
+
+    Returns one row per station that was added, removed or changed, with a
+    Change column and its old / new coordinates.
+    """
+    merged = old.merge(new, on=STATION_ID_COL, how="outer", suffixes=("_old", "_new"), indicator=True)
+    same = (
+        (merged["_merge"] == "both")
+        & np.isclose(merged["Latitude_old"], merged["Latitude_new"])
+        & np.isclose(merged["Longitude_old"], merged["Longitude_new"])
+        & ((merged["ev_dc_fast_num_old"] > 0) == (merged["ev_dc_fast_num_new"] > 0))
+    )
+    changed = merged[~same].copy()
+    changed["Change"] = changed["_merge"].map({"left_only": "removed", "right_only": "added", "both": "changed"})
+    return changed.drop(columns="_merge").reset_index(drop=True)
+
+
+def changed_station_points(changes: pd.DataFrame, crs) -> np.ndarray:
+    """Projected (x, y) of every old and new position touched by a change."""
+    latlon = pd.concat([
+        changes[["Latitude_old", "Longitude_old"]].set_axis(["Latitude", "Longitude"], axis=1),
+        changes[["Latitude_new", "Longitude_new"]].set_axis(["Latitude", "Longitude"], axis=1),
+    ]).dropna()
+    points = gpd.GeoSeries(gpd.points_from_xy(latlon.Longitude, latlon.Latitude), crs="EPSG:4326").to_crs(crs)
+    return shapely.get_coordinates(points.to_numpy())
+
+
+def rescore_station_changes(grid: gpd.GeoDataFrame, stations: gpd.GeoDataFrame,
+                            changed_xy: np.ndarray, weights=None) -> np.ndarray:
+    """Re-scores, in place, only the cells near added / removed / moved stations.
+
+    `grid` is a scored grid (projected CRS) and `stations` the new station
+    layer. Cells whose center lies within the largest count radius of a
+    changed position get fresh Stations_*mi / DCFC_*mi counts, Density_Score,
+    Nearby_Stations, Priority_Score and Priority_Category. Returns the row
+    positions that were updated.
+    """
+    if len(changed_xy) == 0:
+        return np.array([], dtype=int)
+
+    centers = shapely.centroid(grid.geometry.to_numpy())
+    radius = max(COUNT_RADII_MI) * MILE_M
+    near = cKDTree(changed_xy).query_ball_point(shapely.get_coordinates(centers), radius, return_length=True)
+    rows = np.flatnonzero(near > 0)
+    if len(rows) == 0:
+        return rows
+
+    counts = station_counts(centers[rows], stations)
+    counts["Nearby_Stations"] = counts[f"Stations_{DENSITY_RADIUS_MI}mi"]
+    counts["Density_Score"] = density_scores(counts["Nearby_Stations"].to_numpy())
+    for col in counts.columns:
+        grid.iloc[rows, grid.columns.get_loc(col)] = counts[col].to_numpy()
+
+    priority = composite_score(grid.iloc[rows], weights)
+    grid.iloc[rows, grid.columns.get_loc("Priority_Score")] = priority
+    grid.iloc[rows, grid.columns.get_loc("Priority_Category")] = assign_priority(priority)
+    return rows
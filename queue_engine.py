@@ -0,0 +1,159 @@
+# queue_engine.py
+# Station-level M/M/c (Erlang C) charging queues fed by nearby EV registrations.
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from corridor_engine import MILE_M
+
+DEMAND_RADIUS_MI = 15  # registrations farther than this never use a station
+DECAY_MI = 5  # distance-decay scale of station choice
+
+# Queue assumptions (tunable from the script and the explorer)
+L2_SESSIONS_PER_EV_DAY = 0.05  # public Level 2 sessions per registered EV per day
+DC_SESSIONS_PER_EV_DAY = 0.02  # DC fast sessions per registered EV per day
+PEAK_HOUR_SHARE = 0.12  # share of daily sessions arriving in the busiest hour
+L2_SERVICE_HOURS = 2.5  # mean plugged-in time at a Level 2 port
+DC_SERVICE_HOURS = 0.5  # mean DC fast session
+
+WAIT_CATEGORIES = ([0.2, 0.5], ["Low", "Moderate", "High"])  # Wait_Prob cut points
+
+
+# --- Demand Allocation ---
+def demand_pairs(demand_xy: np.ndarray, station_xy: np.ndarray, radius: float = DEMAND_RADIUS_MI * MILE_M):
+    """(demand idx, station idx, distance) for every pair within `radius` (projected meters)."""
+    pairs = cKDTree(demand_xy).sparse_distance_matrix(cKDTree(station_xy), radius, output_type="ndarray")
+    return pairs["i"], pairs["j"], pairs["v"]
+
+
+def allocate_demand(pairs, demand, capacity, decay: float = DECAY_MI * MILE_M) -> np.ndarray:
+    """Splits each demand point across reachable stations (Huff model).
+
+    A station's share of a demand point is proportional to its capacity
+    times exp(-distance / decay). Demand with no reachable capacity is
+    dropped. Returns the demand allocated to each station.
+    """
+    i, j, d = pairs
+    demand = np.asarray(demand, dtype=float)
+    capacity = np.asarray(capacity, dtype=float)
+    pull = capacity[j] * np.exp(-d / decay)
+    total = np.bincount(i, weights=pull, minlength=len(demand))
+    share = np.divide(pull, total[i], out=np.zeros_like(pull), where=total[i] > 0)
+    return np.bincount(j, weights=demand[i] * share, minlength=len(capacity))
+
+
+def station_demand(pairs, evs, l2_ports, dc_ports, decay: float = DECAY_MI * MILE_M) -> pd.DataFrame:
+    """Registered EVs allocated to each station's Level 2 and DC fast pools.
+
+    The two pools are allocated separately (capacity = ports of that type),
+    so a driver needing a fast charge is only pulled toward DC fast sites.
+    """
+    return pd.DataFrame({
+        "L2_EVs": allocate_demand(pairs, evs, l2_ports, decay),
+        "DC_EVs": allocate_demand(pairs, evs, dc_ports, decay),
+    })
+
+
+# --- Erlang C ---
+def erlang_c(arrivals, service_hours, servers):
+    """Vectorized M/M/c queue: probability of waiting and mean wait (hours).
+
+    Erlang B is built with the stable recursion B(k) = aB(k-1) / (k + aB(k-1))
+    for all queues at once, one step per server up to the largest c, then
+    C = cB / (c - a(1 - B)). Overloaded queues (a >= c) get Wait_Prob 1 and
+    an infinite wait; queues without servers get NaN.
+    """
+    arrivals = np.asarray(arrivals, dtype=float)
+    servers = np.asarray(servers).astype(int)
+    service_hours = np.broadcast_to(np.asarray(service_hours, dtype=float), arrivals.shape)
+    load = arrivals * service_hours  # offered traffic in Erlangs
+
+    blocking = np.ones_like(load)
+    for k in range(1, int(servers.max(initial=0)) + 1):
+        step = servers >= k
+        blocking[step] = load[step] * blocking[step] / (k + load[step] * blocking[step])
+
+    stable = load < servers
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wait_prob = np.where(stable, servers * blocking / (servers - load * (1 - blocking)), 1.0)
+        wait_hours = np.where(stable, wait_prob * service_hours / (servers - load), np.inf)
+    no_ports = servers <= 0
+    return np.where(no_ports, np.nan, wait_prob), np.where(no_ports, np.nan, wait_hours)
+
+
+def station_queues(demand: pd.DataFrame, l2_ports, dc_ports,
+                   l2_sessions: float = L2_SESSIONS_PER_EV_DAY, dc_sessions: float = DC_SESSIONS_PER_EV_DAY,
+                   peak_share: float = PEAK_HOUR_SHARE, l2_service: float = L2_SERVICE_HOURS,
+                   dc_service: float = DC_SERVICE_HOURS) -> pd.DataFrame:
+    """Peak-hour Level 2 and DC fast queues at every station.
+
+    Arrivals are allocated EVs x sessions per EV per day x peak-hour share.
+    Per pool: Arrivals_Hr, Utilization, Wait_Prob and Wait_Minutes (NaN
+    where the pool is overloaded or has no ports). Station-wide Wait_Prob
+    and Wait_Minutes are arrival-weighted over both pools; Overloaded marks
+    stations where either pool's arrivals exceed its capacity.
+    """
+    out = {}
+    arrivals_total = np.zeros(len(demand))
+    weighted_prob = np.zeros(len(demand))
+    weighted_wait = np.zeros(len(demand))
+    overloaded = np.zeros(len(demand), dtype=bool)
+    for pool, ports, sessions, service in [
+        ("L2", l2_ports, l2_sessions, l2_service),
+        ("DC", dc_ports, dc_sessions, dc_service),
+    ]:
+        ports = np.asarray(ports, dtype=float)
+        arrivals = demand[f"{pool}_EVs"].to_numpy() * sessions * peak_share
+        wait_prob, wait_hours = erlang_c(arrivals, service, ports)
+        served = ports > 0
+        over = served & np.isinf(wait_hours)
+        out[f"{pool}_Arrivals_Hr"] = arrivals
+        out[f"{pool}_Utilization"] = np.divide(arrivals * service, ports, out=np.full(len(ports), np.nan), where=served)
+        out[f"{pool}_Wait_Prob"] = wait_prob
+        out[f"{pool}_Wait_Minutes"] = np.where(over, np.nan, wait_hours * 60)
+
+        arrivals_total += np.where(served, arrivals, 0)
+        weighted_prob += np.where(served, arrivals * np.nan_to_num(wait_prob), 0)
+        weighted_wait += arrivals * np.where(served & ~over, wait_hours * 60, 0)
+        overloaded |= over
+
+    has_ports = (np.asarray(l2_ports) > 0) | (np.asarray(dc_ports) > 0)
+    with np.errstate(invalid="ignore"):
+        out["Wait_Prob"] = np.where(has_ports, np.where(arrivals_total > 0, weighted_prob / arrivals_total, 0), np.nan)
+        out["Wait_Minutes"] = np.where(
+            has_ports & ~overloaded, np.where(arrivals_total > 0, weighted_wait / arrivals_total, 0), np.nan
+        )
+    out["Overloaded"] = overloaded
+    queues = pd.DataFrame(out, index=demand.index)
+    bins, labels = WAIT_CATEGORIES
+    queues["Congestion"] = np.where(
+        overloaded, "Overloaded",
+        np.where(has_ports, np.array(labels, dtype=object)[np.digitize(np.nan_to_num(out["Wait_Prob"]), bins)], "No Ports")
+    )
+    return queues
+
+
+def county_queue_rollup(queues: pd.DataFrame, county) -> pd.DataFrame:
+    """Per county: modeled and overloaded stations, peak arrivals and arrival-weighted waits."""
+    arrivals = queues["L2_Arrivals_Hr"].to_numpy() + queues["DC_Arrivals_Hr"].to_numpy()
+    stable = ~queues["Overloaded"].to_numpy()
+    modeled = queues["Congestion"].to_numpy() != "No Ports"
+    table = pd.DataFrame({
+        "NAME": np.asarray(county),
+        "Modeled": modeled,
+        "Overloaded": queues["Overloaded"].to_numpy(),
+        "Arrivals": np.where(modeled, arrivals, 0),
+        "Prob_x_Arrivals": np.where(modeled, arrivals * queues["Wait_Prob"].fillna(0).to_numpy(), 0),
+        "Stable_Arrivals": np.where(modeled & stable, arrivals, 0),
+        "Wait_x_Arrivals": np.where(modeled & stable, arrivals * queues["Wait_Minutes"].fillna(0).to_numpy(), 0),
+    })
+    sums = table.groupby("NAME").sum()
+    return pd.DataFrame({
+        "Modeled_Stations": sums["Modeled"].astype(int),
+        "Overloaded_Stations": sums["Overloaded"].astype(int),
+        "Peak_Arrivals_Hr": sums["Arrivals"],
+        "Avg_Wait_Prob": np.divide(sums["Prob_x_Arrivals"], sums["Arrivals"],
+                                   out=np.zeros(len(sums)), where=sums["Arrivals"] > 0),
+        "Avg_Wait_Minutes": np.divide(sums["Wait_x_Arrivals"], sums["Stable_Arrivals"],
+                                      out=np.zeros(len(sums)), where=sums["Stable_Arrivals"] > 0),
+    }, index=sums.index).reset_index()
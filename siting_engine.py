@@ -0,0 +1,306 @@
+# siting_engine.py
+# Maximal-covering station siting on top of the priority grid.
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.spatial import cKDTree
+
+from corridor_engine import MILE_M, gap_pieces
+
+# Objectives a new site can cover (density is handled by coverage itself)
+SITING_WEIGHTS = {
+    "Corridor_Score": 0.30,
+    "Equity_Score": 0.25,
+    "Queue_Score": 0.25,
+}
+MILP_TIME_LIMIT = 10  # seconds before the MILP returns its best incumbent
+
+
+def cell_centers(grid: gpd.GeoDataFrame, epsg: int = 5070) -> np.ndarray:
+    """Projected (x, y) of every cell centroid."""
+    return shapely.get_coordinates(shapely.centroid(grid.to_crs(epsg=epsg).geometry.to_numpy()))
+
+
+def coverage_matrix(demand_xy: np.ndarray, site_xy: np.ndarray, radius: float) -> sparse.csc_matrix:
+    """Sparse (demand x sites) 0/1 matrix: 1 where a site lies within `radius` of a demand point."""
+    pairs = cKDTree(demand_xy).sparse_distance_matrix(cKDTree(site_xy), radius, output_type="ndarray")
+    return sparse.csc_matrix(
+        (np.ones(len(pairs)), (pairs["i"], pairs["j"])), shape=(len(demand_xy), len(site_xy))
+    )
+
+
+def demand_weights(scores: pd.DataFrame, weights=None) -> np.ndarray:
+    """Weighted corridor-gap / DAC / queue-risk demand of each cell."""
+    weights = weights or SITING_WEIGHTS
+    return scores[list(weights)].to_numpy(dtype=float) @ np.fromiter(weights.values(), dtype=float)
+
+
+def solve_greedy(coverage: sparse.csc_matrix, demand: np.ndarray, k: int,
+                 coverage_rows: sparse.csr_matrix = None):
+    """Greedy maximal covering with incremental marginal gains.
+
+    Keeps every site's marginal gain in one array: after a pick, only the
+    sites covering its newly covered demand rows lose that demand, found
+    through `coverage_rows` (the CSR copy of `coverage`; built if not
+    given). Each pick is then an argmax, so the picks match lazy greedy
+    (CELF) without re-evaluating stale candidates one at a time. Returns
+    the chosen site indices in pick order and each pick's marginal gain.
+    """
+    if coverage_rows is None:
+        coverage_rows = coverage.tocsr()
+    indptr, indices = coverage.indptr, coverage.indices
+    covered = np.zeros(coverage.shape[0], dtype=bool)
+    marginal = coverage.T @ demand
+
+    chosen, gains = [], []
+    while len(chosen) < min(k, coverage.shape[1]):
+        j = int(np.argmax(marginal))
+        rows = indices[indptr[j]:indptr[j + 1]]
+        new = rows[~covered[rows]]
+        gain = demand[new].sum()
+        if gain <= 0:
+            break
+        chosen.append(j)
+        gains.append(gain)
+        covered[new] = True
+        hit = coverage_rows[new]
+        marginal -= np.bincount(hit.indices, weights=np.repeat(demand[new], np.diff(hit.indptr)),
+                                minlength=len(marginal))
+        marginal[j] = -np.inf
+    return np.array(chosen, dtype=int), np.array(gains)
+
+
+def solve_milp(coverage: sparse.csc_matrix, demand: np.ndarray, k: int, time_limit: float = MILP_TIME_LIMIT):
+    """Exact maximal covering location problem via scipy.optimize.milp.
+
+    Variables are x_j (open site j, binary) and y_i (demand i covered, 0-1).
+    Maximizes sum(demand * y) s.t. y_i <= sum_j a_ij x_j and sum(x) <= k.
+    Returns the chosen site indices and their marginal gains in greedy order.
+    """
+    n_dem, n_site = coverage.shape
+    c = np.concatenate([np.zeros(n_site), -demand])
+    link = sparse.hstack([-coverage, sparse.identity(n_dem)], format="csr")
+    budget = sparse.csr_matrix(np.concatenate([np.ones(n_site), np.zeros(n_dem)]))
+    constraints = [
+        LinearConstraint(link, -np.inf, 0),
+        LinearConstraint(budget, 0, k),
+    ]
+    integrality = np.concatenate([np.ones(n_site), np.zeros(n_dem)])
+    result = milp(c, constraints=constraints, integrality=integrality,
+                  bounds=Bounds(0, 1), options={"time_limit": time_limit})
+    if result.x is None:
+        raise RuntimeError(f"MILP siting failed: {result.message}")
+
+    picked = np.flatnonzero(result.x[:n_site] > 0.5)
+    # Order the exact solution by marginal contribution for reporting
+    order, gains = solve_greedy(coverage[:, picked], demand, len(picked))
+    return picked[order], gains
+
+
+def site_stations(grid: gpd.GeoDataFrame, k: int, radius_mi: float = 10, weights=None,
+                  candidates=None, method: str = "greedy", centers: np.ndarray = None,
+                  coverage: sparse.csc_matrix = None, coverage_rows: sparse.csr_matrix = None) -> pd.DataFrame:
+    """Chooses up to `k` new station cells maximizing weighted demand coverage.
+
+    `grid` is the scored priority grid (any CRS); every cell is demand and
+    `candidates` (boolean mask, default all cells) are the allowed sites. A
+    site covers demand cells whose centers lie within `radius_mi`. `method`
+    is "greedy" (default, sub-second statewide) or "milp", which is only run
+    on request since statewide instances can take the full MILP_TIME_LIMIT;
+    a MILP that stops at its time limit with a worse incumbent than greedy
+    falls back to the greedy picks. `coverage` (and its CSR copy
+    `coverage_rows`) can be passed in when the same grid, radius and
+    candidates are re-solved with other weights or k. Returns the chosen
+    rows of `grid` with Site_Rank and Marginal_Coverage columns plus a
+    Coverage_Pct attribute (share of total demand covered).
+    """
+    candidates = np.ones(len(grid), dtype=bool) if candidates is None else np.asarray(candidates)
+    site_idx = np.flatnonzero(candidates)
+    demand = demand_weights(grid, weights)
+    if coverage is None:
+        centers = cell_centers(grid) if centers is None else centers
+        coverage = coverage_matrix(centers, centers[site_idx], radius_mi * MILE_M)
+
+    chosen, gains = solve_greedy(coverage, demand, k, coverage_rows)
+    if method == "milp":
+        milp_chosen, milp_gains = solve_milp(coverage, demand, k)
+        if milp_gains.sum() >= gains.sum():
+            chosen, gains = milp_chosen, milp_gains
+        else:
+            method = "greedy"
+
+    sites = grid.iloc[site_idx[chosen]].copy()
+    sites["Site_Rank"] = np.arange(1, len(chosen) + 1)
+    sites["Marginal_Coverage"] = gains
+    total = demand.sum()
+    sites.attrs["Coverage_Pct"] = float(100 * gains.sum() / total) if total > 0 else 0.0
+    sites.attrs["Method"] = method
+    return sites
+
+
+# --- Pareto Frontier (corridor max-gap reduction vs DAC vs queue-risk coverage) ---
+# Component column -> frontier column. Corridor_Score only seeds the greedy
+# sweep; the corridor objective itself is the max-gap reduction in miles.
+PARETO_OBJECTIVES = {
+    "Corridor_Score": "Max_Gap_Reduction_Miles",
+    "Equity_Score": "DAC_Coverage_Pct",
+    "Queue_Score": "Queue_Coverage_Pct",
+}
+
+
+def corridor_max_gaps(corr, pos, lengths_m) -> np.ndarray:
+    """Max gap (miles) per corridor for station positions sorted by corridor, then position (gap_stats() rules)."""
+    gap_corr, gap_start, gap_end = gap_pieces(corr, pos, lengths_m)
+    max_gap = np.zeros(len(lengths_m))
+    np.maximum.at(max_gap, gap_corr, (gap_end - gap_start) / MILE_M)
+    return max_gap
+
+
+def max_gap_reduction(site_sets: np.ndarray, corridor_gaps: dict) -> np.ndarray:
+    """Summed corridor max-gap reduction (miles) of many candidate site sets at once.
+
+    `site_sets` holds grid row positions. `corridor_gaps` maps grid cells to
+    corridor mileposts (Site_Cell / Site_Corridor / Site_Position: a new
+    station in a cell sits on every corridor crossing it, at the point
+    nearest the cell center) and carries the existing highway station
+    mileposts (Station_Corridor / Station_Position, sorted) and corridor
+    Lengths_M. Every (set, corridor) a set touches becomes its own virtual
+    corridor, so all sets are re-gapped in one gap_pieces() pass.
+    """
+    site_cell = corridor_gaps["Site_Cell"]
+    lengths = np.asarray(corridor_gaps["Lengths_M"], dtype=float)
+    station_corr = corridor_gaps["Station_Corridor"]
+    current = corridor_max_gaps(station_corr, corridor_gaps["Station_Position"], lengths)
+
+    # Site mileposts of every set (sets x cells -> set x corridor pairs)
+    flat = site_sets.ravel()
+    lo, hi = np.searchsorted(site_cell, flat, "left"), np.searchsorted(site_cell, flat, "right")
+    n_pairs = hi - lo
+    set_of = np.repeat(np.repeat(np.arange(len(site_sets)), site_sets.shape[1]), n_pairs)
+    pair = np.repeat(lo - np.cumsum(np.r_[0, n_pairs[:-1]]), n_pairs) + np.arange(n_pairs.sum())
+    added_corr, added_pos = corridor_gaps["Site_Corridor"][pair], corridor_gaps["Site_Position"][pair]
+    if len(added_corr) == 0:
+        return np.zeros(len(site_sets))
+
+    # One virtual corridor per touched (set, corridor), holding its existing stations too
+    touched, virtual = np.unique(set_of * len(lengths) + added_corr, return_inverse=True)
+    touched_corr = touched % len(lengths)
+    s_lo = np.searchsorted(station_corr, touched_corr, "left")
+    s_n = np.searchsorted(station_corr, touched_corr, "right") - s_lo
+    existing = np.repeat(s_lo - np.cumsum(np.r_[0, s_n[:-1]]), s_n) + np.arange(s_n.sum())
+    corr = np.concatenate([virtual, np.repeat(np.arange(len(touched)), s_n)])
+    pos = np.concatenate([added_pos, corridor_gaps["Station_Position"][existing]])
+    order = np.lexsort((pos, corr))
+
+    new = corridor_max_gaps(corr[order], pos[order], lengths[touched_corr])
+    return np.bincount(touched // len(lengths), weights=current[touched_corr] - new, minlength=len(site_sets))
+
+
+def evaluate_site_sets(coverage: sparse.csc_matrix, demand: np.ndarray, site_sets: np.ndarray) -> np.ndarray:
+    """Objective values of many candidate site sets at once.
+
+    `demand` is (n_demand x n_objectives) and `site_sets` is (n_sets x k) of
+    site column indices. Builds a sparse site-indicator matrix so coverage of
+    every set is one sparse product. Returns (n_sets x n_objectives).
+    """
+    n_sets, k = site_sets.shape
+    indicator = sparse.csc_matrix(
+        (np.ones(n_sets * k), (site_sets.ravel(), np.repeat(np.arange(n_sets), k))),
+        shape=(coverage.shape[1], n_sets),
+    )
+    covered = (coverage @ indicator) > 0
+    return np.asarray(covered.T @ demand)
+
+
+def pareto_mask(objectives: np.ndarray) -> np.ndarray:
+    """True for rows not dominated by any other row (all objectives maximized)."""
+    ge = (objectives[:, None, :] >= objectives[None, :, :]).all(axis=2)
+    gt = (objectives[:, None, :] > objectives[None, :, :]).any(axis=2)
+    dominated = (ge & gt).any(axis=0)
+    return ~dominated
+
+
+def _simplex_lattice(n_obj: int, steps: int) -> np.ndarray:
+    grid = np.stack(np.meshgrid(*[np.arange(steps + 1)] * (n_obj - 1), indexing="ij"), -1).reshape(-1, n_obj - 1)
+    grid = grid[grid.sum(axis=1) <= steps]
+    return np.column_stack([grid, steps - grid.sum(axis=1)]) / steps
+
+
+def pareto_frontier(components: pd.DataFrame, centers: np.ndarray, k: int, radius_mi: float = 10,
+                    candidates=None, corridor_gaps: dict = None, steps: int = 6, generations: int = 15,
+                    population: int = 48, seed: int = 0) -> pd.DataFrame:
+    """Pareto frontier of k-site placements across the PARETO_OBJECTIVES.
+
+    Objectives are the summed corridor max-gap reduction in miles (see
+    max_gap_reduction(); `corridor_gaps` is required for it, otherwise that
+    column is 0) and the percentages of DAC and queue-risk demand covered.
+    Seeds the frontier with greedy solutions over a simplex lattice of
+    weights (Corridor_Score coverage stands in for the gap objective, which
+    is not a coverage sum), then refines it with a small evolutionary search
+    (swap mutations of frontier sets, evaluated in vectorized batches).
+    Returns one row per non-dominated set with the objective values and the
+    chosen rows (positions in `components`) in Sites.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = np.ones(len(components), dtype=bool) if candidates is None else np.asarray(candidates)
+    site_idx = np.flatnonzero(candidates)
+    demand = components[list(PARETO_OBJECTIVES)].to_numpy(dtype=float)
+
+    def objectives(site_sets):
+        values = evaluate_site_sets(coverage, demand, site_sets)
+        values[:, 0] = 0 if corridor_gaps is None else max_gap_reduction(site_idx[site_sets], corridor_gaps)
+        return values
+
+    coverage = coverage_matrix(centers, centers[site_idx], radius_mi * MILE_M)
+    coverage_rows = coverage.tocsr()
+    k = min(k, len(site_idx))
+    if k == 0:
+        return pd.DataFrame(columns=list(PARETO_OBJECTIVES.values()) + ["Sites", "Source"])
+
+    # Weighted-sum sweep: one greedy run per weight vector
+    sets = []
+    for weights in _simplex_lattice(demand.shape[1], steps):
+        chosen, _ = solve_greedy(coverage, demand @ weights, k, coverage_rows)
+        if len(chosen) < k:  # pad with unused sites so every set has k members
+            spare = np.setdiff1d(np.arange(len(site_idx)), chosen)[:k - len(chosen)]
+            chosen = np.concatenate([chosen, spare])
+        sets.append(np.sort(chosen))
+    archive = np.unique(np.array(sets), axis=0)
+    scores = objectives(archive)
+    keep = pareto_mask(scores)
+    archive, scores = archive[keep], scores[keep]
+    origin = np.array(["sweep"] * len(archive), dtype=object)
+
+    # Evolutionary refinement: swap 1-2 sites of random frontier members
+    useful = np.flatnonzero(coverage.getnnz(axis=0) > 0)
+    for _ in range(generations):
+        parents = archive[rng.integers(len(archive), size=population)]
+        children = parents.copy()
+        n_swaps = rng.integers(1, 3, size=population)
+        for swap in range(2):
+            rows = np.flatnonzero(n_swaps > swap)
+            children[rows, rng.integers(k, size=len(rows))] = rng.choice(useful, size=len(rows))
+        children = np.sort(children, axis=1)
+        valid = (np.diff(children, axis=1) > 0).all(axis=1)  # no duplicate sites
+        children = children[valid]
+        if len(children) == 0:
+            continue
+
+        pool = np.vstack([archive, children])
+        pool_scores = np.vstack([scores, objectives(children)])
+        pool_origin = np.concatenate([origin, np.array(["evolved"] * len(children), dtype=object)])
+        pool, first = np.unique(pool, axis=0, return_index=True)
+        pool_scores, pool_origin = pool_scores[first], pool_origin[first]
+        keep = pareto_mask(pool_scores)
+        archive, scores, origin = pool[keep], pool_scores[keep], pool_origin[keep]
+
+    totals = demand.sum(axis=0)
+    values = 100 * np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+    values[:, 0] = scores[:, 0]  # miles, not a coverage share
+    frontier = pd.DataFrame(values, columns=list(PARETO_OBJECTIVES.values()))
+    frontier["Sites"] = [tuple(site_idx[s]) for s in archive]
+    frontier["Source"] = origin
+    return frontier.sort_values(list(PARETO_OBJECTIVES.values()), ascending=False).reset_index(drop=True)
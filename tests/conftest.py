@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The engines are top-level modules next to the batch scripts
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corridor_engine import MILE_M, gap_pieces, gap_stats, nevi_gaps, spacing_stats
+
+LENGTHS = np.array([80, 50, 120, 30]) * MILE_M
+
+
+@pytest.fixture
+def stations():
+    # Corridor 0: none; 1: one mid-way; 2: three; 3: one at the start
+    corr = np.array([1, 2, 2, 2, 3])
+    pos = np.array([20, 0, 40, 100, 0]) * MILE_M
+    return corr, pos
+
+
+def test_gap_pieces_follow_gap_stats(stations):
+    corr, pos = stations
+    gap_corr, gap_start, gap_end = gap_pieces(corr, pos, LENGTHS)
+    gap_mi = (gap_end - gap_start) / MILE_M
+    for i, length in enumerate(LENGTHS):
+        expected_avg, expected_max = gap_stats(pos[corr == i], length)
+        assert gap_mi[gap_corr == i].mean() == pytest.approx(expected_avg)
+        assert gap_mi[gap_corr == i].max() == pytest.approx(expected_max)
+
+
+def test_sparse_corridors_are_one_full_gap(stations):
+    corr, pos = stations
+    gap_corr, gap_start, gap_end = gap_pieces(corr, pos, LENGTHS)
+    for i in (0, 1, 3):
+        assert gap_start[gap_corr == i].tolist() == [0]
+        assert gap_end[gap_corr == i].tolist() == [LENGTHS[i]]
+
+
+def test_spacing_table_matches_gap_stats(stations):
+    corr, pos = stations
+    index = pd.DataFrame({
+        "Corridor_Idx": corr, "Position_M": pos, "Distance_M": 0.0,
+        "Level2_Ports": 4, "DC_Fast_Ports": 2,
+    })
+    table = spacing_stats(index, LENGTHS)
+    for i, length in enumerate(LENGTHS):
+        assert (table.at[i, "Avg_Spacing_Miles"], table.at[i, "Max_Gap_Miles"]) == pytest.approx(
+            gap_stats(pos[corr == i], length)
+        )
+
+
+def test_nevi_splits_single_station_corridors(stations):
+    corr, pos = stations
+    index = pd.DataFrame({"Corridor_Idx": corr, "Position_M": pos, "Distance_M": 0.0, "DC_Fast_Ports": 4})
+    gaps = nevi_gaps(index, LENGTHS)
+    one_station = gaps[gaps["Corridor_Idx"] == 1]
+    assert (one_station["End_M"] - one_station["Start_M"]).tolist() == pytest.approx([20 * MILE_M, 30 * MILE_M])
+    assert one_station["NEVI_Compliant"].all()
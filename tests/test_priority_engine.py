@@ -0,0 +1,99 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import LineString, Point, box
+
+from priority_engine import (
+    DEFAULT_WEIGHTS, MILE_M, assign_priority, build_grid, changed_station_points, composite_score,
+    diff_stations, rescore_station_changes, score_cells, station_layer, station_snapshot, weight_sensitivity
+)
+
+CRS = "EPSG:5070"
+
+
+@pytest.fixture
+def layers():
+    rng = np.random.default_rng(0)
+    boundary = gpd.GeoDataFrame(geometry=[box(0, 0, 120_000, 120_000)], crs=CRS)
+    corridors = gpd.GeoDataFrame(
+        {"Max_Gap_Miles": [20.0, 60.0]},
+        geometry=[LineString([(0, 10_000), (120_000, 90_000)]), LineString([(60_000, 0), (50_000, 120_000)])],
+        crs=CRS,
+    )
+    dac = gpd.GeoDataFrame(geometry=[Point(40_000, 40_000).buffer(15_000)], crs=CRS)
+    queue_risk = gpd.GeoDataFrame({"Queue_Risk_Score": [35.0]}, geometry=[box(0, 0, 120_000, 120_000)], crs=CRS)
+
+    n = 300
+    xy = rng.uniform(0, 120_000, (n, 2))
+    lonlat = gpd.GeoSeries(gpd.points_from_xy(xy[:, 0], xy[:, 1]), crs=CRS).to_crs("EPSG:4326")
+    stations = pd.DataFrame({
+        "id": np.arange(n),
+        "Latitude": lonlat.y,
+        "Longitude": lonlat.x,
+        "ev_dc_fast_num": rng.choice([0, 0, 2], n),
+    })
+    grid = build_grid(boundary, 10 * MILE_M)
+    return grid, corridors, dac, queue_risk, stations
+
+
+def full_run(grid, corridors, dac, queue_risk, stations_df):
+    """The full-analysis path of calculate_station_priorities.py."""
+    stations = station_layer(station_snapshot(stations_df), CRS)
+    scores = score_cells(grid, corridors, dac, queue_risk, stations)
+    scores["Priority_Score"] = composite_score(scores, DEFAULT_WEIGHTS)
+    scores["Priority_Category"] = assign_priority(scores["Priority_Score"])
+    return gpd.GeoDataFrame(scores, geometry=grid.geometry, crs=CRS)
+
+
+def test_delta_matches_full_rescore(layers):
+    grid, corridors, dac, queue_risk, stations = layers
+    # The live feed repeats some station rows
+    old_df = pd.concat([stations, stations.iloc[:40]], ignore_index=True)
+    scored = full_run(grid, corridors, dac, queue_risk, old_df)
+
+    new_df = old_df[~old_df["id"].isin([3, 4, 5])].copy()  # removed (one of them duplicated)
+    new_df.loc[new_df["id"] == 50, "Latitude"] += 0.05  # moved
+    new_df.loc[new_df["id"] == 60, "ev_dc_fast_num"] = 4  # gained DC fast
+    added = stations.iloc[:2].assign(id=[1000, 1001], Latitude=stations["Latitude"].iloc[:2] + 0.02)
+    new_df = pd.concat([new_df, added, added], ignore_index=True)  # added, duplicated
+
+    new_snapshot = station_snapshot(new_df)
+    changes = diff_stations(station_snapshot(old_df), new_snapshot)
+    rows = rescore_station_changes(
+        scored, station_layer(new_snapshot, CRS), changed_station_points(changes, CRS), DEFAULT_WEIGHTS
+    )
+    assert len(rows) > 0
+
+    expected = full_run(grid, corridors, dac, queue_risk, new_df)
+    pd.testing.assert_frame_equal(
+        scored.drop(columns="geometry"), expected.drop(columns="geometry"), check_dtype=False
+    )
+
+
+def test_snapshot_drops_duplicate_rows(layers):
+    _, _, _, _, stations = layers
+    doubled = pd.concat([stations, stations], ignore_index=True)
+    assert len(station_snapshot(doubled)) == len(stations)
+
+
+def test_weight_sensitivity_shape_and_rank_stability():
+    rng = np.random.default_rng(1)
+    scores = pd.DataFrame(rng.uniform(0, 100, (200, 4)), columns=list(DEFAULT_WEIGHTS), index=np.arange(200) + 1000)
+    scores.iloc[0] = 100.0  # top under every weighting
+    scores.iloc[1] = 0.0  # bottom under every weighting
+    scores.iloc[2] = [100.0, 0.0, 0.0, 0.0]  # depends entirely on the weighting
+
+    result = weight_sensitivity(scores, n_samples=300, rank_samples=150)
+
+    assert list(result.columns) == [
+        "Pct_Critical_High", "Pct_Critical", "Rank_Pctl_P05", "Rank_Pctl_P50", "Rank_Pctl_P95"
+    ]
+    assert result.index.equals(scores.index)
+    assert result[["Pct_Critical_High", "Pct_Critical"]].stack().between(0, 100).all()
+    assert (result["Rank_Pctl_P05"] <= result["Rank_Pctl_P50"]).all()
+    assert (result["Rank_Pctl_P50"] <= result["Rank_Pctl_P95"]).all()
+    assert result.iloc[0].tolist() == [100, 100, 100, 100, 100]
+    assert result.iloc[1, :2].tolist() == [0, 0]
+    assert result.iloc[1, 2:].max() <= 1
+    assert result.iloc[2]["Rank_Pctl_P95"] - result.iloc[2]["Rank_Pctl_P05"] > 50
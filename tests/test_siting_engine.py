@@ -0,0 +1,38 @@
+import numpy as np
+
+from corridor_engine import gap_stats
+from siting_engine import max_gap_reduction
+
+
+def test_max_gap_reduction_matches_gap_stats():
+    rng = np.random.default_rng(0)
+    n_corr, n_cells = 8, 40
+    lengths = rng.uniform(10_000, 200_000, n_corr)
+
+    # Existing stations, including corridors with 0 and 1 of them
+    station_corr = np.sort(rng.integers(0, n_corr - 2, 25))
+    station_corr = np.r_[station_corr, n_corr - 1]
+    station_pos = rng.random(len(station_corr)) * lengths[station_corr]
+    order = np.lexsort((station_pos, station_corr))
+    station_corr, station_pos = station_corr[order], station_pos[order]
+
+    site_cell = rng.integers(0, n_cells, 60)
+    site_corr = rng.integers(0, n_corr, 60)
+    site_pos = rng.random(60) * lengths[site_corr]
+    order = np.lexsort((site_corr, site_cell))
+    corridor_gaps = {
+        "Site_Cell": site_cell[order], "Site_Corridor": site_corr[order], "Site_Position": site_pos[order],
+        "Station_Corridor": station_corr, "Station_Position": station_pos, "Lengths_M": lengths,
+    }
+
+    site_sets = np.array([np.sort(rng.choice(n_cells, 4, replace=False)) for _ in range(15)])
+    expected = []
+    for cells in site_sets:
+        total = 0.0
+        for corr in range(n_corr):
+            existing = station_pos[station_corr == corr]
+            added = site_pos[(site_corr == corr) & np.isin(site_cell, cells)]
+            total += gap_stats(existing, lengths[corr])[1] - gap_stats(np.r_[existing, added], lengths[corr])[1]
+        expected.append(total)
+
+    assert np.allclose(max_gap_reduction(site_sets, corridor_gaps), expected)
@@ -0,0 +1,138 @@
+# trip_engine.py
+# Monte-Carlo long-distance EV trips along corridor routes.
+import numpy as np
+import pandas as pd
+
+from corridor_engine import MILE_M
+
+TRIP_MEDIAN_MI = 100  # lognormal median trip length
+TRIP_SIGMA = 0.6  # lognormal shape of trip lengths
+RANGE_MI = 200  # mean full-charge range
+RANGE_SD_MI = 40
+SOC_RANGE = (0.5, 1.0)  # state of charge at departure, uniform
+CHARGE_TO = 0.8  # DC fast sessions stop at 80%
+
+
+def _station_table(lengths_m, corr, pos):
+    """Forward and mirrored station mileposts on one concatenated axis.
+
+    Route r runs forward as route r and backward as route r + n (positions
+    measured from the far end), so both travel directions use one sorted
+    key array. Also returns a sparse table for range-max queries over the
+    gaps between consecutive stations.
+    """
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    corr, pos = np.asarray(corr, dtype=int), np.asarray(pos, dtype=float)
+    n = len(lengths_m)
+    both_corr = np.concatenate([corr, corr + n])
+    both_pos = np.concatenate([pos, lengths_m[corr] - pos])
+    both_len = np.tile(lengths_m, 2)
+    offset = np.r_[0, np.cumsum(both_len + 1)[:-1]]
+    key = offset[both_corr] + both_pos
+    order = np.argsort(key, kind="stable")
+    key, both_corr = key[order], both_corr[order]
+
+    gaps = np.diff(key)  # gaps across a route boundary are never queried
+    table = [gaps]
+    while len(table[-1]) > 1 and 2 ** len(table) <= len(gaps):
+        half = 2 ** (len(table) - 1)
+        table.append(np.maximum(table[-1][:-half], table[-1][half:]))
+    return offset, key, both_corr, table
+
+
+def _range_max(table, lo, hi):
+    """Max of gaps[lo..hi] (inclusive) per query; 0 where hi < lo."""
+    out = np.zeros(len(lo))
+    valid = hi >= lo
+    if not valid.any():
+        return out
+    lo, hi = lo[valid], hi[valid]
+    level = np.floor(np.log2(hi - lo + 1)).astype(int)
+    result = np.empty(len(lo))
+    for k in np.unique(level):
+        at = level == k
+        result[at] = np.maximum(table[k][lo[at]], table[k][hi[at] - 2 ** k + 1])
+    out[valid] = result
+    return out
+
+
+def _feasible(stations, route, origin, dest, reach, leg_max):
+    """Whether each forward trip (origin < dest) can be completed.
+
+    Charging at every station to at least `leg_max` is optimal, so the
+    energy leaving a station at distance x from the origin is
+    max(leg_max, reach - x). A trip therefore fails only if some leg ending
+    beyond the initial `reach` is longer than `leg_max`: the legs from the
+    last station within reach up to the destination.
+    """
+    offset, key, station_route, table = stations
+    start = offset[route] + origin
+    end = offset[route] + dest
+    direct = dest - origin <= reach
+
+    last_reachable = np.searchsorted(key, start + np.minimum(reach, dest - origin), side="right") - 1
+    safe = np.maximum(last_reachable, 0)
+    has_stop = (last_reachable >= 0) & (station_route[safe] == route) & (key[safe] >= start)
+    last_before = np.searchsorted(key, end, side="left") - 1
+    worst_gap = _range_max(table, np.where(has_stop, safe, 0), np.where(has_stop, last_before - 1, -1))
+    final_leg = end - key[np.maximum(last_before, 0)]
+    return direct | (has_stop & (np.maximum(worst_gap, final_leg) <= leg_max))
+
+
+def simulate_trips(lengths_m, corr, pos, n_trips: int = 1_000_000, seed: int = 0, detour=None,
+                   route_weights=None, trip_median_mi: float = TRIP_MEDIAN_MI, trip_sigma: float = TRIP_SIGMA,
+                   range_mi: float = RANGE_MI, range_sd_mi: float = RANGE_SD_MI, soc_range=SOC_RANGE,
+                   charge_to: float = CHARGE_TO) -> pd.DataFrame:
+    """Samples trips along routes and classifies each as Completed, Detour or Stranded.
+
+    Routes are picked in proportion to `route_weights` (default: length).
+    Trip lengths are lognormal (clipped to the route), origins uniform with
+    a random direction, ranges normal (clipped to 50-150% of the mean) and
+    departure state of charge uniform over `soc_range`. Stations are
+    (`corr`, `pos`) mileposts on the routes; `detour` is an optional wider
+    (corr, pos) set, e.g. stations a few miles off the corridor, used only
+    for trips the corridor stations cannot complete (the detour miles
+    themselves are not charged against range). Returns one row per trip.
+    """
+    rng = np.random.default_rng(seed)
+    lengths_m = np.asarray(lengths_m, dtype=float)
+    n = len(lengths_m)
+    weights = lengths_m if route_weights is None else np.asarray(route_weights, dtype=float)
+    route = rng.choice(n, size=n_trips, p=weights / weights.sum())
+
+    trip_m = np.minimum(rng.lognormal(np.log(trip_median_mi * MILE_M), trip_sigma, n_trips), lengths_m[route])
+    origin = rng.random(n_trips) * (lengths_m[route] - trip_m)
+    backward = rng.random(n_trips) < 0.5
+    full_range = np.clip(rng.normal(range_mi, range_sd_mi, n_trips), 0.5 * range_mi, 1.5 * range_mi) * MILE_M
+    reach = rng.uniform(*soc_range, n_trips) * full_range
+
+    # Backward trips run forward on the mirrored copy of their route
+    start = np.where(backward, lengths_m[route] - origin - trip_m, origin)
+    side = np.where(backward, route + n, route)
+    ok = _feasible(_station_table(lengths_m, corr, pos), side, start, start + trip_m, reach, charge_to * full_range)
+    detoured = np.zeros(n_trips, dtype=bool)
+    if detour is not None:
+        retry = ~ok
+        detoured[retry] = _feasible(
+            _station_table(lengths_m, *detour), side[retry], start[retry], start[retry] + trip_m[retry],
+            reach[retry], charge_to * full_range[retry],
+        )
+
+    return pd.DataFrame({
+        "Route_Idx": route,
+        "Trip_Miles": trip_m / MILE_M,
+        "Range_Miles": full_range / MILE_M,
+        "Start_SOC": reach / full_range,
+        "Outcome": np.select([ok, detoured], ["Completed", "Detour"], "Stranded"),
+    })
+
+
+def trip_failure_rates(trips: pd.DataFrame, n_routes: int) -> pd.DataFrame:
+    """Per-route trip counts and Completed / Detour / Stranded shares (percent)."""
+    route = trips["Route_Idx"].to_numpy()
+    count = np.bincount(route, minlength=n_routes)
+    share = {}
+    for outcome in ["Completed", "Detour", "Stranded"]:
+        hits = np.bincount(route, weights=trips["Outcome"].to_numpy() == outcome, minlength=n_routes)
+        share[f"Trip_{outcome}_Pct"] = np.divide(hits * 100, count, out=np.full(n_routes, np.nan), where=count > 0)
+    return pd.DataFrame({"Trips": count, **share})
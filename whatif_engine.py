@@ -0,0 +1,158 @@
+# whatif_engine.py
+# "Drop a hypothetical station" updates for the Spatial Explorer.
+import re
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from corridor_engine import BUFFER_DISTANCE, MILE_M, MIN_LEVEL2_PORTS, gap_stats, highway_capable, locate_stations
+from priority_engine import gap_scores
+
+COUNT_COLUMN = re.compile(r"^(Stations|DCFC)_(\d+(?:\.\d+)?)mi$")
+
+
+class WhatIfIndex:
+    """Persistent spatial indexes for local what-if updates.
+
+    Built once per app process from the scored priority grid, the corridor
+    spacing layer and the station CSV. Adding a hypothetical station then
+    only touches cells within the count radii and corridors within the
+    corridor access buffer:
+
+    - a cKDTree over cell centers gives the cells whose Stations_*mi /
+      DCFC_*mi counts gain one station;
+    - an STRtree over corridor lines finds corridors the station serves, and
+      the cached sorted station mileposts per corridor give the new gaps;
+    - cached cell x corridor pairs re-derive Corridor_Score for cells along
+      the affected corridors.
+    """
+
+    def __init__(self, grid: gpd.GeoDataFrame, corridors: gpd.GeoDataFrame,
+                 stations_df: pd.DataFrame, epsg: int = 5070):
+        self.crs = f"EPSG:{epsg}"
+        grid = grid.to_crs(epsg=epsg)
+        cells = grid.geometry.to_numpy()
+        self.center_tree = cKDTree(shapely.get_coordinates(shapely.centroid(cells)))
+        self.count_columns = {
+            col: (m.group(1), float(m.group(2)))
+            for col in grid.columns if (m := COUNT_COLUMN.match(col))
+        }
+
+        # Corridor linear-referencing cache: sorted highway station mileposts per corridor
+        corridors = corridors.to_crs(epsg=epsg).reset_index(drop=True)
+        self.corridors = corridors
+        self.lines = corridors.geometry.to_numpy()
+        self.lengths = shapely.length(self.lines)
+        self.line_tree = shapely.STRtree(self.lines)
+        self.file_max_gap = pd.to_numeric(corridors["Max_Gap_Miles"], errors="coerce").to_numpy()
+
+        stations_df = stations_df.dropna(subset=["Latitude", "Longitude"])
+        highway = stations_df[highway_capable(stations_df)]
+        points = gpd.GeoSeries(
+            gpd.points_from_xy(highway.Longitude, highway.Latitude), crs="EPSG:4326"
+        ).to_crs(epsg=epsg).to_numpy()
+        pairs = locate_stations(self.lines, points, BUFFER_DISTANCE)
+        grouped = pairs.groupby("Corridor_Idx")["Position_M"]
+        self.mileposts = [np.array([])] * len(self.lines)
+        for corr, positions in grouped:
+            self.mileposts[corr] = np.sort(positions.to_numpy())
+        self.current_max_gap = np.array([
+            gap_stats(self.mileposts[i], self.lengths[i])[1] for i in range(len(self.lines))
+        ])
+
+        # Cell x corridor pairs for re-deriving Corridor_Score
+        self.pair_cell, self.pair_corridor = self.line_tree.query(cells, predicate="intersects")
+
+    def _project(self, stations):
+        latlon = np.array([[s["lat"], s["lon"]] for s in stations], dtype=float)
+        pts = gpd.GeoSeries(gpd.points_from_xy(latlon[:, 1], latlon[:, 0]), crs="EPSG:4326").to_crs(self.crs)
+        return pts.to_numpy()
+
+    @staticmethod
+    def _is_dc_fast(station):
+        return station["type"] == "DC Fast"
+
+    @staticmethod
+    def _is_highway(station):
+        return station["type"] == "DC Fast" or station.get("ports", 0) >= MIN_LEVEL2_PORTS
+
+    def count_deltas(self, stations) -> pd.DataFrame:
+        """Station-count increments for every cell near the hypothetical stations.
+
+        Returns a DataFrame indexed by grid row position with one column per
+        Stations_*mi / DCFC_*mi column of the grid.
+        """
+        if not stations or not self.count_columns:
+            return pd.DataFrame(columns=list(self.count_columns), dtype=int)
+        xy = shapely.get_coordinates(self._project(stations))
+        dc_fast = np.array([self._is_dc_fast(s) for s in stations])
+
+        deltas = {}
+        for col, (label, radius_mi) in self.count_columns.items():
+            use = dc_fast if label == "DCFC" else np.ones(len(stations), dtype=bool)
+            hits = self.center_tree.query_ball_point(xy[use], radius_mi * MILE_M) if use.any() else []
+            rows = np.concatenate([np.asarray(h, dtype=int) for h in hits]) if len(hits) else np.array([], dtype=int)
+            deltas[col] = pd.Series(np.ones(len(rows), dtype=int), index=rows).groupby(level=0).sum()
+        return pd.DataFrame(deltas).fillna(0).astype(int)
+
+    def corridor_updates(self, stations) -> pd.DataFrame:
+        """New Max_Gap_Miles for corridors within the access buffer of a highway-capable station."""
+        highway = [s for s in stations if self._is_highway(s)]
+        columns = ["Corridor_Idx", "Road_Name", "Current_Max_Gap", "New_Max_Gap", "New_Avg_Spacing"]
+        if not highway:
+            return pd.DataFrame(columns=columns)
+
+        pairs = locate_stations(self.lines, self._project(highway), BUFFER_DISTANCE)
+        rows = []
+        for corr, added in pairs.groupby("Corridor_Idx")["Position_M"]:
+            positions = np.concatenate([self.mileposts[corr], added.to_numpy()])
+            avg_spacing, max_gap = gap_stats(positions, self.lengths[corr])
+            rows.append({
+                "Corridor_Idx": corr,
+                "Road_Name": self.corridors.at[corr, "Road_Name"] if "Road_Name" in self.corridors else "Unknown",
+                "Current_Max_Gap": self.current_max_gap[corr],
+                "New_Max_Gap": max_gap,
+                "New_Avg_Spacing": avg_spacing,
+            })
+        return pd.DataFrame(rows, columns=columns)
+
+    def cell_corridor_scores(self, updates: pd.DataFrame):
+        """Re-derives Corridor_Score for the cells crossed by updated corridors.
+
+        Returns (row positions, new scores).
+        """
+        if updates.empty:
+            return np.array([], dtype=int), np.array([])
+        gaps = self.file_max_gap.copy()
+        gaps[updates["Corridor_Idx"].to_numpy(dtype=int)] = updates["New_Max_Gap"].to_numpy()
+
+        touched = np.isin(self.pair_corridor, updates["Corridor_Idx"].to_numpy(dtype=int))
+        rows = np.unique(self.pair_cell[touched])
+        in_rows = np.isin(self.pair_cell, rows)
+        local = np.searchsorted(rows, self.pair_cell[in_rows])
+
+        max_gap = np.full(len(rows), np.nan)
+        np.fmax.at(max_gap, local, gaps[self.pair_corridor[in_rows]])
+        return rows, gap_scores(max_gap)
+
+    def corridor_gap_inputs(self) -> dict:
+        """Cell and station mileposts for siting_engine.max_gap_reduction().
+
+        A site in a cell is placed on every corridor crossing the cell, at the
+        milepost nearest the cell center; existing highway stations come from
+        the cached mileposts.
+        """
+        centers = shapely.points(self.center_tree.data[self.pair_cell])
+        site_pos = shapely.line_locate_point(self.lines[self.pair_corridor], centers)
+        order = np.lexsort((self.pair_corridor, self.pair_cell))
+        return {
+            "Site_Cell": self.pair_cell[order],
+            "Site_Corridor": self.pair_corridor[order],
+            "Site_Position": site_pos[order],
+            "Station_Corridor": np.repeat(np.arange(len(self.lines)), [len(m) for m in self.mileposts]),
+            "Station_Position": np.concatenate([np.array([]), *self.mileposts]),
+            "Lengths_M": self.lengths,
+        }